@@ -0,0 +1,73 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from accounts.models import Utilisateur
+
+ENGINES = {
+    'legacy': {
+        'SESSION_ENGINE': 'django.contrib.sessions.backends.db',
+        'SESSION_SAVE_EVERY_REQUEST': True,
+    },
+    'cached': {
+        'SESSION_ENGINE': 'servicesbladi.sessions',
+        'SESSION_SAVE_EVERY_REQUEST': True,
+    },
+}
+
+
+class SessionQueryCounter:
+    """execute_wrapper counting the reads and writes issued on django_session"""
+
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if 'django_session' in sql:
+            if sql.lstrip().upper().startswith('SELECT'):
+                self.reads += 1
+            else:
+                self.writes += 1
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = 'Count django_session reads and writes per 1000 authenticated requests, legacy vs cached engine'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per engine')
+        parser.add_argument('--path', default='/', help='URL requested')
+        parser.add_argument('--email', default=None, help='User to log in as (default: first active user)')
+
+    def handle(self, *args, **options):
+        users = Utilisateur.objects.filter(is_active=True)
+        if options['email']:
+            users = users.filter(email=options['email'])
+        user = users.first()
+        if user is None:
+            raise CommandError('No active user to log in with')
+
+        count = options['requests']
+        self.stdout.write(f"{count} GET {options['path']} as {user.email}")
+        for label, overrides in ENGINES.items():
+            with override_settings(**overrides):
+                client = Client(HTTP_HOST='localhost')
+                client.force_login(user)
+
+                counter = SessionQueryCounter()
+                started = time.perf_counter()
+                with connection.execute_wrapper(counter):
+                    for _ in range(count):
+                        client.get(options['path'])
+                elapsed = time.perf_counter() - started
+
+            per_thousand = 1000 / count
+            self.stdout.write(
+                f"{label:<7} session writes/1k={counter.writes * per_thousand:7.1f} "
+                f"reads/1k={counter.reads * per_thousand:7.1f} "
+                f"total={elapsed:6.2f}s"
+            )
@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 08:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_utilisateur_profile_picture'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='utilisateur',
+            index=models.Index(fields=['-date_joined', '-id'], name='user_joined_desc_idx'),
+        ),
+    ]
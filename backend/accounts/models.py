@@ -2,6 +2,9 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.utils.translation import gettext_lazy as _
 import json
+import mimetypes
+
+from servicesbladi import renditions
 
 class UserManager(BaseUserManager):
     """Custom user manager for Utilisateur model"""
@@ -66,9 +69,32 @@ class Utilisateur(AbstractUser):
         else:
             return '/static/img/client-default.png'
     
+    def _profile_picture_type(self):
+        # L'ImageField a validé l'image à l'envoi : l'extension suffit
+        return mimetypes.guess_type(self.profile_picture.name)[0] or ''
+    
+    @property
+    def thumbnail_url(self):
+        """Small rendition of the profile picture, the original until it is generated"""
+        if self.profile_picture:
+            url = renditions.thumbnail_url(self.profile_picture, self._profile_picture_type())
+            if url:
+                return url
+        return self.get_profile_picture_url()
+    
+    def save(self, *args, **kwargs):
+        new_picture = bool(self.profile_picture) and not self.profile_picture._committed
+        super().save(*args, **kwargs)
+        if new_picture:
+            renditions.generate_on_commit(self.profile_picture, self._profile_picture_type())
+    
     class Meta:
         verbose_name = _('user')
         verbose_name_plural = _('users')
+        indexes = [
+            # Sort key of the admin list (keyset pagination)
+            models.Index(fields=['-date_joined', '-id'], name='user_joined_desc_idx'),
+        ]
 
 class Client(models.Model):
     """Client profile model"""
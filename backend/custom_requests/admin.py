@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
-from .models import ServiceRequest, RendezVous, Document, Message, Notification
+from .models import ServiceRequest, RendezVous, Document, Message, Notification, ExpertAvailability, AvailabilityException
 
 class DocumentInline(admin.TabularInline):
     """Inline for documents associated with requests"""
@@ -94,9 +94,26 @@ class NotificationAdmin(admin.ModelAdmin):
         return f"{obj.user.name} {obj.user.first_name}"
     user_name.short_description = _('User')
 
+class ExpertAvailabilityAdmin(admin.ModelAdmin):
+    """Admin configuration for the weekly hours of the experts"""
+    list_display = ('expert', 'weekday', 'start_time', 'end_time')
+    list_filter = ('weekday',)
+    search_fields = ('expert__name', 'expert__first_name', 'expert__email')
+    raw_id_fields = ('expert',)
+
+class AvailabilityExceptionAdmin(admin.ModelAdmin):
+    """Admin configuration for the availability exceptions of the experts"""
+    list_display = ('expert', 'date', 'start_time', 'end_time', 'is_available', 'reason')
+    list_filter = ('is_available', 'date')
+    search_fields = ('expert__name', 'expert__first_name', 'expert__email', 'reason')
+    raw_id_fields = ('expert',)
+    date_hierarchy = 'date'
+
 # Register models with their admin configurations
 admin.site.register(ServiceRequest, ServiceRequestAdmin)
 admin.site.register(RendezVous, RendezVousAdmin)
 admin.site.register(Document, DocumentAdmin)
 admin.site.register(Message, MessageAdmin)
 admin.site.register(Notification, NotificationAdmin)
+admin.site.register(ExpertAvailability, ExpertAvailabilityAdmin)
+admin.site.register(AvailabilityException, AvailabilityExceptionAdmin)
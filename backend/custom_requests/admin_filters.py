@@ -0,0 +1,158 @@
+"""
+Filters of the admin list views, shared with the CSV/XLSX exports.
+
+Each function applies the query string filters of one list (request.GET)
+to a base queryset and returns it in the order the list shows it.
+"""
+from datetime import timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .search import search_queryset
+
+
+def filter_service_requests(queryset, params):
+    """admin_requests_view: status, category, period, search"""
+    status_filter = params.get('status', '')
+    category_filter = params.get('category', '')
+    period_filter = params.get('period', '')
+    search_query = params.get('search', '')
+
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+
+    if category_filter:
+        queryset = queryset.filter(service__category=category_filter)
+
+    if period_filter:
+        today = timezone.now().date()
+        if period_filter == 'today':
+            queryset = queryset.filter(created_at__date=today)
+        elif period_filter == 'week':
+            week_ago = today - timedelta(days=7)
+            queryset = queryset.filter(created_at__date__gte=week_ago)
+        elif period_filter == 'month':
+            month_ago = today - timedelta(days=30)
+            queryset = queryset.filter(created_at__date__gte=month_ago)
+
+    # Order by relevance when searching, otherwise by creation date (newest first)
+    if search_query:
+        return search_queryset(queryset, 'request', search_query)
+    return queryset.order_by('-created_at')
+
+
+def filter_users(queryset, params):
+    """admin_users_view: user_type, status, search"""
+    user_type = params.get('user_type', '')
+    status_filter = params.get('status', '')
+    search_query = params.get('search', '')
+
+    if user_type:
+        queryset = queryset.filter(account_type__iexact=user_type)
+
+    if status_filter:
+        if status_filter == 'active':
+            queryset = queryset.filter(is_active=True)
+        elif status_filter == 'inactive':
+            queryset = queryset.filter(is_active=False)
+
+    # Order by relevance when searching, otherwise by registration date
+    if search_query:
+        return search_queryset(queryset, 'user', search_query)
+    return queryset.order_by('-date_joined')
+
+
+def filter_messages(queryset, params):
+    """admin_messages_view: status, period, search"""
+    status_filter = params.get('status', '')
+    period_filter = params.get('period', '')
+    search_query = params.get('search', '')
+    today = timezone.now().date()
+
+    if status_filter:
+        if status_filter == 'read':
+            queryset = queryset.filter(is_read=True)
+        elif status_filter == 'unread':
+            queryset = queryset.filter(is_read=False)
+
+    if period_filter:
+        if period_filter == 'today':
+            queryset = queryset.filter(sent_at__date=today)
+        elif period_filter == 'week':
+            start_of_week = today - timedelta(days=today.weekday())
+            queryset = queryset.filter(sent_at__date__gte=start_of_week)
+        elif period_filter == 'month':
+            start_of_month = today.replace(day=1)
+            queryset = queryset.filter(sent_at__date__gte=start_of_month)
+
+    # Order by relevance when searching, otherwise by sent date (newest first)
+    if search_query:
+        return search_queryset(queryset, 'message', search_query)
+    return queryset.order_by('-sent_at')
+
+
+def filter_documents(queryset, params):
+    """admin_documents_view: type, client, search (Document has no status field)"""
+    document_type = params.get('type', '')
+    client_id = params.get('client', '')
+    search_query = params.get('search', '')
+
+    if document_type:
+        queryset = queryset.filter(type=document_type)
+
+    if client_id:
+        queryset = queryset.filter(uploaded_by__id=client_id)
+
+    if search_query:
+        queryset = queryset.filter(
+            Q(name__icontains=search_query) |
+            Q(type__icontains=search_query) |
+            Q(uploaded_by__first_name__icontains=search_query) |
+            Q(uploaded_by__name__icontains=search_query)
+        )
+
+    # Order by upload date (newest first)
+    return queryset.order_by('-upload_date')
+
+
+def filter_appointments(queryset, params):
+    """admin_appointments_view: status, date, client, expert, search"""
+    status_filter = params.get('status', '')
+    date_filter = params.get('date', '')
+    client_id = params.get('client', '')
+    expert_id = params.get('expert', '')
+    search_query = params.get('search', '')
+
+    if status_filter:
+        queryset = queryset.filter(status=status_filter)
+
+    if date_filter:
+        today = timezone.now().date()
+        if date_filter == 'today':
+            queryset = queryset.filter(date_time__date=today)
+        elif date_filter == 'tomorrow':
+            tomorrow = today + timedelta(days=1)
+            queryset = queryset.filter(date_time__date=tomorrow)
+        elif date_filter == 'week':
+            week_later = today + timedelta(days=7)
+            queryset = queryset.filter(date_time__date__gte=today, date_time__date__lte=week_later)
+
+    if client_id:
+        queryset = queryset.filter(client_id=client_id)
+
+    if expert_id:
+        queryset = queryset.filter(expert_id=expert_id)
+
+    if search_query:
+        queryset = queryset.filter(
+            Q(client__first_name__icontains=search_query) |
+            Q(client__name__icontains=search_query) |
+            Q(expert__first_name__icontains=search_query) |
+            Q(expert__name__icontains=search_query) |
+            Q(service_request__service__title__icontains=search_query) |
+            Q(notes__icontains=search_query)
+        )
+
+    # Order by date and time
+    return queryset.order_by('date_time')
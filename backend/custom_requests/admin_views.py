@@ -1,5 +1,5 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, Http404, StreamingHttpResponse
 from django.contrib.auth.decorators import login_required
 from django.db.models import Count, Q, Sum, F, CharField, Value
 from django.db.models.functions import Concat
@@ -22,7 +22,19 @@ from accounts.models import Utilisateur, Client, Expert, Address
 from accounts.forms import UserEditForm
 from custom_requests.models import ServiceRequest, Document, RendezVous, Message, Notification
 from services.models import Service, ServiceCategory
+from resources import counters
 from resources.models import Resource, ResourceFile
+from messaging.events import broadcast_chat_permissions
+from custom_requests.stats import (
+    appointment_counts, bounded_counts, get_admin_stats, message_aggregates, request_aggregates,
+)
+from custom_requests.exports import EXPORTS, stream_csv, stream_xlsx
+from custom_requests.retention import request_messages
+from custom_requests.scheduling import SchedulingError, reschedule_appointment
+from servicesbladi.pagination import paginate
+from custom_requests.admin_filters import (
+    filter_appointments, filter_documents, filter_messages, filter_service_requests, filter_users,
+)
 
 @login_required
 def admin_requests_view(request):
@@ -39,49 +51,23 @@ def admin_requests_view(request):
         period_filter = request.GET.get('period', '')
         search_query = request.GET.get('search', '')
         
-        # Base queryset
-        service_requests = ServiceRequest.objects.select_related(
-            'client', 
-            'expert',
-            'service'
+        # Base queryset with the list filters and ordering
+        service_requests = filter_service_requests(
+            ServiceRequest.objects.select_related('client', 'expert', 'service'),
+            request.GET
         )
         
-        # Apply filters
-        if status_filter:
-            service_requests = service_requests.filter(status=status_filter)
-            
-        if category_filter:
-            service_requests = service_requests.filter(service__category=category_filter)
-            
-        if period_filter:
-            today = timezone.now().date()
-            if period_filter == 'today':
-                service_requests = service_requests.filter(created_at__date=today)
-            elif period_filter == 'week':
-                week_ago = today - timedelta(days=7)
-                service_requests = service_requests.filter(created_at__date__gte=week_ago)
-            elif period_filter == 'month':
-                month_ago = today - timedelta(days=30)
-                service_requests = service_requests.filter(created_at__date__gte=month_ago)
-                
-        if search_query:
-            service_requests = service_requests.filter(
-                Q(description__icontains=search_query) |
-                Q(service__title__icontains=search_query) |
-                Q(client__first_name__icontains=search_query) |
-                Q(client__name__icontains=search_query) |
-                Q(expert__first_name__icontains=search_query) |
-                Q(expert__name__icontains=search_query)
-            )
-            
-        # Order by creation date (newest first)
-        service_requests = service_requests.order_by('-created_at')
-        
-        # Get statistics for dashboard
-        total_requests = service_requests.count()
-        pending_requests = service_requests.filter(status='pending').count()
-        in_progress_requests = service_requests.filter(status='in_progress').count()
-        completed_requests = service_requests.filter(status='completed').count()
+        # Stat cards: the cached site-wide snapshot for the whole list, otherwise one
+        # bounded aggregate of the filtered rows, reused as the total of the pagination
+        list_total = None
+        if status_filter or category_filter or period_filter or search_query:
+            counts, list_total = bounded_counts(service_requests, request_aggregates())
+        else:
+            counts = get_admin_stats()['requests']
+        total_requests = counts['total']
+        pending_requests = counts['pending']
+        in_progress_requests = counts['in_progress']
+        completed_requests = counts['completed']
         
         # Get categories for filter
         categories = ServiceCategory.objects.all()
@@ -89,18 +75,12 @@ def admin_requests_view(request):
         # Get all experts for assignment
         experts = Utilisateur.objects.filter(account_type='expert')
         
-        # Pagination
-        paginator = Paginator(service_requests, 10)  # 10 requests per page
-        page = request.GET.get('page')
-        
-        try:
-            requests_page = paginator.page(page)
-        except PageNotAnInteger:
-            # If page is not an integer, deliver first page
-            requests_page = paginator.page(1)
-        except EmptyPage:
-            # If page is out of range, deliver last page of results
-            requests_page = paginator.page(paginator.num_pages)
+        # Pagination (10 requests per page)
+        # Keyset pagination on the list order (page number pagination for ranked search results)
+        requests_page = paginate(
+            service_requests, request.GET, 10,
+            ordering=None if search_query else ('-created_at', '-id'), total=list_total,
+        )
         
         context = {
             'user': request.user,
@@ -148,58 +128,25 @@ def admin_users_view(request):
         status_filter = request.GET.get('status', '')
         search_query = request.GET.get('search', '')
         
-        # Base queryset
-        users = Utilisateur.objects.all()
-        
-        # Apply filters
-        if user_type:
-            users = users.filter(account_type__iexact=user_type)
-            
-        if status_filter:
-            if status_filter == 'active':
-                users = users.filter(is_active=True)
-            elif status_filter == 'inactive':
-                users = users.filter(is_active=False)
-                
-        if search_query:
-            users = users.filter(
-                Q(email__icontains=search_query) |
-                Q(first_name__icontains=search_query) |
-                Q(name__icontains=search_query) |
-                Q(phone__icontains=search_query)
-            )
-            
-        # Order by registration date
-        users = users.order_by('-date_joined')
-        
-        # Debug logging
-        print(f"ADMIN USERS VIEW - Query: {str(users.query)}")
-        print(f"ADMIN USERS VIEW - Total users found: {users.count()}")
+        # Base queryset with the list filters and ordering
+        users = filter_users(Utilisateur.objects.all(), request.GET)
         
         # Get statistics for dashboard (before pagination)
-        total_users = Utilisateur.objects.count()
-        clients_count = Utilisateur.objects.filter(account_type__iexact='client').count()
-        experts_count = Utilisateur.objects.filter(account_type__iexact='expert').count()
-        admins_count = Utilisateur.objects.filter(account_type__iexact='admin').count()
-        active_users = Utilisateur.objects.filter(is_active=True).count()
-        inactive_users = Utilisateur.objects.filter(is_active=False).count()
+        # Site-wide counters come from the cached admin snapshot
+        user_stats = get_admin_stats()['users']
+        total_users = user_stats['total']
+        clients_count = user_stats['clients']
+        experts_count = user_stats['experts']
+        admins_count = user_stats['admins']
+        active_users = user_stats['active']
+        inactive_users = user_stats['inactive']
         
         # Get recent users (last 7 days)
-        one_week_ago = timezone.now() - timedelta(days=7)
-        recent_users = Utilisateur.objects.filter(date_joined__gte=one_week_ago).count()
+        recent_users = user_stats['recent']
         
-        # Pagination
-        paginator = Paginator(users, 10)  # 10 users per page
-        page = request.GET.get('page')
-        
-        try:
-            users_page = paginator.page(page)
-        except PageNotAnInteger:
-            # If page is not an integer, deliver first page
-            users_page = paginator.page(1)
-        except EmptyPage:
-            # If page is out of range, deliver last page of results
-            users_page = paginator.page(paginator.num_pages)
+        # Pagination (10 users per page)
+        # Keyset pagination on the list order (page number pagination for ranked search results)
+        users_page = paginate(users, request.GET, 10, ordering=None if search_query else ('-date_joined', '-id'))
         
         context = {
             'user': request.user,
@@ -636,17 +583,23 @@ def admin_reschedule_appointment(request, appointment_id):
         appointment = get_object_or_404(RendezVous, id=appointment_id)
         
         # Get new date and time from POST data
-        new_date = request.POST.get('date', '')
-        new_time = request.POST.get('time', '')
+        # Champs new_date / new_time du formulaire de admin/rendezvous.html
+        new_date = request.POST.get('new_date') or request.POST.get('date', '')
+        new_time = request.POST.get('new_time') or request.POST.get('time', '')
         
         if not new_date or not new_time:
             messages.error(request, "La date et l'heure doivent être spécifiées.")
             return redirect('admin_rendezvous')
         
-        # Update the appointment
-        appointment.date = datetime.strptime(new_date, '%Y-%m-%d').date()
-        appointment.time = new_time
-        appointment.save()
+        # Update the appointment (date_time), unless it overlaps another one of the expert
+        new_date_time = datetime.strptime(f'{new_date} {new_time[:5]}', '%Y-%m-%d %H:%M')
+        try:
+            reschedule_appointment(appointment, new_date_time)
+        except SchedulingError as e:
+            messages.error(request, e.message)
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return JsonResponse({'success': False, 'message': e.message}, status=e.status)
+            return redirect('admin_rendezvous')
         
         # Notify client and expert about the rescheduling
         # This could be implemented with a notification system
@@ -708,7 +661,6 @@ def admin_add_resource(request):
                 language='fr',  # Default language
                 file=file,
                 file_format='pdf',  # Default format
-                file_size=int(file.size / 1024) if file.size else 0,  # Convert bytes to KB
             )
         
         # Set success message
@@ -759,7 +711,6 @@ def admin_edit_resource(request, resource_id):
                 language='fr',  # Default language
                 file=file,
                 file_format='pdf',  # Default format
-                file_size=int(file.size / 1024) if file.size else 0,  # Convert bytes to KB
             )
         
         # Set success message
@@ -891,8 +842,8 @@ def admin_resources_view(request):
         document_count = resources.filter(available_formats='pdf').count()
         video_count = 0  # Pas de vidéos dans les données actuelles
         
-        # Get resources with highest download count
-        popular_resources = resources.order_by('-download_count')[:5]
+        # Most downloaded resources of the last 30 days (ResourceDailyStat)
+        popular_resources = counters.popular_resources(resources, field='downloads')
         visibilities = ['public', 'private']  # Options pour le filtre de visibilité
         
         # Get categories for filters
@@ -964,63 +915,33 @@ def admin_messages_view(request):
         recipient_id = request.GET.get('recipient', '')
         users = Utilisateur.objects.all()
         
-        # Base queryset - get all messages
-        messages_obj = Message.objects.select_related('sender', 'recipient', 'service_request')
-        
-        # Define today variable upfront
-        today = timezone.now().date()
-        
-        # Apply filters
-        if status_filter:
-            if status_filter == 'read':
-                messages_obj = messages_obj.filter(is_read=True)
-            elif status_filter == 'unread':
-                messages_obj = messages_obj.filter(is_read=False)
-                
-        if period_filter:
-            if period_filter == 'today':
-                messages_obj = messages_obj.filter(sent_at__date=today)
-            elif period_filter == 'week':
-                start_of_week = today - timedelta(days=today.weekday())
-                messages_obj = messages_obj.filter(sent_at__date__gte=start_of_week)
-            elif period_filter == 'month':
-                start_of_month = today.replace(day=1)
-                messages_obj = messages_obj.filter(sent_at__date__gte=start_of_month)
-                
-        if search_query:
-            messages_obj = messages_obj.filter(
-                Q(content__icontains=search_query) |
-                Q(sender__first_name__icontains=search_query) |
-                Q(sender__name__icontains=search_query) |
-                Q(recipient__first_name__icontains=search_query) |
-                Q(recipient__name__icontains=search_query) |
-                Q(service_request__title__icontains=search_query)
-            )
-            
-        # Order by sent date (newest first)
-        messages_obj = messages_obj.order_by('-sent_at')
+        # Base queryset with the list filters and ordering
+        messages_obj = filter_messages(
+            Message.objects.select_related('sender', 'recipient', 'service_request'),
+            request.GET
+        )
         
-        # Get statistics for dashboard
-        total_messages = messages_obj.count()
-        unread_messages = messages_obj.filter(is_read=False).count()
-        today_messages = messages_obj.filter(sent_at__date=today).count()
+        # Stat cards: the cached site-wide snapshot for the whole list, otherwise one
+        # bounded aggregate of the filtered rows, reused as the total of the pagination
+        list_total = None
+        if status_filter or period_filter or search_query:
+            counts, list_total = bounded_counts(messages_obj, message_aggregates())
+        else:
+            counts = get_admin_stats()['messages']
+        total_messages = counts['total']
+        unread_messages = counts['unread']
+        today_messages = counts['today']
         
         # Add missing variables
-        admin_messages = messages_obj.filter(Q(sender__account_type='admin') | Q(recipient__account_type='admin')).count()
-        recent_messages = messages_obj.filter(sent_at__gte=timezone.now() - timedelta(days=1)).count()
-        
-        # Pagination
-        paginator = Paginator(messages_obj, 20)  # 20 messages per page
-        page = request.GET.get('page')
-        
-        try:
-            messages_page = paginator.page(page)
-        except PageNotAnInteger:
-            # If page is not an integer, deliver first page
-            messages_page = paginator.page(1)
-        except EmptyPage:
-            # If page is out of range, deliver last page of results
-            messages_page = paginator.page(paginator.num_pages)
+        admin_messages = counts['admin']
+        recent_messages = counts['recent']
+        
+        # Pagination (20 messages per page)
+        # Keyset pagination on the list order (page number pagination for ranked search results)
+        messages_page = paginate(
+            messages_obj, request.GET, 20,
+            ordering=None if search_query else ('-sent_at', '-id'), total=list_total,
+        )
         
         context = {
             'user': request.user,
@@ -1055,6 +976,30 @@ def admin_messages_view(request):
         }
         return render(request, 'admin/messages.html', context)
 
+@login_required
+def admin_export_view(request, kind):
+    """Stream an admin list as CSV or XLSX, with the filters of its page"""
+    
+    # Check if user is admin
+    if request.user.account_type.lower() != 'admin':
+        return redirect('home')
+    
+    if kind not in EXPORTS:
+        raise Http404("Unknown export")
+    
+    filename = f"{kind}-{timezone.localdate():%Y%m%d}"
+    if request.GET.get('format') == 'xlsx':
+        response = StreamingHttpResponse(
+            stream_xlsx(kind, request.GET),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        filename += '.xlsx'
+    else:
+        response = StreamingHttpResponse(stream_csv(kind, request.GET), content_type='text/csv; charset=utf-8')
+        filename += '.csv'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
 @login_required
 def admin_mark_message_read(request, message_id):
     """Mark a message as read"""
@@ -1101,30 +1046,11 @@ def admin_documents_view(request):
         client_id = request.GET.get('client', '')
         search_query = request.GET.get('search', '')
         
-        # Base queryset - correct the field names based on Document model
-        documents = Document.objects.select_related('uploaded_by', 'service_request')
-        
-        # Apply filters - Note: If 'status' is not a field in the Document model, we skip this filter
-        # Remove this block if status is not used in your Document model
-        # if status_filter:
-        #    documents = documents.filter(status=status_filter)
-            
-        if document_type:
-            documents = documents.filter(type=document_type)
-            
-        if client_id:
-            documents = documents.filter(uploaded_by__id=client_id)
-                
-        if search_query:
-            documents = documents.filter(
-                Q(name__icontains=search_query) |
-                Q(type__icontains=search_query) |
-                Q(uploaded_by__first_name__icontains=search_query) |
-                Q(uploaded_by__name__icontains=search_query)
-            )
-            
-        # Order by upload date (newest first)
-        documents = documents.order_by('-upload_date')
+        # Base queryset with the list filters and ordering (Document has no status field)
+        documents = filter_documents(
+            Document.objects.select_related('uploaded_by', 'service_request'),
+            request.GET
+        )
         
         # Get statistics for dashboard
         total_documents = documents.count()
@@ -1140,18 +1066,9 @@ def admin_documents_view(request):
         # Get clients for filters
         clients = Client.objects.select_related('user').all()
         
-        # Pagination
-        paginator = Paginator(documents, 10)  # 10 documents per page
-        page = request.GET.get('page')
-        
-        try:
-            documents_page = paginator.page(page)
-        except PageNotAnInteger:
-            # If page is not an integer, deliver first page
-            documents_page = paginator.page(1)
-        except EmptyPage:
-            # If page is out of range, deliver last page of results
-            documents_page = paginator.page(paginator.num_pages)
+        # Pagination (10 documents per page)
+        # Keyset pagination on the list order
+        documents_page = paginate(documents, request.GET, 10, ordering=('-upload_date', '-id'))
         
         context = {
             'user': request.user,
@@ -1201,73 +1118,29 @@ def admin_appointments_view(request):
         expert_id = request.GET.get('expert', '')
         search_query = request.GET.get('search', '')
         
-        # Base queryset avec les relations correctes
-        appointments = RendezVous.objects.select_related(
-            'client', 
-            'expert', 
-            'service_request'
+        # Base queryset avec les relations correctes, filtres et tri de la liste
+        appointments = filter_appointments(
+            RendezVous.objects.select_related('client', 'expert', 'service_request'),
+            request.GET
         )
         
-        # Apply filters
-        if status_filter:
-            appointments = appointments.filter(status=status_filter)
-            
-        if date_filter:
-            today = timezone.now().date()
-            if date_filter == 'today':
-                appointments = appointments.filter(date_time__date=today)
-            elif date_filter == 'tomorrow':
-                tomorrow = today + timedelta(days=1)
-                appointments = appointments.filter(date_time__date=tomorrow)
-            elif date_filter == 'week':
-                week_later = today + timedelta(days=7)
-                appointments = appointments.filter(date_time__date__gte=today, date_time__date__lte=week_later)
-            
-        if client_id:
-            appointments = appointments.filter(client_id=client_id)
-            
-        if expert_id:
-            appointments = appointments.filter(expert_id=expert_id)
-                
-        if search_query:
-            appointments = appointments.filter(
-                Q(client__first_name__icontains=search_query) |
-                Q(client__name__icontains=search_query) |
-                Q(expert__first_name__icontains=search_query) |
-                Q(expert__name__icontains=search_query) |
-                Q(service_request__service__title__icontains=search_query) |
-                Q(notes__icontains=search_query)
-            )
-            
-        # Order by date and time
-        appointments = appointments.order_by('date_time')
-        
         # Get statistics for dashboard
-        total_appointments = appointments.count()
-        upcoming_appointments = appointments.filter(date_time__gte=timezone.now()).count()
-        completed_appointments = appointments.filter(status='completed').count()
-        cancelled_appointments = appointments.filter(status='cancelled').count()
+        counts = appointment_counts(appointments)
+        total_appointments = counts['total']
+        upcoming_appointments = counts['upcoming']
+        completed_appointments = counts['completed']
+        cancelled_appointments = counts['cancelled']
         
         # Add missing variables
-        today = timezone.now().date()
-        today_appointments = appointments.filter(date_time__date=today).count()
+        today_appointments = counts['today']
         
         # Get clients and experts for filters
         clients = Client.objects.select_related('user').all()
         experts = Expert.objects.select_related('user').all()
         
-        # Pagination
-        paginator = Paginator(appointments, 10)  # 10 appointments per page
-        page = request.GET.get('page')
-        
-        try:
-            appointments_page = paginator.page(page)
-        except PageNotAnInteger:
-            # If page is not an integer, deliver first page
-            appointments_page = paginator.page(1)
-        except EmptyPage:
-            # If page is out of range, deliver last page of results
-            appointments_page = paginator.page(paginator.num_pages)
+        # Pagination (10 appointments per page)
+        # Keyset pagination on the list order
+        appointments_page = paginate(appointments, request.GET, 10, ordering=('date_time', 'id'))
         
         context = {
             'user': request.user,
@@ -1401,7 +1274,10 @@ def admin_assign_expert(request, request_id):
                     content=_('Admin notes: ') + notes,
                     service_request=demande
                 )
-            
+
+            # Update the participants cached by open chat sockets
+            broadcast_chat_permissions(demande)
+
             messages.success(request, _('Expert successfully assigned to the request.'))
         else:
             messages.error(request, _('Please select an expert to assign.'))
@@ -1498,7 +1374,7 @@ def admin_request_detail(request, request_id):
         documents = Document.objects.filter(service_request=service_request).order_by('-upload_date')
         
         # Get messages related to this request
-        messages_list = Message.objects.filter(service_request=service_request).order_by('sent_at')
+        messages_list = request_messages(service_request)
         
         # Get appointments related to this request
         appointments = RendezVous.objects.filter(service_request=service_request).order_by('date_time')
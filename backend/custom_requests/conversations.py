@@ -0,0 +1,58 @@
+from django.db.models import Case, Count, F, IntegerField, Max, Q, When
+
+from .models import Message
+
+
+def conversation_summaries(user, counterpart_type=None):
+    """
+    Return the conversations of a user, most recent first.
+
+    Each item is a dict with the counterpart ('other_party'), the latest
+    Message ('latest_message', sender and recipient already loaded) and the
+    number of messages the user has not read yet ('unread_count').
+
+    The grouping runs in SQL: one aggregate query per counterpart for the
+    latest message id and the unread count, then one query loading those
+    latest messages. The cost follows the number of conversations, not the
+    number of messages. counterpart_type keeps only counterparts of that
+    account type.
+    """
+    messages = Message.objects.filter(Q(sender=user) | Q(recipient=user))
+    if counterpart_type:
+        messages = messages.filter(
+            Q(sender=user, recipient__account_type=counterpart_type) |
+            Q(recipient=user, sender__account_type=counterpart_type)
+        )
+
+    rows = list(
+        messages
+        .annotate(other_id=Case(
+            When(sender_id=user.id, then=F('recipient_id')),
+            default=F('sender_id'),
+            output_field=IntegerField(),
+        ))
+        .order_by()
+        .values('other_id')
+        # Les identifiants suivent l'ordre d'envoi : le plus grand est le dernier message
+        .annotate(
+            latest_id=Max('id'),
+            unread_count=Count('id', filter=Q(recipient_id=user.id, is_read=False)),
+        )
+        .order_by('-latest_id')
+    )
+    if not rows:
+        return []
+
+    latest = Message.objects.select_related('sender', 'recipient').in_bulk(
+        [row['latest_id'] for row in rows]
+    )
+
+    conversations = []
+    for row in rows:
+        message = latest[row['latest_id']]
+        conversations.append({
+            'other_party': message.recipient if message.sender_id == user.id else message.sender,
+            'latest_message': message,
+            'unread_count': row['unread_count'],
+        })
+    return conversations
@@ -6,6 +6,7 @@ from django.utils import timezone
 from accounts.models import Client, Utilisateur, Expert
 from services.models import Service, ServiceCategory
 from .models import ServiceRequest, Document, RendezVous, Notification, Message
+from .notifications import get_notification_summary
 
 def get_service_icon(service):
     """Helper function to get appropriate icon for a service"""
@@ -99,17 +100,12 @@ def client_dashboard_view(request):
         ).distinct().count()
         print(f"Documents count: {documents_count}")
         
-        # Get recent notifications
-        notifications = Notification.objects.filter(
-            user=request.user
-        ).order_by('-created_at')[:5]
+        # Get recent notifications and unread count from the cached summary
+        notification_summary = get_notification_summary(request.user.id)
+        notifications = notification_summary['latest']
         print(f"Retrieved {len(notifications)} notifications")
         
-        # Count unread notifications
-        unread_notifications_count = Notification.objects.filter(
-            user=request.user,
-            is_read=False
-        ).count()
+        unread_notifications_count = notification_summary['unread_count']
         print(f"Unread notifications count: {unread_notifications_count}")
         
         # Get upcoming appointments
@@ -223,17 +219,12 @@ def expert_dashboard_view(request):
         ).distinct().count()
         print(f"Documents count: {documents_count}")
         
-        # Get recent notifications
-        notifications = Notification.objects.filter(
-            user=request.user
-        ).order_by('-created_at')[:5]
+        # Get recent notifications and unread count from the cached summary
+        notification_summary = get_notification_summary(request.user.id)
+        notifications = notification_summary['latest']
         print(f"Retrieved {len(notifications)} notifications")
         
-        # Count unread notifications
-        unread_notifications_count = Notification.objects.filter(
-            user=request.user,
-            is_read=False
-        ).count()
+        unread_notifications_count = notification_summary['unread_count']
         print(f"Unread notifications count: {unread_notifications_count}")
         
         # Get upcoming appointments
@@ -308,60 +299,40 @@ def admin_dashboard_view(request):
         return redirect('home')
     
     try:
-        from django.db.models import Count
-        from django.utils import timezone
-        from datetime import timedelta
-        from accounts.models import Utilisateur, Client, Expert
-        from resources.models import Resource
-        from custom_requests.models import ServiceRequest, RendezVous, Document, Message
-        
-        # Get user statistics
-        total_users = Utilisateur.objects.count()
-        total_clients = Client.objects.count()
-        total_experts = Expert.objects.count()
-        total_admins = Utilisateur.objects.filter(account_type__iexact='admin').count()
+        from accounts.models import Utilisateur
+        from custom_requests.models import ServiceRequest, RendezVous
+        from custom_requests.stats import get_admin_stats, daily_series
+        
+        # Cached snapshot computed with one grouped aggregate per table
+        stats = get_admin_stats()
+        total_users = stats['users']['total']
+        total_clients = stats['users']['clients']
+        total_experts = stats['users']['experts']
+        total_admins = stats['users']['admins']
         
         # Get service statistics
-        total_requests = ServiceRequest.objects.count()
-        pending_requests = ServiceRequest.objects.filter(status='pending').count()
-        completed_requests = ServiceRequest.objects.filter(status='completed').count()
+        total_requests = stats['requests']['total']
+        pending_requests = stats['requests']['pending']
+        completed_requests = stats['requests']['completed']
         
         # Get appointment statistics
-        total_appointments = RendezVous.objects.count()
-        upcoming_appointments = RendezVous.objects.filter(
-            date_time__gte=timezone.now()
-        ).count()
-        
-        # Get document statistics
-        total_documents = Document.objects.count()
+        total_appointments = stats['appointments']['total']
+        upcoming_appointments = stats['appointments']['upcoming']
         
-        # Get resource statistics
-        total_resources = Resource.objects.count()
+        total_documents = stats['documents']
+        total_resources = stats['resources']
         
         # Get recent activity
         recent_users = Utilisateur.objects.order_by('-date_joined')[:5]
-        recent_requests = ServiceRequest.objects.order_by('-created_at')[:5]
-        recent_appointments = RendezVous.objects.order_by('-created_at')[:5]
-        
-        # Activity by date (last 7 days)
-        today = timezone.now().date()
-        last_week = today - timedelta(days=7)
-        
-        # Daily signups for the last 7 days
-        daily_signups = []
-        for i in range(7):
-            day = last_week + timedelta(days=i+1)
-            count = Utilisateur.objects.filter(
-                date_joined__year=day.year,
-                date_joined__month=day.month,
-                date_joined__day=day.day
-            ).count()
-            daily_signups.append({'date': day.strftime('%d/%m'), 'count': count})          # Get services data for chart
-        from services.models import Service
-        service_requests = ServiceRequest.objects.values('service__title').annotate(
-            count=Count('id'),
-            name=Count('service__title')
-        ).order_by('-count')[:5]
+        recent_requests = ServiceRequest.objects.select_related('client', 'expert', 'service').order_by('-created_at')[:5]
+        recent_appointments = RendezVous.objects.select_related('client', 'expert').order_by('-created_at')[:5]
+        
+        # Daily signups for the last 7 days, read from the DailyStat rollups
+        daily_signups = [
+            {'date': day['date'].strftime('%d/%m'), 'count': day['new_users']}
+            for day in daily_series(7)
+        ]
+        service_requests = stats['top_services']
         
         context = {
             'user': request.user,
@@ -7,6 +7,10 @@ from django.contrib import messages
 
 from accounts.models import Utilisateur, Expert, Client
 from custom_requests.models import ServiceRequest, Document, RendezVous, Message, Notification
+from messaging.events import broadcast_chat_permissions
+from custom_requests.read_receipts import mark_read_up_to
+from custom_requests.retention import request_messages
+from custom_requests.scheduling import SchedulingError, book_appointment
 
 @login_required
 def expert_documents_view(request):
@@ -87,11 +91,8 @@ def expert_messages_view(request):
                 (Q(sender=active_client.user) & Q(recipient=request.user))
             ).order_by('sent_at')
             
-            # Mark messages as read
-            unread_messages = messages.filter(recipient=request.user, is_read=False)
-            for message in unread_messages:
-                message.is_read = True
-                message.save()
+            # Mark messages as read in a single UPDATE
+            mark_read_up_to(request.user, sender_id=active_client.user_id)
         
         context = {
             'clients': clients,
@@ -149,6 +150,7 @@ def expert_resources_view(request):
             expert = None
         
         # Import here to avoid circular import
+        from resources import counters
         from resources.models import Resource, ResourceFile, ResourceLink
         
         # Debug info
@@ -162,8 +164,8 @@ def expert_resources_view(request):
         for resource in resources:
             print(f"Resource: {resource.id}: {resource.title} - {resource.category} - Active: {resource.is_active}")
         
-        # Get popular resources (based on view_count)
-        popular_resources = Resource.objects.filter(is_active=True).order_by('-view_count')[:3]
+        # Get popular resources (views of the last 30 days)
+        popular_resources = counters.popular_resources(Resource.objects.filter(is_active=True), limit=3)
         print(f"Popular resources found: {popular_resources.count()}")
         
         # Get resource categories for filtering
@@ -186,7 +188,7 @@ def expert_resources_view(request):
                 
                 # Refresh resources queryset
                 resources = Resource.objects.all().order_by('-id')
-                popular_resources = Resource.objects.filter(is_active=True).order_by('-view_count')[:3]
+                popular_resources = counters.popular_resources(Resource.objects.filter(is_active=True), limit=3)
             except Exception as e:
                 print(f"Error creating test resource: {str(e)}")
         
@@ -242,7 +244,7 @@ def expert_request_detail(request, request_id):
         print(f"Found {documents.count()} documents for this request")
         
         # Get messages related to this service request
-        messages_list = Message.objects.filter(service_request=service_request).order_by('sent_at')
+        messages_list = request_messages(service_request)
         
         # Get appointments related to this service request
         appointments = RendezVous.objects.filter(service_request=service_request).order_by('date_time')
@@ -482,21 +484,29 @@ def expert_schedule_appointment(request):
             messages.error(request, "Vous n'êtes pas autorisé à planifier des rendez-vous pour cette demande.")
             return redirect('expert_demandes')
         
+        if appointment_type not in dict(RendezVous.CONSULTATION_TYPES):
+            messages.error(request, "Type de consultation invalide.")
+            return redirect('expert_request_detail', request_id=service_request_id)
+        
         # Convert date_time from string to datetime
         from datetime import datetime
         date_time = datetime.strptime(date_time_str, '%Y-%m-%dT%H:%M')
         
-        # Create the appointment
-        appointment = RendezVous.objects.create(
-            client=service_request.client,
-            expert=request.user,
-            service_request=service_request,
-            date_time=date_time,
-            duration=duration,
-            type=appointment_type,
-            notes=notes,
-            status='scheduled'
-        )
+        # Create the appointment, unless it overlaps another one of the expert
+        try:
+            appointment = book_appointment(
+                client=service_request.client,
+                expert=request.user,
+                service_request=service_request,
+                date_time=date_time,
+                duration=int(duration),
+                consultation_type=appointment_type,
+                notes=notes,
+                status='scheduled'
+            )
+        except SchedulingError as e:
+            messages.error(request, e.message)
+            return redirect('expert_request_detail', request_id=service_request_id)
         
         # Create notification for client
         Notification.objects.create(
@@ -613,6 +623,9 @@ def expert_take_request(request, request_id):
             service_request=service_request
         )
         
+        # Les sockets de chat déjà ouverts doivent connaître le nouvel expert
+        broadcast_chat_permissions(service_request)
+        
         messages.success(request, _(f"Vous avez pris en charge la demande '{service_request.title}' avec succès."))
         
         # Redirect to the request detail page
@@ -0,0 +1,283 @@
+"""
+Streaming CSV/XLSX exports of the admin lists.
+
+An export holds every row matching the filters of the list, in the order
+of the list: rows are read with values_list() in keyset batches on the sort
+key of the list (EXPORT_ORDERINGS, the one of its pagination) and written
+to the response as they are read, so memory stays constant whatever the
+size of the export and no model instance is built. With a search, the list
+is ranked by relevance, which has no keyset: the export is then ordered by
+primary key, newest first. MySQLdb buffers a whole result set client-side
+even with .iterator(), hence the batches rather than one long query.
+"""
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime
+from xml.sax.saxutils import escape
+
+from django.utils import timezone
+
+from accounts.models import Utilisateur
+from servicesbladi.pagination import seek_filter
+from .admin_filters import (
+    filter_appointments, filter_documents, filter_messages, filter_service_requests, filter_users,
+)
+from .models import Document, Message, RendezVous, ServiceRequest
+
+EXPORT_BATCH_SIZE = 2000
+
+# liste -> (modèle, filtres de la liste, colonnes (champ, en-tête))
+EXPORTS = {
+    'requests': (ServiceRequest, filter_service_requests, [
+        ('id', 'ID'),
+        ('title', 'Titre'),
+        ('status', 'Statut'),
+        ('priority', 'Priorité'),
+        ('is_urgent', 'Urgent'),
+        ('service__title', 'Service'),
+        ('client__email', 'Client'),
+        ('client__first_name', 'Prénom client'),
+        ('client__name', 'Nom client'),
+        ('expert__email', 'Expert'),
+        ('desired_date', 'Date souhaitée'),
+        ('created_at', 'Créée le'),
+        ('updated_at', 'Mise à jour le'),
+    ]),
+    'users': (Utilisateur, filter_users, [
+        ('id', 'ID'),
+        ('email', 'Email'),
+        ('first_name', 'Prénom'),
+        ('name', 'Nom'),
+        ('phone', 'Téléphone'),
+        ('account_type', 'Type de compte'),
+        ('is_active', 'Actif'),
+        ('is_verified', 'Vérifié'),
+        ('residence_country', 'Pays de résidence'),
+        ('date_joined', 'Inscrit le'),
+        ('last_login', 'Dernière connexion'),
+    ]),
+    'documents': (Document, filter_documents, [
+        ('id', 'ID'),
+        ('name', 'Nom'),
+        ('type', 'Type'),
+        ('is_official', 'Officiel'),
+        ('reference_number', 'Référence'),
+        ('uploaded_by__email', 'Déposé par'),
+        ('service_request_id', 'Demande'),
+        ('rendez_vous_id', 'Rendez-vous'),
+        ('mime_type', 'Type MIME'),
+        ('file_size', 'Taille (Ko)'),
+        ('upload_date', 'Déposé le'),
+    ]),
+    'appointments': (RendezVous, filter_appointments, [
+        ('id', 'ID'),
+        ('date_time', 'Date'),
+        ('duration', 'Durée (min)'),
+        ('consultation_type', 'Type'),
+        ('status', 'Statut'),
+        ('client__email', 'Client'),
+        ('expert__email', 'Expert'),
+        ('service__title', 'Service'),
+        ('service_request_id', 'Demande'),
+        ('notes', 'Notes'),
+        ('created_at', 'Créé le'),
+    ]),
+    'messages': (Message, filter_messages, [
+        ('id', 'ID'),
+        ('sent_at', 'Envoyé le'),
+        ('sender__email', 'Expéditeur'),
+        ('recipient__email', 'Destinataire'),
+        ('service_request_id', 'Demande'),
+        ('is_read', 'Lu'),
+        ('read_at', 'Lu le'),
+        ('content', 'Contenu'),
+    ]),
+}
+
+
+# Clé de tri unique de chaque liste, terminée par l'id (celle de sa pagination)
+EXPORT_ORDERINGS = {
+    'requests': ('-created_at', '-id'),
+    'users': ('-date_joined', '-id'),
+    'documents': ('-upload_date', '-id'),
+    'appointments': ('date_time', 'id'),
+    'messages': ('-sent_at', '-id'),
+}
+# Listes dont la recherche est classée par pertinence (search.search_queryset)
+RANKED_SEARCH_EXPORTS = {'requests', 'users', 'messages'}
+
+
+def export_rows(kind, params, batch_size=EXPORT_BATCH_SIZE):
+    """Yield the value tuples of every row of a list matching its filters, in the order of the list"""
+    model, filter_list, columns = EXPORTS[kind]
+    queryset = filter_list(model.objects.all(), params)
+    fields = [field for field, _ in columns]
+    # Recherche classée par pertinence : pas de curseur possible, ordre des ids
+    if params.get('search') and kind in RANKED_SEARCH_EXPORTS:
+        ordering = ('-id',)
+    else:
+        ordering = EXPORT_ORDERINGS[kind]
+    # Champs de tri lus avec la ligne (ajoutés s'ils ne sont pas exportés)
+    key_fields = [field.lstrip('-') for field in ordering]
+    extra = [field for field in key_fields if field not in fields]
+    positions = [(fields + extra).index(field) for field in key_fields]
+
+    last_key = None
+    while True:
+        batch = queryset.order_by(*ordering)
+        if last_key is not None:
+            batch = batch.filter(seek_filter(ordering, last_key, True))
+        rows = list(batch.values_list(*fields, *extra)[:batch_size])
+        if not rows:
+            return
+        for row in rows:
+            yield row[:len(fields)]
+        last_key = [rows[-1][position] for position in positions]
+
+
+def format_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'Oui' if value else 'Non'
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.strftime('%Y-%m-%d %H:%M')
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+
+# Tableurs : une cellule commençant par ces caractères serait évaluée comme formule
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _csv_cell(value):
+    value = format_cell(value)
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _LineBuffer:
+    """File-like object handing back what csv.writer writes"""
+    def write(self, value):
+        return value
+
+
+def stream_csv(kind, params):
+    """CSV lines (UTF-8 with BOM for Excel), one chunk per batch of rows"""
+    _, _, columns = EXPORTS[kind]
+    writer = csv.writer(_LineBuffer())
+    yield '\ufeff' + writer.writerow([header for _, header in columns])
+
+    lines = []
+    for row in export_rows(kind, params):
+        lines.append(writer.writerow([_csv_cell(value) for value in row]))
+        if len(lines) >= EXPORT_BATCH_SIZE:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+class _ZipStream(io.RawIOBase):
+    """Unseekable sink for zipfile: the written bytes are collected and popped by the generator"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Export" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" Type="http://schemas.openxmlformats.org/'
+        'officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+
+# Caractères de contrôle interdits en XML 1.0
+_XML_INVALID_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _xlsx_row(values):
+    cells = []
+    for value in values:
+        value = format_cell(value)
+        if isinstance(value, (int, float)):
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            text = escape(_XML_INVALID_RE.sub('', str(value)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f"<row>{''.join(cells)}</row>"
+
+
+def stream_xlsx(kind, params):
+    """
+    Minimal XLSX workbook (one sheet, inline strings, no styles) written by
+    zipfile to an unseekable stream, one chunk per batch of rows.
+    """
+    _, _, columns = EXPORTS[kind]
+    sink = _ZipStream()
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+
+        with archive.open('xl/worksheets/sheet1.xml', mode='w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + _xlsx_row([header for _, header in columns])
+            ).encode())
+
+            rows = []
+            for row in export_rows(kind, params):
+                rows.append(_xlsx_row(row))
+                if len(rows) >= EXPORT_BATCH_SIZE:
+                    sheet.write(''.join(rows).encode())
+                    rows = []
+                    yield sink.pop()
+            sheet.write((''.join(rows) + '</sheetData></worksheet>').encode())
+    yield sink.pop()
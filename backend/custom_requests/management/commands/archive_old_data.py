@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from custom_requests import retention
+
+
+class Command(BaseCommand):
+    help = 'Move the old read notifications and the messages of long-closed requests to the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--notification-days', type=int, help='Age of the read notifications to archive (NOTIFICATION_RETENTION_DAYS)')
+        parser.add_argument('--message-days', type=int, help='Days since a request was closed before archiving its messages (MESSAGE_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, help='Rows moved per transaction (RETENTION_BATCH_SIZE)')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches of each kind; the next run resumes')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the rows to archive')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            notifications = retention.notifications_to_archive(options['notification_days']).count()
+            messages = retention.messages_to_archive(options['message_days']).count()
+            self.stdout.write(f"{notifications} notification(s) and {messages} message(s) to archive")
+            return
+
+        batching = {'batch_size': options['batch_size'], 'max_batches': options['max_batches']}
+        notifications = retention.archive_notifications(options['notification_days'], **batching)
+        messages = retention.archive_messages(options['message_days'], **batching)
+        self.stdout.write(self.style.SUCCESS(
+            f"{notifications} notification(s) and {messages} message(s) archived"
+        ))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from custom_requests.models import Document
+from resources.models import ResourceFile
+from servicesbladi.upload_handlers import file_metadata
+
+
+class Command(BaseCommand):
+    help = 'Compute the MIME type, SHA-256 and size of the files stored before they were recorded at upload'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Rows read per query')
+
+    def handle(self, *args, **options):
+        for model in (Document, ResourceFile):
+            updated = missing = 0
+            last_pk = 0
+            while True:
+                batch = list(
+                    model.objects.filter(sha256='', pk__gt=last_pk).exclude(file='')
+                    .order_by('pk')[:options['batch_size']]
+                )
+                if not batch:
+                    break
+                for instance in batch:
+                    try:
+                        with instance.file.open('rb') as stored:
+                            metadata = file_metadata(stored)
+                    except (FileNotFoundError, OSError):
+                        missing += 1
+                        continue
+                    # update() : pas de save(), qui ne traite que les nouveaux fichiers
+                    model.objects.filter(pk=instance.pk).update(
+                        mime_type=metadata['mime_type'],
+                        sha256=metadata['sha256'],
+                        byte_size=metadata['size'],
+                        file_size=metadata['size'] // 1024,
+                    )
+                    updated += 1
+                last_pk = batch[-1].pk
+            self.stdout.write(f"{model._meta.verbose_name_plural}: {updated} updated, {missing} missing file(s)")
+
+        self.stdout.write(self.style.SUCCESS('File metadata backfilled'))
@@ -0,0 +1,96 @@
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import Utilisateur
+from custom_requests import message_sync
+from custom_requests.models import ServiceRequest, Message
+
+
+class Command(BaseCommand):
+    help = 'Load-test the keyset message sync against a conversation with many messages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=50000, help='Messages in the generated conversation')
+        parser.add_argument('--limit', type=int, default=message_sync.DEFAULT_PAGE_SIZE, help='Page size')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per scenario')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users and messages')
+
+    def handle(self, *args, **options):
+        client, expert, service_request = self.create_conversation(options['messages'])
+        try:
+            self.run_scenarios(client, expert, service_request, options['limit'], options['repeat'])
+        finally:
+            if not options['keep']:
+                # Les messages et la demande sont supprimés en cascade
+                Utilisateur.objects.filter(id__in=[client.id, expert.id]).delete()
+
+    def create_conversation(self, count):
+        tag = uuid.uuid4().hex[:8]
+        client = Utilisateur.objects.create_user(
+            email=f'bench-client-{tag}@example.com', password=None,
+            first_name='Bench', name='Client', account_type='client')
+        expert = Utilisateur.objects.create_user(
+            email=f'bench-expert-{tag}@example.com', password=None,
+            first_name='Bench', name='Expert', account_type='expert')
+        service_request = ServiceRequest.objects.create(
+            client=client, expert=expert, title='Bench', description='Message sync benchmark')
+
+        started = time.monotonic()
+        batch_size = 5000
+        with transaction.atomic():
+            for start in range(0, count, batch_size):
+                Message.objects.bulk_create([
+                    Message(
+                        sender=expert if index % 2 else client,
+                        recipient=client if index % 2 else expert,
+                        service_request=service_request,
+                        content=f'Message {index}',
+                        is_read=True,
+                    )
+                    for index in range(start, min(start + batch_size, count))
+                ])
+        self.stdout.write(f"Created {count} messages in {time.monotonic() - started:.1f}s")
+        return client, expert, service_request
+
+    def run_scenarios(self, client, expert, service_request, limit, repeat):
+        pair = message_sync.pair_messages(client, expert.id)
+        ids = list(service_request.messages.order_by('id').values_list('id', flat=True))
+        middle_id = ids[len(ids) // 2]
+        last_id = ids[-1]
+
+        def full_history():
+            # Ancien comportement d'api_messages : tout l'historique à chaque appel
+            legacy = Message.objects.filter(service_request=service_request).select_related('sender')
+            return [message_sync.serialize_message(m, client) for m in legacy.order_by('sent_at')]
+
+        def page(queryset, **cursors):
+            def run():
+                rows, _ = message_sync.message_page(queryset, limit=limit, **cursors)
+                return [message_sync.serialize_message(m, client) for m in rows]
+            return run
+
+        scenarios = [
+            ('legacy: full history', full_history, max(1, min(repeat, 3))),
+            ('latest page', page(pair), repeat),
+            ('since cursor, nothing new', page(pair, after_id=last_id), repeat),
+            ('since cursor, one page behind', page(pair, after_id=ids[-limit - 1]), repeat),
+            ('history page in the middle', page(pair, before_id=middle_id), repeat),
+            ('request chat: latest page', page(message_sync.request_conversation(service_request)), repeat),
+        ]
+
+        for label, func, runs in scenarios:
+            timings = []
+            for _ in range(runs):
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    rows = func()
+                    timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(
+                f"{label:<32} rows={len(rows):>6} queries={len(queries.captured_queries)} "
+                f"median={statistics.median(timings):8.2f} ms max={max(timings):8.2f} ms"
+            )
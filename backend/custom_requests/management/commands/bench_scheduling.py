@@ -0,0 +1,136 @@
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, time as clock, timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import Expert, Utilisateur
+from custom_requests import scheduling
+from custom_requests.models import AvailabilityException, ExpertAvailability, RendezVous
+
+SPECIALTIES = ['administratif', 'fiscal', 'immobilier', 'juridique', 'investissement']
+WINDOWS = [(clock(9), clock(12, 30)), (clock(14), clock(18))]
+
+
+class Command(BaseCommand):
+    help = 'Measure the free-slot computation and the overlap check on generated experts and appointments'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--experts', type=int, default=500, help='Experts to generate')
+        parser.add_argument('--days', type=int, default=90, help='Days of appointments and of the queried range')
+        parser.add_argument('--per-day', type=int, default=4, help='Appointments per expert and working day')
+        parser.add_argument('--repeat', type=int, default=5, help='Runs per measure')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users and appointments')
+
+    def handle(self, *args, **options):
+        users = self.create_schedules(options['experts'], options['days'], options['per_day'])
+        try:
+            self.run_measures(users, options['days'], options['repeat'])
+        finally:
+            if not options['keep']:
+                # Disponibilités et rendez-vous sont supprimés en cascade
+                Utilisateur.objects.filter(id__in=[user.id for user in users]).delete()
+
+    def create_schedules(self, count, days, per_day):
+        tag = uuid.uuid4().hex[:8]
+        rng = random.Random(42)
+        started = time.monotonic()
+        users = [
+            Utilisateur.objects.create_user(
+                email=f'bench-scheduling-{tag}-{index}@example.com', password=None,
+                first_name='Expert', name=str(index), account_type='expert')
+            for index in range(count)
+        ]
+        client = Utilisateur.objects.create_user(
+            email=f'bench-scheduling-{tag}-client@example.com', password=None,
+            first_name='Client', name='Bench', account_type='client')
+        users.append(client)
+        experts = users[:-1]
+
+        Expert.objects.bulk_create([
+            Expert(user=user, specialty=SPECIALTIES[index % len(SPECIALTIES)])
+            for index, user in enumerate(experts)
+        ])
+        ExpertAvailability.objects.bulk_create([
+            ExpertAvailability(expert=user, weekday=weekday, start_time=start, end_time=end)
+            for user in experts for weekday in range(5) for start, end in WINDOWS
+        ])
+
+        today = timezone.localdate() + timedelta(days=1)
+        exceptions = []
+        appointments = []
+        for user in experts:
+            # Un jour de congé par mois et par expert
+            for offset in range(rng.randrange(30), days, 30):
+                exceptions.append(AvailabilityException(expert=user, date=today + timedelta(days=offset)))
+            for offset in range(days):
+                day = today + timedelta(days=offset)
+                if day.weekday() >= 5:
+                    continue
+                for hour in rng.sample([9, 10, 11, 14, 15, 16, 17], per_day):
+                    start = timezone.make_aware(datetime.combine(day, clock(hour)), timezone.get_default_timezone())
+                    # bulk_create n'appelle pas save() : ends_at est renseigné ici
+                    appointments.append(RendezVous(
+                        client=client, expert=user, date_time=start, duration=60,
+                        ends_at=start + timedelta(minutes=60), status='scheduled'))
+        AvailabilityException.objects.bulk_create(exceptions)
+        for start in range(0, len(appointments), 5000):
+            with transaction.atomic():
+                RendezVous.objects.bulk_create(appointments[start:start + 5000])
+        self.stdout.write(
+            f"Created {len(experts)} experts, {len(appointments)} appointments and "
+            f"{len(exceptions)} days off in {time.monotonic() - started:.1f}s"
+        )
+        return users
+
+    def measure(self, label, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - started) * 1000)
+        self.stdout.write(
+            f"{label:<42} {result:>9} median={statistics.median(timings):9.2f} ms max={max(timings):9.2f} ms"
+        )
+
+    def run_measures(self, users, days, repeat):
+        experts = [user.id for user in users[:-1]]
+        client = users[-1]
+        start = timezone.localdate() + timedelta(days=1)
+        end = start + timedelta(days=days - 1)
+        specialty = scheduling.specialty_experts(SPECIALTIES[0])
+
+        self.measure(f'free intervals, 1 expert x {days} days',
+                     lambda: len(scheduling.free_intervals(experts[:1], start, end)[experts[0]]), repeat)
+        self.measure(f'free slots, 1 expert x {days} days',
+                     lambda: len(scheduling.free_slots(experts[:1], start, end)[experts[0]]), repeat)
+        self.measure(f'free slots, specialty ({len(specialty)}) x 14 days',
+                     lambda: sum(map(len, scheduling.free_slots(specialty, start, start + timedelta(days=13)).values())),
+                     repeat)
+        self.measure(f'free intervals, {len(experts)} experts x {days} days',
+                     lambda: sum(map(len, scheduling.free_intervals(experts, start, end).values())), repeat)
+        self.measure(f'free slots, {len(experts)} experts x {days} days',
+                     lambda: sum(map(len, scheduling.free_slots(experts, start, end).values())), repeat)
+
+        rng = random.Random(7)
+        tz = timezone.get_default_timezone()
+
+        def book_random():
+            # Créneaux au hasard, occupés ou libres : compte les réservations acceptées
+            accepted = 0
+            for _ in range(100):
+                day = start + timedelta(days=rng.randrange(days))
+                moment = timezone.make_aware(datetime.combine(day, clock(rng.choice([9, 10, 11, 14, 15, 16, 17]))), tz)
+                try:
+                    scheduling.book_appointment(client=client, expert_id=rng.choice(experts),
+                                                date_time=moment, duration=60)
+                    accepted += 1
+                except scheduling.SchedulingError:
+                    pass
+            return accepted
+
+        self.measure('100 bookings with overlap check', book_random, repeat)
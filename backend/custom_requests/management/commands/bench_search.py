@@ -0,0 +1,106 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from accounts.models import Utilisateur
+from custom_requests import search
+from custom_requests.models import SearchToken, ServiceRequest
+
+FIRST_NAMES = ['Hélène', 'Joël', 'François', 'Zoé', 'Mohamed', 'Fatima Zahra', 'Youssef', 'Inès',
+               'محمد', 'فاطمة', 'يوسف', 'أمينة', 'إبراهيم', 'Aïcha', 'Noémie', 'Rachid']
+LAST_NAMES = ['Benali', 'El Idrissi', 'Lefèvre', 'Chraïbi', 'Naciri', 'Dupré', 'Ouazzani', 'Berrada',
+              'العلوي', 'الإدريسي', 'بنعلي', 'Tazi', 'Mansouri', 'Bennani', 'Gauthier', 'Lemaître']
+WORDS = ['visa', 'passeport', 'succession', 'impôt', 'déclaration', 'terrain', 'achat', 'location',
+         'investissement', 'société', 'création', 'acte', 'naissance', 'mariage', 'douane', 'retraite']
+
+
+class Command(BaseCommand):
+    help = 'Compare the admin request search (token index) with the legacy icontains scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200000, help='Service requests to generate')
+        parser.add_argument('--repeat', type=int, default=10, help='Runs per query')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated users and requests')
+
+    def handle(self, *args, **options):
+        users, request_ids = self.create_requests(options['requests'])
+        try:
+            self.run_queries(request_ids, options['repeat'])
+        finally:
+            if not options['keep']:
+                SearchToken.objects.filter(kind='request', object_id__in=ServiceRequest.objects.filter(
+                    client__in=users).values('pk')).delete()
+                SearchToken.objects.filter(kind='user', object_id__in=[user.id for user in users]).delete()
+                # Les demandes sont supprimées en cascade
+                Utilisateur.objects.filter(id__in=[user.id for user in users]).delete()
+
+    def create_requests(self, count):
+        tag = uuid.uuid4().hex[:8]
+        rng = random.Random(42)
+        users = [
+            Utilisateur.objects.create_user(
+                email=f'bench-search-{tag}-{index}@example.com', password=None,
+                first_name=rng.choice(FIRST_NAMES), name=rng.choice(LAST_NAMES),
+                account_type='expert' if index % 10 == 0 else 'client')
+            for index in range(200)
+        ]
+        experts = [user for user in users if user.account_type == 'expert']
+        clients = [user for user in users if user.account_type == 'client']
+
+        started = time.monotonic()
+        request_ids = []
+        batch_size = 2000
+        for start in range(0, count, batch_size):
+            with transaction.atomic():
+                batch = ServiceRequest.objects.bulk_create([
+                    ServiceRequest(
+                        client=rng.choice(clients),
+                        expert=rng.choice(experts) if index % 3 else None,
+                        title=' '.join(rng.sample(WORDS, 2)).capitalize(),
+                        description=' '.join(rng.choices(WORDS, k=12)),
+                    )
+                    for index in range(start, min(start + batch_size, count))
+                ])
+                if batch[0].pk is None:
+                    # MySQL ne renvoie pas les clés d'un INSERT multiple
+                    batch = list(ServiceRequest.objects.filter(client__in=clients).order_by('-pk')[:len(batch)])
+                search.index_objects('request', ServiceRequest.objects.filter(
+                    pk__in=[service_request.pk for service_request in batch]
+                ).select_related('client', 'expert', 'service'))
+                request_ids.extend(service_request.pk for service_request in batch)
+        self.stdout.write(f"Created and indexed {count} requests in {time.monotonic() - started:.1f}s")
+        return users, request_ids
+
+    def run_queries(self, request_ids, repeat):
+        def legacy(query):
+            # Ancien filtre d'admin_requests_view
+            return list(ServiceRequest.objects.filter(
+                Q(description__icontains=query) |
+                Q(service__title__icontains=query) |
+                Q(client__first_name__icontains=query) |
+                Q(client__name__icontains=query) |
+                Q(expert__first_name__icontains=query) |
+                Q(expert__name__icontains=query)
+            ).order_by('-created_at').values_list('pk', flat=True)[:10])
+
+        def indexed(query):
+            return list(search.search_queryset(
+                ServiceRequest.objects.all(), 'request', query
+            ).values_list('pk', flat=True)[:10])
+
+        for query in ['Lefèvre', 'helene benali', 'succession terrain', 'محمد العلوي', 'chraibi visa']:
+            for label, func, runs in [('legacy', legacy, max(1, min(repeat, 3))), ('index', indexed, repeat)]:
+                timings = []
+                for _ in range(runs):
+                    started = time.perf_counter()
+                    rows = func(query)
+                    timings.append((time.perf_counter() - started) * 1000)
+                self.stdout.write(
+                    f"{query:<20} {label:<7} rows={len(rows):>3} "
+                    f"median={statistics.median(timings):8.2f} ms max={max(timings):8.2f} ms"
+                )
@@ -0,0 +1,134 @@
+import json
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.models import Utilisateur
+from custom_requests.models import ServiceRequest, Document, RendezVous, Message, Notification
+
+
+def _user_id(account_type):
+    """Return the id of a sample user of the given type (or 0 so EXPLAIN still runs)"""
+    return Utilisateur.objects.filter(account_type=account_type).values_list('id', flat=True).first() or 0
+
+
+def hot_queries(client_id, expert_id, admin_id):
+    """Querysets mirroring the queries issued by dashboard_views, views and admin_views"""
+    now = timezone.now()
+    active = ['new', 'in_progress', 'pending_info']
+    return [
+        # dashboard_views.py
+        ('dashboard: client active requests',
+         ServiceRequest.objects.filter(client_id=client_id, status__in=active)),
+        ('dashboard: client recent requests',
+         ServiceRequest.objects.filter(client_id=client_id).order_by('-created_at')[:3]),
+        ('dashboard: expert active requests',
+         ServiceRequest.objects.filter(expert_id=expert_id, status__in=active)),
+        ('dashboard: expert recent requests',
+         ServiceRequest.objects.filter(expert_id=expert_id).order_by('-created_at')[:3]),
+        ('dashboard: unread notifications count',
+         Notification.objects.filter(user_id=client_id, is_read=False)),
+        ('dashboard: recent notifications',
+         Notification.objects.filter(user_id=client_id).order_by('-created_at')[:5]),
+        ('dashboard: upcoming appointments',
+         RendezVous.objects.filter(client_id=client_id, date_time__gte=now,
+                                   status__in=['scheduled', 'confirmed']).order_by('date_time')[:3]),
+        ('dashboard: recent admin requests',
+         ServiceRequest.objects.order_by('-created_at')[:5]),
+        # views.py
+        ('views: client requests list',
+         ServiceRequest.objects.filter(client_id=client_id).order_by('-created_at')),
+        ('views: request messages',
+         Message.objects.filter(service_request_id=0).order_by('sent_at')),
+        ('views: user messages',
+         Message.objects.filter(Q(sender_id=client_id) | Q(recipient_id=client_id)).order_by('-sent_at')),
+        ('views: conversation unread',
+         Message.objects.filter(sender_id=expert_id, recipient_id=client_id, is_read=False)),
+        ('views: notifications list',
+         Notification.objects.filter(user_id=client_id).order_by('-created_at')),
+        ('views: request documents',
+         Document.objects.filter(service_request_id=0).order_by('-upload_date')),
+        # admin_views.py
+        ('admin: requests by status',
+         ServiceRequest.objects.filter(status='in_progress').order_by('-created_at')[:10]),
+        ('admin: unread messages',
+         Message.objects.filter(is_read=False).order_by('-sent_at')[:20]),
+        ('admin: latest messages',
+         Message.objects.order_by('-sent_at')[:20]),
+        ('admin: user requests',
+         ServiceRequest.objects.filter(expert_id=expert_id).order_by('-created_at')),
+        ('admin: admin notifications',
+         Notification.objects.filter(user_id=admin_id, is_read=False).order_by('-created_at')),
+    ]
+
+
+def find_full_scans(vendor, plan):
+    """Return the lines of an EXPLAIN output that describe a full table scan"""
+    if vendor == 'mysql':
+        try:
+            data = json.loads(plan)
+        except ValueError:
+            return [line for line in plan.splitlines() if re.search(r"'ALL'|\bALL\b", line)]
+        scans = []
+
+        def walk(node):
+            if isinstance(node, dict):
+                if node.get('access_type') == 'ALL':
+                    scans.append(f"full scan on {node.get('table_name', '?')}")
+                for value in node.values():
+                    walk(value)
+            elif isinstance(node, list):
+                for value in node:
+                    walk(value)
+
+        walk(data)
+        return scans
+    if vendor == 'postgresql':
+        return [line.strip() for line in plan.splitlines() if 'Seq Scan' in line]
+    if vendor == 'sqlite':
+        return [line.strip() for line in plan.splitlines()
+                if re.search(r'\bSCAN\b', line) and 'INDEX' not in line]
+    return []
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on the hot dashboard/list queries and report any full table scan'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--client', type=int, help='Client user id used in the sample queries')
+        parser.add_argument('--expert', type=int, help='Expert user id used in the sample queries')
+        parser.add_argument('--admin', type=int, help='Admin user id used in the sample queries')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print the full plan of every query')
+        parser.add_argument('--fail-on-scan', action='store_true', help='Exit with an error if a full scan is found')
+
+    def handle(self, *args, **options):
+        vendor = connection.vendor
+        client_id = options['client'] or _user_id('client')
+        expert_id = options['expert'] or _user_id('expert')
+        admin_id = options['admin'] or _user_id('admin')
+
+        explain_options = {'format': 'json'} if vendor == 'mysql' else {}
+        self.stdout.write(f"Explaining hot queries on {vendor}")
+
+        offenders = 0
+        for label, queryset in hot_queries(client_id, expert_id, admin_id):
+            plan = queryset.explain(**explain_options)
+            scans = find_full_scans(vendor, plan)
+
+            if scans:
+                offenders += 1
+                self.stdout.write(self.style.WARNING(f"FULL SCAN  {label}"))
+                for scan in scans:
+                    self.stdout.write(f"    {scan}")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"ok         {label}"))
+
+            if options['verbose_plans']:
+                self.stdout.write(plan)
+
+        self.stdout.write(f"{offenders} queries with full scans")
+        if offenders and options['fail_on_scan']:
+            raise CommandError(f"{offenders} hot queries perform full table scans")
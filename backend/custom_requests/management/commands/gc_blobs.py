@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from servicesbladi import storage
+
+
+class Command(BaseCommand):
+    help = 'Delete the content-addressed blobs no document or resource file references any more'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+        parser.add_argument('--recount', action='store_true',
+                            help='First recompute every reference count from the referencing tables')
+        parser.add_argument('--orphans', action='store_true',
+                            help='Also delete the blob files that have no Blob row')
+        parser.add_argument('--batch-size', type=int, default=500, help='Blobs examined per query')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        if options['recount']:
+            fixed = storage.recount_references(dry_run=dry_run)
+            self.stdout.write(f"{fixed} reference count(s) fixed")
+
+        deleted, freed = storage.collect_garbage(dry_run=dry_run, batch_size=options['batch_size'])
+        self.stdout.write(f"{deleted} unreferenced blob(s), {freed / 1024 / 1024:.1f} MB")
+
+        if options['orphans']:
+            blobs = storage.blob_storage()
+            orphans = 0
+            for name in storage.orphan_files():
+                orphans += 1
+                if not dry_run:
+                    blobs.delete(name)
+            self.stdout.write(f"{orphans} orphan file(s)")
+
+        verb = 'would be reclaimed' if dry_run else 'reclaimed'
+        self.stdout.write(self.style.SUCCESS(f"Blob storage {verb}"))
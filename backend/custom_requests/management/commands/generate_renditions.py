@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import Utilisateur
+from custom_requests.models import Document
+from servicesbladi import renditions
+
+
+class Command(BaseCommand):
+    help = 'Generate the thumbnails of the existing documents and profile pictures'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Render again the files that already have thumbnails')
+        parser.add_argument('--workers', type=int, default=4, help='Files rendered in parallel')
+
+    def _sources(self):
+        seen = set()
+        documents = Document.objects.exclude(file='').values_list('file', 'mime_type').order_by()
+        storage = Document._meta.get_field('file').storage
+        # Un contenu partagé par plusieurs documents n'est rendu qu'une fois
+        for name, mime_type in documents.iterator():
+            if name not in seen and renditions.is_supported(mime_type):
+                seen.add(name)
+                yield storage, name, mime_type
+
+        users = Utilisateur.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True)
+        for user in users.only('pk', 'profile_picture').iterator():
+            mime_type = user._profile_picture_type()
+            if renditions.is_supported(mime_type):
+                yield user.profile_picture.storage, user.profile_picture.name, mime_type
+
+    def handle(self, *args, **options):
+        if renditions.pdf_renderer() is None:
+            self.stdout.write(self.style.WARNING('pdftoppm not found: PDF documents are skipped'))
+
+        rendered = failed = 0
+        with ThreadPoolExecutor(max_workers=max(1, options['workers'])) as pool:
+            results = pool.map(
+                lambda source: renditions.generate(*source, force=options['force']),
+                self._sources(),
+            )
+            for ok in results:
+                if ok:
+                    rendered += 1
+                else:
+                    failed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"{rendered} file(s) with thumbnails, {failed} failed"))
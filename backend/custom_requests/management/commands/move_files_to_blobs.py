@@ -0,0 +1,48 @@
+from django.apps import apps
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from servicesbladi import storage
+from servicesbladi.upload_handlers import file_metadata
+
+
+class Command(BaseCommand):
+    help = 'Move the documents and resource files stored before the content-addressed storage into it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Rows moved per query')
+        parser.add_argument('--dry-run', action='store_true', help='Only count the files to move')
+
+    def handle(self, *args, **options):
+        blobs = storage.blob_storage()
+        for label, field_name in storage.BLOB_REFERENCES:
+            model = apps.get_model(label)
+            legacy = model.objects.exclude(**{f'{field_name}__startswith': storage.BLOB_PREFIX}).exclude(**{field_name: ''})
+            if options['dry_run']:
+                self.stdout.write(f"{label}: {legacy.count()} file(s) to move")
+                continue
+
+            moved = missing = 0
+            last_pk = 0
+            while True:
+                batch = list(legacy.filter(pk__gt=last_pk).order_by('pk').values_list('pk', field_name)[:options['batch_size']])
+                if not batch:
+                    break
+                last_pk = batch[-1][0]
+                for pk, old_name in batch:
+                    if not blobs.exists(old_name):
+                        missing += 1
+                        continue
+                    with blobs.open(old_name, 'rb') as stored:
+                        content = File(stored, name=old_name)
+                        metadata = file_metadata(content)
+                        new_name = blobs.save(old_name, content)
+                    # update() : les receivers de save() ne s'appliquent pas, la référence est comptée ici
+                    model.objects.filter(pk=pk).update(**{field_name: new_name, 'sha256': metadata['sha256']})
+                    storage.add_reference(new_name)
+                    if not storage.referenced([old_name]):
+                        blobs.delete(old_name)
+                    moved += 1
+            self.stdout.write(f"{label}: {moved} file(s) moved, {missing} missing")
+
+        self.stdout.write(self.style.SUCCESS('Files moved to the blob storage'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from custom_requests.uploads import purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Remove the expired resumable upload sessions and their temporary files'
+
+    def handle(self, *args, **options):
+        removed = purge_expired()
+        self.stdout.write(self.style.SUCCESS(f"{removed} expired upload session(s) removed"))
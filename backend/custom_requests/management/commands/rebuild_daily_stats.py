@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from custom_requests.stats import invalidate_admin_stats, rebuild_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the DailyStat rollups from the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Only rebuild the last N days (default: the whole history)')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days']:
+            since = timezone.localdate() - timedelta(days=options['days'] - 1)
+
+        days = rebuild_daily_stats(since=since)
+        invalidate_admin_stats()
+        self.stdout.write(self.style.SUCCESS(f"{days} day(s) of statistics rebuilt"))
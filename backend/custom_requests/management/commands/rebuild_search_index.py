@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from custom_requests import search
+from custom_requests.models import SearchToken
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the admin search index (SearchToken) from the source tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kinds', nargs='*', metavar='kind',
+                            help=f"Object kinds to index among {', '.join(sorted(search.DOCUMENTS))} (default: all)")
+        parser.add_argument('--batch-size', type=int, default=1000, help='Objects indexed per transaction')
+        parser.add_argument('--prune', action='store_true',
+                            help='Also delete the tokens of deleted objects')
+
+    def handle(self, *args, **options):
+        unknown = set(options['kinds']) - set(search.DOCUMENTS)
+        if unknown:
+            raise CommandError(f"Unknown kind(s): {', '.join(sorted(unknown))}")
+
+        for kind in options['kinds'] or sorted(search.DOCUMENTS):
+            started = time.monotonic()
+            count = search.reindex(kind, batch_size=options['batch_size'])
+            self.stdout.write(f"{kind}: {count} object(s) indexed in {time.monotonic() - started:.1f}s")
+
+            if options['prune']:
+                model = search.DOCUMENTS[kind][0]
+                pruned, _ = SearchToken.objects.filter(kind=kind).exclude(
+                    object_id__in=model.objects.values('pk')
+                ).delete()
+                self.stdout.write(f"{kind}: {pruned} orphan token(s) deleted")
+
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
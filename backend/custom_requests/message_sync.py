@@ -0,0 +1,113 @@
+import heapq
+
+from django.utils import timezone
+
+from .models import ArchivedMessage, Message
+from .read_receipts import mark_read_up_to
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+# A conversation is a tuple of querysets, each one an index range on (…, id).
+# A single OR between the two directions of a private conversation would make
+# the database sort every message of the pair before applying LIMIT.
+
+def pair_messages(user, other_user_id):
+    """Messages exchanged between two users, one queryset per direction"""
+    return (
+        Message.objects.filter(sender=user, recipient_id=other_user_id),
+        Message.objects.filter(sender_id=other_user_id, recipient=user),
+    )
+
+
+def request_conversation(service_request):
+    """Messages of the chat attached to a service request, the archived ones included"""
+    # Les messages archivés gardent leur id d'origine : les curseurs restent valables
+    return (
+        Message.objects.filter(service_request=service_request),
+        ArchivedMessage.objects.filter(service_request=service_request),
+    )
+
+
+def parse_cursor(value):
+    """Return a positive message id, or None when the parameter is absent or invalid"""
+    try:
+        cursor = int(value)
+    except (TypeError, ValueError):
+        return None
+    return cursor if cursor >= 0 else None
+
+
+def parse_limit(value):
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def message_page(conversation, after_id=None, before_id=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return one keyset page of a conversation, oldest first.
+
+    - after_id: messages newer than this id (incremental sync)
+    - before_id: messages older than this id (scrolling back in history)
+    - neither: the latest messages of the conversation
+
+    Message ids grow with sent_at, so paging on the primary key walks the
+    (…, id) indexes instead of counting OFFSET rows. Each queryset of the
+    conversation reads at most limit + 1 rows and the results are merged.
+    Returns the messages and whether more rows exist in the direction read.
+    """
+    if after_id is not None:
+        branches = [
+            queryset.select_related('sender').filter(id__gt=after_id).order_by('id')[:limit + 1]
+            for queryset in conversation
+        ]
+        rows = list(heapq.merge(*branches, key=lambda message: message.id))
+        return rows[:limit], len(rows) > limit
+
+    branches = []
+    for queryset in conversation:
+        if before_id is not None:
+            queryset = queryset.filter(id__lt=before_id)
+        branches.append(queryset.select_related('sender').order_by('-id')[:limit + 1])
+    rows = list(heapq.merge(*branches, key=lambda message: message.id, reverse=True))
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, has_more
+
+
+def mark_page_read(user, messages, sender_id=None, service_request_id=None):
+    """Mark as read, up to the newest delivered one, the messages addressed to the user"""
+    received = [message for message in messages if message.recipient_id == user.id]
+    if not any(not message.is_read for message in received):
+        return 0
+    now = timezone.now()
+    for message in received:
+        if not message.is_read:
+            message.is_read = True
+            message.read_at = now
+    return mark_read_up_to(
+        user,
+        up_to_id=received[-1].id,
+        sender_id=sender_id,
+        service_request_id=service_request_id,
+    )
+
+
+def serialize_message(message, user):
+    return {
+        'id': message.id,
+        'sender': {
+            'id': message.sender.id,
+            'name': f"{message.sender.name} {message.sender.first_name}",
+            'account_type': message.sender.account_type
+        },
+        'content': message.content,
+        'sent_at': message.sent_at.isoformat(),
+        'is_read': message.is_read,
+        'is_mine': message.sender_id == user.id
+    }
@@ -8,6 +8,9 @@ from django.views.decorators.csrf import csrf_exempt
 
 from accounts.models import Utilisateur, Client, Expert
 from .models import Message, Notification, ServiceRequest
+from .conversations import conversation_summaries
+from .message_sync import parse_cursor
+from .read_receipts import mark_read_up_to
 
 @login_required
 def client_messages_view(request):
@@ -16,68 +19,43 @@ def client_messages_view(request):
     active_contact_id = request.GET.get('contact')
     active_contact = None
     messages_list = []
+    last_message_id = 0
     
-    # Get all messages for this user
-    all_messages = Message.objects.filter(
-        Q(sender=request.user) | Q(recipient=request.user)
-    ).order_by('-sent_at')
-    
-    # Group messages by conversation
-    conversations = {}
-    for message in all_messages:
-        # Determine the other party in the conversation
-        other_party = message.recipient if message.sender == request.user else message.sender
-        
-        # Create a unique key for this conversation
-        conversation_key = f"{min(request.user.id, other_party.id)}_{max(request.user.id, other_party.id)}"
-        
-        if conversation_key not in conversations:
-            conversations[conversation_key] = {
-                'user': other_party,
-                'latest_message': message,
-                'unread_count': 1 if message.recipient == request.user and not message.is_read else 0,
-                'last_message': message.content[:50] + '...' if len(message.content) > 50 else message.content,
-                'last_message_time': message.sent_at
-            }
-        else:
-            # Update latest message if this one is newer
-            if message.sent_at > conversations[conversation_key]['latest_message'].sent_at:
-                conversations[conversation_key]['latest_message'] = message
-                conversations[conversation_key]['last_message'] = message.content[:50] + '...' if len(message.content) > 50 else message.content
-                conversations[conversation_key]['last_message_time'] = message.sent_at
-            
-            # Update unread count
-            if message.recipient == request.user and not message.is_read:
-                conversations[conversation_key]['unread_count'] += 1
-    
-    # Convert dictionary to list and sort by latest message date
-    contacts = sorted(
-        conversations.values(),
-        key=lambda x: x['latest_message'].sent_at,
-        reverse=True
-    )
+    # Conversations grouped in SQL, most recent first
+    contacts = []
+    for conversation in conversation_summaries(request.user):
+        message = conversation['latest_message']
+        contacts.append({
+            'user': conversation['other_party'],
+            'latest_message': message,
+            'unread_count': conversation['unread_count'],
+            'last_message': message.content[:50] + '...' if len(message.content) > 50 else message.content,
+            'last_message_time': message.sent_at
+        })
     
     # If a contact is selected, get conversation with that contact
     if active_contact_id:
         active_contact = get_object_or_404(Utilisateur, id=active_contact_id)
         
         # Get conversation messages
-        messages_list = Message.objects.filter(
+        messages_list = list(Message.objects.filter(
             (Q(sender=request.user) & Q(recipient=active_contact)) |
             (Q(sender=active_contact) & Q(recipient=request.user))
-        ).order_by('sent_at')
+        ).order_by('sent_at'))
         
-        # Mark messages as read
-        unread_messages = messages_list.filter(recipient=request.user, is_read=False)
-        unread_messages.update(is_read=True, read_at=timezone.now())
+        # Mark messages as read, up to the last one shown (after_id of the checks)
+        if messages_list:
+            last_message_id = messages_list[-1].id
+            mark_read_up_to(request.user, up_to_id=last_message_id, sender_id=active_contact.id)
     
     # Count total unread messages
-    unread_messages_count = sum([conv['unread_count'] for conv in conversations.values()])
+    unread_messages_count = sum([conv['unread_count'] for conv in contacts])
     
     context = {
         'contacts': contacts,
         'messages': messages_list,
         'active_contact': active_contact,
+        'last_message_id': last_message_id,
         'unread_messages_count': unread_messages_count
     }
     
@@ -135,12 +113,15 @@ def client_check_messages(request):
     try:
         contact = get_object_or_404(Utilisateur, id=contact_id)
         
-        # Check for new unread messages from this contact
-        new_messages = Message.objects.filter(
-            sender=contact,
-            recipient=request.user,
-            is_read=False
-        ).exists()
+        # Messages received after the last one shown (after_id): a range of the
+        # (sender, recipient, id) index; without it, any unread message
+        new_messages = Message.objects.filter(sender=contact, recipient=request.user)
+        after_id = parse_cursor(request.GET.get('after_id'))
+        if after_id is not None:
+            new_messages = new_messages.filter(id__gt=after_id)
+        else:
+            new_messages = new_messages.filter(is_read=False)
+        new_messages = new_messages.exists()
         
         return JsonResponse({
             'success': True,
@@ -158,56 +139,37 @@ def expert_messages_view(request):
     active_client_id = request.GET.get('client')
     active_client = None
     messages_list = []
+    last_message_id = 0
     
-    # Get all messages for this expert
-    all_messages = Message.objects.filter(
-        Q(sender=request.user) | Q(recipient=request.user)
-    ).order_by('-sent_at')
-    
-    # Group messages by conversation (similar to client_messages_view)
-    conversations = {}
-    for message in all_messages:
-        other_party = message.recipient if message.sender == request.user else message.sender
-        conversation_key = f"{min(request.user.id, other_party.id)}_{max(request.user.id, other_party.id)}"
-        
-        if other_party.account_type != 'client':
-            continue  # Only show conversations with clients
-        
-        # Similar logic to client_messages_view...
-        if conversation_key not in conversations:
-            conversations[conversation_key] = {
-                'id': other_party.id,
-                'name': f"{other_party.name} {other_party.first_name}",
-                'email': other_party.email,
-                'latest_message': message.content[:50] + '...' if len(message.content) > 50 else message.content,
-                'unread_count': 1 if message.recipient == request.user and not message.is_read else 0,
-                'time': message.sent_at,
-                'is_online': False  # This could be updated with a real online status system
-            }
-        else:
-            if message.recipient == request.user and not message.is_read:
-                conversations[conversation_key]['unread_count'] += 1
-    
-    # Convert dictionary to list and sort by latest message time
-    clients = sorted(
-        conversations.values(),
-        key=lambda x: x['time'],
-        reverse=True
-    )
+    # Conversations with clients only, grouped in SQL and most recent first
+    clients = []
+    for conversation in conversation_summaries(request.user, counterpart_type='client'):
+        other_party = conversation['other_party']
+        message = conversation['latest_message']
+        clients.append({
+            'id': other_party.id,
+            'name': f"{other_party.name} {other_party.first_name}",
+            'email': other_party.email,
+            'latest_message': message.content[:50] + '...' if len(message.content) > 50 else message.content,
+            'unread_count': conversation['unread_count'],
+            'time': message.sent_at,
+            'is_online': False  # This could be updated with a real online status system
+        })
     
     # If a client is selected, get conversation with that client
     if active_client_id:
         active_client = get_object_or_404(Utilisateur, id=active_client_id)
         
         # Get conversation messages
-        messages_list = Message.objects.filter(
+        messages_list = list(Message.objects.filter(
             (Q(sender=request.user) & Q(recipient=active_client)) |
             (Q(sender=active_client) & Q(recipient=request.user))
-        ).order_by('sent_at')
+        ).order_by('sent_at'))
         
-        # Mark messages as read
-        unread_messages = messages_list.filter(recipient=request.user, is_read=False)
-        unread_messages.update(is_read=True, read_at=timezone.now())
+        # Mark messages as read, up to the last one shown (after_id of the checks)
+        if messages_list:
+            last_message_id = messages_list[-1].id
+            mark_read_up_to(request.user, up_to_id=last_message_id, sender_id=active_client.id)
     
     # Count total unread messages
     unread_messages_count = sum([client.get('unread_count', 0) for client in clients])
@@ -216,6 +178,7 @@ def expert_messages_view(request):
         'clients': clients,
         'messages': messages_list,
         'active_client': active_client,
+        'last_message_id': last_message_id,
         'unread_messages_count': unread_messages_count
     }
     
@@ -275,12 +238,15 @@ def expert_check_messages(request):
     try:
         client = get_object_or_404(Utilisateur, id=client_id, account_type='client')
         
-        # Check for new unread messages from this client
-        new_messages = Message.objects.filter(
-            sender=client,
-            recipient=request.user,
-            is_read=False
-        ).exists()
+        # Messages received after the last one shown (after_id): a range of the
+        # (sender, recipient, id) index; without it, any unread message
+        new_messages = Message.objects.filter(sender=client, recipient=request.user)
+        after_id = parse_cursor(request.GET.get('after_id'))
+        if after_id is not None:
+            new_messages = new_messages.filter(id__gt=after_id)
+        else:
+            new_messages = new_messages.filter(is_read=False)
+        new_messages = new_messages.exists()
         
         return JsonResponse({
             'success': True,
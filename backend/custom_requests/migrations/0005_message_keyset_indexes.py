@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 07:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custom_requests', '0004_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['sender', 'recipient', 'id'], name='msg_pair_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['service_request', 'id'], name='msg_request_id_idx'),
+        ),
+    ]
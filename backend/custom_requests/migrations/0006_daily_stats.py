@@ -0,0 +1,30 @@
+# Generated by Django 4.2 on 2026-10-18 07:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custom_requests', '0005_message_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True, verbose_name='date')),
+                ('new_users', models.PositiveIntegerField(default=0, verbose_name='new users')),
+                ('new_requests', models.PositiveIntegerField(default=0, verbose_name='new requests')),
+                ('new_appointments', models.PositiveIntegerField(default=0, verbose_name='new appointments')),
+                ('new_documents', models.PositiveIntegerField(default=0, verbose_name='new documents')),
+                ('new_messages', models.PositiveIntegerField(default=0, verbose_name='new messages')),
+            ],
+            options={
+                'verbose_name': 'daily statistic',
+                'verbose_name_plural': 'daily statistics',
+                'ordering': ['-date'],
+            },
+        ),
+    ]
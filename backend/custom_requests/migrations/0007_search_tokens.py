@@ -0,0 +1,35 @@
+# Generated by Django 4.2 on 2026-10-18 07:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custom_requests', '0006_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('request', 'Service request'), ('user', 'User'), ('message', 'Message')], max_length=10, verbose_name='kind')),
+                ('object_id', models.BigIntegerField(verbose_name='object id')),
+                ('token', models.CharField(max_length=40, verbose_name='token')),
+                ('weight', models.PositiveSmallIntegerField(default=1, verbose_name='weight')),
+            ],
+            options={
+                'verbose_name': 'search token',
+                'verbose_name_plural': 'search tokens',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='searchtoken',
+            index=models.Index(fields=['kind', 'token', 'object_id', 'weight'], name='search_kind_token_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='searchtoken',
+            constraint=models.UniqueConstraint(fields=('kind', 'object_id', 'token'), name='search_kind_object_token_uniq'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2 on 2026-10-18 08:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custom_requests', '0007_search_tokens'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['-upload_date', '-id'], name='doc_upload_desc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rendezvous',
+            index=models.Index(fields=['date_time', 'id'], name='rdv_date_time_id_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 4.2 on 2026-10-18 08:12
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('custom_requests', '0008_admin_sort_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255, verbose_name='file name')),
+                ('size', models.BigIntegerField(verbose_name='size in bytes')),
+                ('chunk_size', models.PositiveIntegerField(verbose_name='chunk size in bytes')),
+                ('mime_type', models.CharField(blank=True, max_length=100, verbose_name='MIME type')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('expires_at', models.DateTimeField(verbose_name='expires at')),
+                ('document', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_session', to='custom_requests.document')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'upload session',
+                'verbose_name_plural': 'upload sessions',
+            },
+        ),
+        migrations.CreateModel(
+            name='UploadChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField(verbose_name='index')),
+                ('size', models.PositiveIntegerField(verbose_name='size in bytes')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='received at')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='custom_requests.uploadsession')),
+            ],
+            options={
+                'verbose_name': 'upload chunk',
+                'verbose_name_plural': 'upload chunks',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='uploadsession',
+            index=models.Index(fields=['user', 'expires_at'], name='upload_user_expires_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadsession',
+            index=models.Index(fields=['expires_at'], name='upload_expires_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='uploadchunk',
+            constraint=models.UniqueConstraint(fields=('session', 'index'), name='upload_chunk_session_index_uniq'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custom_requests', '0009_upload_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='document',
+            name='byte_size',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='file size in bytes'),
+        ),
+        migrations.AddField(
+            model_name='document',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64, verbose_name='SHA-256'),
+        ),
+        migrations.AddIndex(
+            model_name='document',
+            index=models.Index(fields=['sha256'], name='doc_sha256_idx'),
+        ),
+    ]
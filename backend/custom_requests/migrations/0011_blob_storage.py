@@ -0,0 +1,39 @@
+# Generated by Django 4.2 on 2026-10-18 08:17
+
+from django.db import migrations, models
+import servicesbladi.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('custom_requests', '0010_file_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Blob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True, verbose_name='name')),
+                ('sha256', models.CharField(db_index=True, max_length=64, verbose_name='SHA-256')),
+                ('size', models.BigIntegerField(blank=True, null=True, verbose_name='size in bytes')),
+                ('ref_count', models.IntegerField(default=0, verbose_name='references')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='created at')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+            ],
+            options={
+                'verbose_name': 'blob',
+                'verbose_name_plural': 'blobs',
+            },
+        ),
+        migrations.AlterField(
+            model_name='document',
+            name='file',
+            field=models.FileField(storage=servicesbladi.storage.blob_storage, upload_to='documents/%Y/%m/', verbose_name='file'),
+        ),
+        migrations.AddIndex(
+            model_name='blob',
+            index=models.Index(fields=['ref_count', 'updated_at'], name='blob_unreferenced_idx'),
+        ),
+    ]
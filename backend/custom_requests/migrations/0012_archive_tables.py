@@ -0,0 +1,64 @@
+# Generated by Django 4.2 on 2026-10-18 08:30
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('custom_requests', '0011_blob_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedNotification',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('type', models.CharField(choices=[('request_update', 'Request Update'), ('appointment', 'Appointment'), ('message', 'Message'), ('document', 'Document'), ('system', 'System')], max_length=20, verbose_name='notification type')),
+                ('title', models.CharField(max_length=255, verbose_name='title')),
+                ('content', models.TextField(verbose_name='content')),
+                ('created_at', models.DateTimeField(verbose_name='created at')),
+                ('is_read', models.BooleanField(default=True, verbose_name='is read')),
+                ('related_service_request_id', models.BigIntegerField(blank=True, null=True)),
+                ('related_rendez_vous_id', models.BigIntegerField(blank=True, null=True)),
+                ('related_message_id', models.BigIntegerField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='archived at')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'archived notification',
+                'verbose_name_plural': 'archived notifications',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedMessage',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('content', models.TextField(verbose_name='content')),
+                ('sent_at', models.DateTimeField(verbose_name='sent at')),
+                ('is_read', models.BooleanField(default=False, verbose_name='is read')),
+                ('read_at', models.DateTimeField(blank=True, null=True, verbose_name='read at')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='archived at')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('service_request', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_messages', to='custom_requests.servicerequest')),
+            ],
+            options={
+                'verbose_name': 'archived message',
+                'verbose_name_plural': 'archived messages',
+                'ordering': ['sent_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivednotification',
+            index=models.Index(fields=['user', '-created_at'], name='anotif_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedmessage',
+            index=models.Index(fields=['service_request', 'sent_at'], name='amsg_request_sent_idx'),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 4.2 on 2026-10-18 08:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from datetime import timedelta
+
+
+def fill_ends_at(apps, schema_editor):
+    RendezVous = apps.get_model('custom_requests', 'RendezVous')
+    appointments = RendezVous.objects.filter(ends_at__isnull=True).only('pk', 'date_time', 'duration')
+    batch = []
+    for appointment in appointments.iterator(chunk_size=1000):
+        appointment.ends_at = appointment.date_time + timedelta(minutes=appointment.duration or 0)
+        batch.append(appointment)
+        if len(batch) >= 1000:
+            RendezVous.objects.bulk_update(batch, ['ends_at'])
+            batch = []
+    RendezVous.objects.bulk_update(batch, ['ends_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('custom_requests', '0012_archive_tables'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('start_time', models.TimeField(blank=True, null=True, verbose_name='start time')),
+                ('end_time', models.TimeField(blank=True, null=True, verbose_name='end time')),
+                ('is_available', models.BooleanField(default=False, verbose_name='is available')),
+                ('reason', models.CharField(blank=True, max_length=255, verbose_name='reason')),
+            ],
+            options={
+                'verbose_name': 'availability exception',
+                'verbose_name_plural': 'availability exceptions',
+                'ordering': ['date', 'start_time'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExpertAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')], verbose_name='weekday')),
+                ('start_time', models.TimeField(verbose_name='start time')),
+                ('end_time', models.TimeField(verbose_name='end time')),
+            ],
+            options={
+                'verbose_name': 'expert availability',
+                'verbose_name_plural': 'expert availabilities',
+                'ordering': ['weekday', 'start_time'],
+            },
+        ),
+        migrations.AddField(
+            model_name='rendezvous',
+            name='ends_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='ends at'),
+        ),
+        migrations.AddIndex(
+            model_name='rendezvous',
+            index=models.Index(fields=['expert', 'ends_at', 'date_time'], name='rdv_expert_interval_idx'),
+        ),
+        migrations.AddField(
+            model_name='expertavailability',
+            name='expert',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='weekly_availability', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='availabilityexception',
+            name='expert',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_exceptions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='expertavailability',
+            index=models.Index(fields=['expert', 'weekday'], name='availability_expert_day_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='expertavailability',
+            constraint=models.CheckConstraint(check=models.Q(('end_time__gt', models.F('start_time'))), name='availability_window_order'),
+        ),
+        migrations.AddIndex(
+            model_name='availabilityexception',
+            index=models.Index(fields=['expert', 'date'], name='availability_exc_date_idx'),
+        ),
+        migrations.RunPython(fill_ends_at, migrations.RunPython.noop),
+    ]
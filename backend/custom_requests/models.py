@@ -1,6 +1,15 @@
+import uuid
+from datetime import timedelta
+
 from django.db import models
+from django.db.models import Q
+from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 from accounts.models import Utilisateur
+from servicesbladi import renditions
+from servicesbladi.delivery import download_name
+from servicesbladi.storage import blob_storage
+from servicesbladi.upload_handlers import apply_file_metadata
 from services.models import Service
 
 DOCUMENT_TYPES = (
@@ -49,6 +58,15 @@ class ServiceRequest(models.Model):
         verbose_name = _('service request')
         verbose_name_plural = _('service requests')
         ordering = ['-created_at']
+        indexes = [
+            # Dashboards and lists filter by owner (+ status) and show newest first
+            models.Index(fields=['client', 'status', '-created_at'], name='sr_client_status_created_idx'),
+            models.Index(fields=['expert', 'status', '-created_at'], name='sr_expert_status_created_idx'),
+            models.Index(fields=['client', '-created_at'], name='sr_client_created_idx'),
+            models.Index(fields=['expert', '-created_at'], name='sr_expert_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='sr_status_created_idx'),
+            models.Index(fields=['-created_at'], name='sr_created_desc_idx'),
+        ]
 
 class RendezVous(models.Model):
     """Model for appointments between clients and experts"""
@@ -75,16 +93,87 @@ class RendezVous(models.Model):
     consultation_type = models.CharField(_('consultation type'), max_length=20, choices=CONSULTATION_TYPES, default='in_person')
     status = models.CharField(_('status'), max_length=20, choices=STATUS_CHOICES, default='scheduled')
     notes = models.TextField(_('notes'), blank=True)
+    # date_time + duration, tenu à jour par save() : les chevauchements se cherchent sur l'index
+    ends_at = models.DateTimeField(_('ends at'), null=True, blank=True, editable=False)
     created_at = models.DateTimeField(_('created at'), auto_now_add=True)
     updated_at = models.DateTimeField(_('updated at'), auto_now=True)
     
     def __str__(self):
         return f"Rendez-vous for {self.client.name} with {self.expert.name} on {self.date_time.strftime('%Y-%m-%d %H:%M')}"
     
+    def save(self, *args, **kwargs):
+        if self.date_time:
+            self.ends_at = self.date_time + timedelta(minutes=int(self.duration or 0))
+        super().save(*args, **kwargs)
+    
     class Meta:
         verbose_name = _('rendez-vous')
         verbose_name_plural = _('rendez-vous')
         ordering = ['date_time']
+        indexes = [
+            # Sort key of the admin list (keyset pagination)
+            models.Index(fields=['date_time', 'id'], name='rdv_date_time_id_idx'),
+            # Busy intervals of an expert (scheduling.py): ends_at > start AND date_time < end
+            models.Index(fields=['expert', 'ends_at', 'date_time'], name='rdv_expert_interval_idx'),
+        ]
+
+
+class ExpertAvailability(models.Model):
+    """Weekly opening hours of an expert, one row per window (see scheduling.py)"""
+    WEEKDAYS = (
+        (0, _('Monday')),
+        (1, _('Tuesday')),
+        (2, _('Wednesday')),
+        (3, _('Thursday')),
+        (4, _('Friday')),
+        (5, _('Saturday')),
+        (6, _('Sunday')),
+    )
+
+    expert = models.ForeignKey(Utilisateur, on_delete=models.CASCADE, related_name='weekly_availability')
+    weekday = models.PositiveSmallIntegerField(_('weekday'), choices=WEEKDAYS)
+    start_time = models.TimeField(_('start time'))
+    end_time = models.TimeField(_('end time'))
+
+    def __str__(self):
+        return f"{self.expert_id} {self.get_weekday_display()} {self.start_time:%H:%M}-{self.end_time:%H:%M}"
+
+    class Meta:
+        ordering = ['weekday', 'start_time']
+        verbose_name = _('expert availability')
+        verbose_name_plural = _('expert availabilities')
+        constraints = [
+            models.CheckConstraint(check=Q(end_time__gt=models.F('start_time')), name='availability_window_order'),
+        ]
+        indexes = [
+            models.Index(fields=['expert', 'weekday'], name='availability_expert_day_idx'),
+        ]
+
+
+class AvailabilityException(models.Model):
+    """
+    Change to the weekly hours of an expert on one date: without times the
+    whole day is closed; with times the window is closed (is_available=False)
+    or opened in addition (is_available=True).
+    """
+    expert = models.ForeignKey(Utilisateur, on_delete=models.CASCADE, related_name='availability_exceptions')
+    date = models.DateField(_('date'))
+    start_time = models.TimeField(_('start time'), null=True, blank=True)
+    end_time = models.TimeField(_('end time'), null=True, blank=True)
+    is_available = models.BooleanField(_('is available'), default=False)
+    reason = models.CharField(_('reason'), max_length=255, blank=True)
+
+    def __str__(self):
+        state = 'open' if self.is_available else 'closed'
+        return f"{self.expert_id} {self.date.isoformat()} {state}"
+
+    class Meta:
+        ordering = ['date', 'start_time']
+        verbose_name = _('availability exception')
+        verbose_name_plural = _('availability exceptions')
+        indexes = [
+            models.Index(fields=['expert', 'date'], name='availability_exc_date_idx'),
+        ]
 
 class Document(models.Model):
     """Model for documents attached to service requests"""
@@ -95,18 +184,45 @@ class Document(models.Model):
     is_official = models.BooleanField(_('is official document'), default=False)
     reference_number = models.CharField(_('reference number'), max_length=100, blank=True)
     name = models.CharField(_('name'), max_length=255)
-    file = models.FileField(_('file'), upload_to='documents/%Y/%m/')
+    file = models.FileField(_('file'), upload_to='documents/%Y/%m/', storage=blob_storage)
     mime_type = models.CharField(_('MIME type'), max_length=100, blank=True)
     file_size = models.IntegerField(_('file size in KB'), blank=True, null=True)
+    byte_size = models.BigIntegerField(_('file size in bytes'), blank=True, null=True)
+    sha256 = models.CharField(_('SHA-256'), max_length=64, blank=True)
     upload_date = models.DateTimeField(_('upload date'), auto_now_add=True)
     
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        new_file = bool(self.file) and not self.file._committed
+        # Type MIME détecté, empreinte et taille calculés pendant la réception du fichier
+        apply_file_metadata(self)
+        super().save(*args, **kwargs)
+        if new_file:
+            renditions.generate_on_commit(self.file, self.mime_type)
+    
+    @property
+    def download_name(self):
+        return download_name(self.name, self.file.name)
+    
+    @property
+    def thumbnail_url(self):
+        """URL of the small preview of the document, None until generated or for non-previewable types"""
+        # Servie après vérification des droits, comme le document lui-même
+        if not renditions.rendition_ready(self.file, self.mime_type):
+            return None
+        return reverse('custom_requests:document_thumbnail', args=[self.pk])
+    
     class Meta:
         verbose_name = _('document')
         verbose_name_plural = _('documents')
         ordering = ['-upload_date']
+        indexes = [
+            # Sort key of the admin list (keyset pagination)
+            models.Index(fields=['-upload_date', '-id'], name='doc_upload_desc_idx'),
+            models.Index(fields=['sha256'], name='doc_sha256_idx'),
+        ]
 
 class Message(models.Model):
     """Message model for communications"""
@@ -123,6 +239,21 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['sent_at']
+        indexes = [
+            models.Index(fields=['sender', 'recipient', 'is_read'], name='msg_sender_recipient_read_idx'),
+            models.Index(fields=['recipient', 'is_read'], name='msg_recipient_read_idx'),
+            models.Index(fields=['service_request', 'sent_at'], name='msg_request_sent_idx'),
+            models.Index(fields=['-sent_at'], name='msg_sent_desc_idx'),
+            # Keyset pagination of a conversation (message_sync)
+            models.Index(fields=['sender', 'recipient', 'id'], name='msg_pair_id_idx'),
+            models.Index(fields=['service_request', 'id'], name='msg_request_id_idx'),
+            # Partial index for unread counters; MySQL has no partial indexes and skips it
+            models.Index(
+                fields=['recipient', 'sender'],
+                condition=Q(is_read=False),
+                name='msg_unread_partial_idx',
+            ),
+        ]
 
 class Notification(models.Model):
     """Notification model"""
@@ -149,3 +280,179 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'is_read', '-created_at'], name='notif_user_read_created_idx'),
+            models.Index(fields=['user', '-created_at'], name='notif_user_created_idx'),
+            # Partial index for the unread badge; MySQL has no partial indexes and skips it
+            models.Index(
+                fields=['user', '-created_at'],
+                condition=Q(is_read=False),
+                name='notif_unread_partial_idx',
+            ),
+        ]
+
+
+class DailyStat(models.Model):
+    """Per-day activity rollup for the admin dashboard, maintained by signals (see stats.py)"""
+    date = models.DateField(_('date'), unique=True)
+    new_users = models.PositiveIntegerField(_('new users'), default=0)
+    new_requests = models.PositiveIntegerField(_('new requests'), default=0)
+    new_appointments = models.PositiveIntegerField(_('new appointments'), default=0)
+    new_documents = models.PositiveIntegerField(_('new documents'), default=0)
+    new_messages = models.PositiveIntegerField(_('new messages'), default=0)
+
+    def __str__(self):
+        return f"Stats {self.date.isoformat()}"
+
+    class Meta:
+        ordering = ['-date']
+        verbose_name = _('daily statistic')
+        verbose_name_plural = _('daily statistics')
+
+
+class SearchToken(models.Model):
+    """Inverted index entry for the admin search, maintained by signals (see search.py)"""
+    KINDS = (
+        ('request', _('Service request')),
+        ('user', _('User')),
+        ('message', _('Message')),
+    )
+
+    kind = models.CharField(_('kind'), max_length=10, choices=KINDS)
+    object_id = models.BigIntegerField(_('object id'))
+    token = models.CharField(_('token'), max_length=40)
+    weight = models.PositiveSmallIntegerField(_('weight'), default=1)
+
+    def __str__(self):
+        return f"{self.kind}:{self.object_id} {self.token}"
+
+    class Meta:
+        verbose_name = _('search token')
+        verbose_name_plural = _('search tokens')
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id', 'token'], name='search_kind_object_token_uniq'),
+        ]
+        indexes = [
+            # Prefix lookups by token; weight is included so the ranking reads the index only
+            models.Index(fields=['kind', 'token', 'object_id', 'weight'], name='search_kind_token_idx'),
+        ]
+
+
+class UploadSession(models.Model):
+    """Resumable upload in progress, assembled into a Document when complete (see uploads.py)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(Utilisateur, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(_('file name'), max_length=255)
+    size = models.BigIntegerField(_('size in bytes'))
+    chunk_size = models.PositiveIntegerField(_('chunk size in bytes'))
+    mime_type = models.CharField(_('MIME type'), max_length=100, blank=True)
+    document = models.OneToOneField(Document, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload_session')
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    expires_at = models.DateTimeField(_('expires at'))
+
+    def __str__(self):
+        return f"Upload {self.filename} ({self.size} bytes) by {self.user_id}"
+
+    @property
+    def chunk_count(self):
+        return max(1, -(-self.size // self.chunk_size))
+
+    class Meta:
+        verbose_name = _('upload session')
+        verbose_name_plural = _('upload sessions')
+        indexes = [
+            models.Index(fields=['user', 'expires_at'], name='upload_user_expires_idx'),
+            models.Index(fields=['expires_at'], name='upload_expires_idx'),
+        ]
+
+
+class UploadChunk(models.Model):
+    """Chunk of an UploadSession written to its temporary file"""
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField(_('index'))
+    size = models.PositiveIntegerField(_('size in bytes'))
+    received_at = models.DateTimeField(_('received at'), auto_now_add=True)
+
+    def __str__(self):
+        return f"Chunk {self.index} of {self.session_id}"
+
+    class Meta:
+        verbose_name = _('upload chunk')
+        verbose_name_plural = _('upload chunks')
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'index'], name='upload_chunk_session_index_uniq'),
+        ]
+
+
+class Blob(models.Model):
+    """File stored once by content (servicesbladi.storage), with the number of rows referencing it"""
+    name = models.CharField(_('name'), max_length=255, unique=True)
+    sha256 = models.CharField(_('SHA-256'), max_length=64, db_index=True)
+    size = models.BigIntegerField(_('size in bytes'), null=True, blank=True)
+    # -1 : en cours de suppression par gc_blobs
+    ref_count = models.IntegerField(_('references'), default=0)
+    created_at = models.DateTimeField(_('created at'), auto_now_add=True)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+    class Meta:
+        verbose_name = _('blob')
+        verbose_name_plural = _('blobs')
+        indexes = [
+            # Blobs sans référence à collecter
+            models.Index(fields=['ref_count', 'updated_at'], name='blob_unreferenced_idx'),
+        ]
+
+
+class ArchivedMessage(models.Model):
+    """Message of a closed request moved out of Message by the retention (see retention.py)"""
+    # Identifiant d'origine : une reprise après interruption ne crée pas de doublon
+    id = models.BigIntegerField(primary_key=True)
+    sender = models.ForeignKey(Utilisateur, on_delete=models.CASCADE, related_name='+')
+    recipient = models.ForeignKey(Utilisateur, on_delete=models.CASCADE, related_name='+')
+    content = models.TextField(_('content'))
+    sent_at = models.DateTimeField(_('sent at'))
+    is_read = models.BooleanField(_('is read'), default=False)
+    read_at = models.DateTimeField(_('read at'), null=True, blank=True)
+    service_request = models.ForeignKey(ServiceRequest, on_delete=models.CASCADE, related_name='archived_messages')
+    archived_at = models.DateTimeField(_('archived at'), auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived message {self.id} of request {self.service_request_id}"
+
+    class Meta:
+        ordering = ['sent_at']
+        verbose_name = _('archived message')
+        verbose_name_plural = _('archived messages')
+        indexes = [
+            models.Index(fields=['service_request', 'sent_at'], name='amsg_request_sent_idx'),
+        ]
+
+
+class ArchivedNotification(models.Model):
+    """Old read notification moved out of Notification by the retention (see retention.py)"""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(Utilisateur, on_delete=models.CASCADE, related_name='+')
+    type = models.CharField(_('notification type'), max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    title = models.CharField(_('title'), max_length=255)
+    content = models.TextField(_('content'))
+    created_at = models.DateTimeField(_('created at'))
+    is_read = models.BooleanField(_('is read'), default=True)
+    # Simples identifiants : la demande, le rendez-vous ou le message a pu être archivé ou supprimé depuis
+    related_service_request_id = models.BigIntegerField(null=True, blank=True)
+    related_rendez_vous_id = models.BigIntegerField(null=True, blank=True)
+    related_message_id = models.BigIntegerField(null=True, blank=True)
+    archived_at = models.DateTimeField(_('archived at'), auto_now_add=True)
+
+    def __str__(self):
+        return f"Archived notification {self.id} for {self.user_id}"
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = _('archived notification')
+        verbose_name_plural = _('archived notifications')
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='anotif_user_created_idx'),
+        ]
@@ -0,0 +1,167 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import Count, OuterRef, QuerySet, Subquery
+
+from accounts.models import Utilisateur
+from messaging.events import broadcast_new_notifications, broadcast_notifications_changed
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_SIZE = 5
+
+
+def summary_cache_key(user_id):
+    return f'notifications:summary:{user_id}'
+
+
+def get_notification_summary(user_id):
+    """
+    Return the unread count and the latest notifications of a user.
+
+    The summary is kept in the cache until a notification of the user changes,
+    and is built with a single query when missing: the latest rows are annotated
+    with the unread count through a subquery (no rows means nothing unread).
+    """
+    key = summary_cache_key(user_id)
+    summary = cache.get(key)
+    if summary is not None:
+        return summary
+
+    unread = Notification.objects.filter(
+        user_id=OuterRef('user_id'),
+        is_read=False
+    ).order_by().values('user_id').annotate(total=Count('pk')).values('total')
+
+    latest = list(
+        Notification.objects.filter(user_id=user_id)
+        .annotate(unread_total=Subquery(unread))
+        .order_by('-created_at')[:SUMMARY_SIZE]
+    )
+
+    summary = {
+        'unread_count': (latest[0].unread_total or 0) if latest else 0,
+        'latest': latest,
+    }
+    cache.set(key, summary, getattr(settings, 'NOTIFICATION_SUMMARY_TIMEOUT', 300))
+    return summary
+
+
+def invalidate_notification_summary(*user_ids):
+    """Drop the cached summaries, to be called after any bulk update of notifications"""
+    cache.delete_many([summary_cache_key(user_id) for user_id in set(user_ids)])
+
+
+def notifications_changed(*user_ids):
+    """
+    After notifications were marked read or deleted in bulk: drop the cached
+    summaries and let the open sockets refresh their unread count
+    """
+    invalidate_notification_summary(*user_ids)
+    broadcast_notifications_changed(*user_ids)
+
+
+# Envoi groupé des notifications : un INSERT par lot de destinataires, hors de la requête
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def admin_audience():
+    """Active administrators, the audience of the notifications about new requests"""
+    return Utilisateur.objects.filter(account_type='admin', is_active=True)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Un seul thread : les lots partent dans l'ordre et n'occupent qu'une connexion
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='notifications')
+        return _executor
+
+
+def dispatch_notifications(audience, type, title, content, **related):
+    """
+    Notify every user of audience (a Utilisateur queryset or user ids) once
+    the current transaction commits, from a background thread: the request
+    only pays for queuing the job, whatever the number of recipients.
+
+    related takes the related_* foreign keys of Notification, as objects
+    or ids. Translated texts are rendered now, in the language of the request.
+    Notifications still queued when a process is killed are lost.
+    """
+    payload = {'type': type, 'title': str(title)[:255], 'content': str(content)}
+    for name, value in related.items():
+        payload[f'{name}_id'] = getattr(value, 'pk', value)
+
+    transaction.on_commit(lambda: _submit(audience, payload))
+
+
+def _submit(audience, payload):
+    if getattr(settings, 'NOTIFICATION_DISPATCH', 'thread') == 'sync':
+        deliver_notifications(audience, payload)
+        return
+    try:
+        _get_executor().submit(_run, audience, payload)
+    except RuntimeError:
+        # Pool arrêté (fin du processus) : envoi immédiat
+        deliver_notifications(audience, payload)
+
+
+def _run(audience, payload):
+    try:
+        deliver_notifications(audience, payload)
+    except Exception:
+        logger.exception('Notification dispatch failed (%s)', payload.get('title'))
+    finally:
+        # Connexion propre au thread : rendue après chaque envoi
+        connections.close_all()
+
+
+def deliver_notifications(audience, payload, batch_size=None):
+    """
+    Write one Notification per recipient with bulk_create, by batches.
+    Returns the number of notifications written.
+    """
+    batch_size = batch_size or getattr(settings, 'NOTIFICATION_BATCH_SIZE', 500)
+    if isinstance(audience, QuerySet):
+        recipients = audience.values_list('pk', flat=True).iterator(chunk_size=batch_size)
+    else:
+        recipients = iter(audience)
+
+    total = 0
+    while True:
+        user_ids = list(islice(recipients, batch_size))
+        if not user_ids:
+            return total
+        notifications = Notification.objects.bulk_create([
+            Notification(user_id=user_id, **payload) for user_id in user_ids
+        ])
+        if notifications and notifications[0].pk is None:
+            notifications = _inserted(notifications, user_ids, payload)
+        # bulk_create ne déclenche pas post_save : résumés invalidés et sockets prévenus ici
+        invalidate_notification_summary(*user_ids)
+        broadcast_new_notifications(notifications)
+        total += len(user_ids)
+
+
+def _inserted(notifications, user_ids, payload):
+    """
+    Rows written by a bulk_create that did not return the primary keys
+    (MySQL): read again by recipient, type, title and creation time, so the
+    pushed notifications carry their id.
+    """
+    created = [notification.created_at for notification in notifications]
+    return list(Notification.objects.filter(
+        user_id__in=user_ids,
+        type=payload['type'],
+        title=payload['title'],
+        created_at__range=(min(created), max(created)),
+    ))
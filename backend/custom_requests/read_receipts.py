@@ -0,0 +1,54 @@
+from django.db.models import Max
+from django.utils import timezone
+
+from messaging.events import broadcast_read_receipt
+from .models import Message, Notification
+from .notifications import notifications_changed
+
+
+def mark_read_up_to(user, up_to_id=None, sender_id=None, service_request_id=None):
+    """
+    Mark as read the messages of one conversation received by user, up to a message id.
+
+    The conversation is either a service request chat (service_request_id) or
+    a private conversation with sender_id. Without up_to_id everything unread
+    so far is marked. Costs at most one SELECT and two UPDATEs whatever the
+    length of the conversation: the messages get is_read and read_at, their
+    'message' notifications are marked read as well, and a single "read up
+    to" event is sent to the other participant. Returns the number of
+    messages marked.
+    """
+    unread = Message.objects.filter(recipient=user, is_read=False)
+    if service_request_id is not None:
+        unread = unread.filter(service_request_id=service_request_id)
+    elif sender_id is not None:
+        unread = unread.filter(sender_id=sender_id)
+    else:
+        raise ValueError('mark_read_up_to needs a sender_id or a service_request_id')
+
+    if up_to_id is None:
+        up_to_id = unread.aggregate(latest=Max('id'))['latest']
+        if up_to_id is None:
+            return 0
+
+    updated = unread.filter(id__lte=up_to_id).update(is_read=True, read_at=timezone.now())
+    if not updated:
+        return 0
+
+    message_notifications = Notification.objects.filter(
+        user=user, type='message', is_read=False, related_message__id__lte=up_to_id
+    )
+    if service_request_id is not None:
+        message_notifications = message_notifications.filter(related_message__service_request_id=service_request_id)
+    else:
+        message_notifications = message_notifications.filter(related_message__sender_id=sender_id)
+    if message_notifications.update(is_read=True):
+        notifications_changed(user.id)
+
+    broadcast_read_receipt(
+        reader_id=user.id,
+        up_to_id=up_to_id,
+        service_request_id=service_request_id,
+        other_user_id=sender_id,
+    )
+    return updated
@@ -0,0 +1,161 @@
+"""
+Retention of notifications and messages.
+
+Notification and Message are read in almost every view, sorted by date, so
+they are kept small enough for their indexes to stay in memory: rows that
+are no longer part of daily use are moved to cold tables.
+
+- Notifications that are read and older than NOTIFICATION_RETENTION_DAYS go
+  to ArchivedNotification (the unread count does not change).
+- Messages of the requests completed or cancelled for more than
+  MESSAGE_RETENTION_DAYS (the last update of the request) go to
+  ArchivedMessage. Private conversations are not archived.
+
+Rows are moved in batches of RETENTION_BATCH_SIZE, each in its own
+transaction: copied with their original id, then deleted from the hot table.
+A run can be stopped at any time (or limited with --max-batches) and the
+next run resumes where it stopped; a batch copied again is simply ignored.
+
+Archived rows stay readable: request_messages() adds the archived messages
+of a request to its live ones, and archived_notifications() backs
+`api/notifications/?archived=true`. Run `manage.py archive_old_data` every
+night, for instance with cron:
+
+    30 3 * * * cd /srv/servicesbladi/backend && python manage.py archive_old_data
+"""
+from datetime import timedelta
+from itertools import chain
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import (
+    ArchivedMessage, ArchivedNotification, Message, Notification, SearchToken, ServiceRequest,
+)
+from .notifications import invalidate_notification_summary
+
+CLOSED_STATUSES = ('completed', 'cancelled')
+
+
+def _batch_size(batch_size=None):
+    return batch_size or getattr(settings, 'RETENTION_BATCH_SIZE', 1000)
+
+
+def notifications_to_archive(days=None):
+    days = days if days is not None else getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90)
+    return Notification.objects.filter(is_read=True, created_at__lt=timezone.now() - timedelta(days=days))
+
+
+def messages_to_archive(days=None):
+    days = days if days is not None else getattr(settings, 'MESSAGE_RETENTION_DAYS', 180)
+    closed = ServiceRequest.objects.filter(
+        status__in=CLOSED_STATUSES,
+        updated_at__lt=timezone.now() - timedelta(days=days),
+    )
+    return Message.objects.filter(service_request__in=closed.values('pk'))
+
+
+def _batches(queryset, batch_size, max_batches=None):
+    """Successive lists of primary keys of the queryset, by increasing key"""
+    last_pk = 0
+    done = 0
+    while max_batches is None or done < max_batches:
+        ids = list(
+            queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return
+        yield ids
+        last_pk = ids[-1]
+        done += 1
+
+
+def _delete_rows(model, ids):
+    """DELETE of rows by primary key, without loading them nor sending signals"""
+    if not ids:
+        return
+    table = connection.ops.quote_name(model._meta.db_table)
+    column = connection.ops.quote_name(model._meta.pk.column)
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {column} IN ({placeholders})', ids)
+
+
+def archive_notifications(days=None, batch_size=None, max_batches=None):
+    """Move the old read notifications to ArchivedNotification. Returns the number moved."""
+    queryset = notifications_to_archive(days)
+    moved = 0
+    for ids in _batches(queryset, _batch_size(batch_size), max_batches):
+        with transaction.atomic():
+            # Conditions vérifiées à nouveau : la ligne a pu changer depuis la sélection
+            rows = list(queryset.filter(pk__in=ids))
+            ArchivedNotification.objects.bulk_create([
+                ArchivedNotification(
+                    id=row.id,
+                    user_id=row.user_id,
+                    type=row.type,
+                    title=row.title,
+                    content=row.content,
+                    created_at=row.created_at,
+                    is_read=row.is_read,
+                    related_service_request_id=row.related_service_request_id,
+                    related_rendez_vous_id=row.related_rendez_vous_id,
+                    related_message_id=row.related_message_id,
+                )
+                for row in rows
+            ], ignore_conflicts=True)
+            # Sans post_delete : des notifications lues ne changent pas le compteur des
+            # sockets ouverts, seuls les résumés en cache sont invalidés (une fois par lot)
+            _delete_rows(Notification, [row.pk for row in rows])
+        invalidate_notification_summary(*{row.user_id for row in rows})
+        moved += len(rows)
+    return moved
+
+
+def archive_messages(days=None, batch_size=None, max_batches=None):
+    """Move the messages of the requests closed long ago to ArchivedMessage. Returns the number moved."""
+    queryset = messages_to_archive(days)
+    moved = 0
+    for ids in _batches(queryset, _batch_size(batch_size), max_batches):
+        with transaction.atomic():
+            rows = list(queryset.filter(pk__in=ids))
+            ArchivedMessage.objects.bulk_create([
+                ArchivedMessage(
+                    id=row.id,
+                    sender_id=row.sender_id,
+                    recipient_id=row.recipient_id,
+                    content=row.content,
+                    sent_at=row.sent_at,
+                    is_read=row.is_read,
+                    read_at=row.read_at,
+                    service_request_id=row.service_request_id,
+                )
+                for row in rows
+            ], ignore_conflicts=True)
+            row_ids = [row.pk for row in rows]
+            # Notification.related_message passe à NULL (on_delete=SET_NULL)
+            Message.objects.filter(pk__in=row_ids).delete()
+            # Jetons de recherche des messages archivés (la recherche ne porte que sur Message)
+            SearchToken.objects.filter(kind='message', object_id__in=row_ids).delete()
+        moved += len(rows)
+    return moved
+
+
+def request_messages(service_request):
+    """
+    Messages of a request in sending order, the archived ones included:
+    a queryset while nothing is archived, a list otherwise.
+    """
+    live = Message.objects.filter(service_request=service_request).select_related('sender').order_by('sent_at')
+    # Une requête indexée sur la table d'archive ; une demande rouverte garde ses messages archivés
+    archived = list(
+        ArchivedMessage.objects.filter(service_request=service_request).select_related('sender').order_by('sent_at')
+    )
+    if not archived:
+        return live
+    return sorted(chain(archived, live), key=lambda message: message.sent_at)
+
+
+def archived_notifications(user):
+    return ArchivedNotification.objects.filter(user=user).order_by('-created_at')
@@ -0,0 +1,248 @@
+"""
+Appointment scheduling: opening hours, free slots and conflict detection.
+
+The opening hours of an expert are weekly windows (ExpertAvailability)
+changed on given dates by AvailabilityException rows: a closed day, a
+closed window or an extra opening. Free time is the opening windows minus
+the busy intervals, the appointments still scheduled or confirmed.
+
+Busy intervals are read with one query per call, whatever the number of
+experts and days: RendezVous.ends_at (date_time + duration, kept by save())
+is indexed with the expert, so "ends after the start and starts before the
+end" is a range scan of the index (rdv_expert_interval_idx). Intervals are
+then subtracted in memory with a sweep over sorted lists.
+
+book_appointment() and reschedule_appointment() lock the row of the expert
+(SELECT ... FOR UPDATE) before checking for overlaps, so two concurrent
+bookings of the same expert are serialized and the second one is rejected
+with a SchedulingError. An expert without weekly hours can be booked at any
+time; once hours are set, bookings must fall inside them.
+
+`manage.py bench_scheduling` measures the queries on 500 experts over 90 days.
+"""
+import math
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from accounts.models import Expert, Utilisateur
+from .models import AvailabilityException, ExpertAvailability, RendezVous
+
+# Statuts qui occupent le créneau de l'expert
+BLOCKING_STATUSES = ('scheduled', 'confirmed')
+
+
+class SchedulingError(Exception):
+    """Rejected booking, with the HTTP status to answer"""
+
+    def __init__(self, message, status=409):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _step():
+    return getattr(settings, 'SCHEDULING_SLOT_STEP', 30)
+
+
+def _aware(value):
+    if timezone.is_naive(value):
+        return timezone.make_aware(value, timezone.get_default_timezone())
+    return value
+
+
+def _at(day, moment):
+    return _aware(datetime.combine(day, moment))
+
+
+def _merge(intervals):
+    """Sorted union of (start, end) intervals"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _subtract(windows, busy):
+    """Parts of the sorted, disjoint windows not covered by the sorted, disjoint busy intervals"""
+    free = []
+    index = 0
+    for start, end in windows:
+        # Les intervalles occupés terminés avant cette fenêtre ne servent plus
+        while index < len(busy) and busy[index][1] <= start:
+            index += 1
+        cursor = start
+        position = index
+        while position < len(busy) and busy[position][0] < end:
+            busy_start, busy_end = busy[position]
+            if busy_start > cursor:
+                free.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+            position += 1
+        if cursor < end:
+            free.append((cursor, end))
+    return free
+
+
+def availability_windows(expert_ids, start_date, end_date):
+    """{expert_id: [(start, end), ...]} opening windows of the experts from start_date to end_date included"""
+    weekly = defaultdict(lambda: defaultdict(list))
+    for expert_id, weekday, start, end in ExpertAvailability.objects.filter(
+        expert_id__in=expert_ids
+    ).values_list('expert_id', 'weekday', 'start_time', 'end_time'):
+        weekly[expert_id][weekday].append((start, end))
+
+    exceptions = defaultdict(list)
+    for expert_id, day, start, end, is_available in AvailabilityException.objects.filter(
+        expert_id__in=expert_ids, date__range=(start_date, end_date)
+    ).values_list('expert_id', 'date', 'start_time', 'end_time', 'is_available'):
+        exceptions[(expert_id, day)].append((start, end, is_available))
+
+    # Les experts partagent souvent les mêmes horaires : chaque instant n'est converti qu'une fois
+    moments = {}
+
+    def at(day, moment):
+        key = (day, moment)
+        if key not in moments:
+            moments[key] = _at(day, moment)
+        return moments[key]
+
+    windows = {}
+    days = [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+    for expert_id in expert_ids:
+        expert_windows = []
+        hours = weekly.get(expert_id, {})
+        for day in days:
+            changes = exceptions.get((expert_id, day), ())
+            if any(not is_available and start is None for start, _, is_available in changes):
+                # Jour fermé
+                continue
+            opened = [(at(day, start), at(day, end)) for start, end in hours.get(day.weekday(), ())]
+            opened += [(at(day, start), at(day, end)) for start, end, is_available in changes
+                       if is_available and start is not None and end is not None]
+            if not opened:
+                continue
+            closed = [(at(day, start), at(day, end)) for start, end, is_available in changes
+                      if not is_available and start is not None and end is not None]
+            expert_windows.extend(_subtract(_merge(opened), _merge(closed)))
+        windows[expert_id] = expert_windows
+    return windows
+
+
+def busy_intervals(expert_ids, start, end, exclude_id=None):
+    """{expert_id: [(start, end), ...]} merged appointments of the experts overlapping [start, end)"""
+    appointments = RendezVous.objects.filter(
+        expert_id__in=expert_ids,
+        status__in=BLOCKING_STATUSES,
+        ends_at__gt=start,
+        date_time__lt=end,
+    )
+    if exclude_id is not None:
+        appointments = appointments.exclude(pk=exclude_id)
+
+    busy = defaultdict(list)
+    for expert_id, busy_start, busy_end in appointments.values_list('expert_id', 'date_time', 'ends_at').order_by():
+        busy[expert_id].append((busy_start, busy_end))
+    return {expert_id: _merge(intervals) for expert_id, intervals in busy.items()}
+
+
+def free_intervals(expert_ids, start_date, end_date):
+    """{expert_id: [(start, end), ...]} free time of the experts from start_date to end_date included"""
+    expert_ids = list(expert_ids)
+    windows = availability_windows(expert_ids, start_date, end_date)
+    now = timezone.now()
+    range_start = max(_at(start_date, time.min), now)
+    busy = busy_intervals(expert_ids, range_start, _at(end_date + timedelta(days=1), time.min))
+
+    free = {}
+    for expert_id in expert_ids:
+        # Rien dans le passé
+        upcoming = [(max(start, now), end) for start, end in windows[expert_id] if end > now]
+        free[expert_id] = _subtract(upcoming, busy.get(expert_id, []))
+    return free
+
+
+def slot_starts(intervals, duration, step=None):
+    """Start times, every `step` minutes, of the appointments of `duration` minutes fitting in the intervals"""
+    step_seconds = (step or _step()) * 60
+    length = timedelta(minutes=duration)
+    starts = []
+    for start, end in intervals:
+        # Premier départ aligné sur le pas (xx:00, xx:30...)
+        timestamp = math.ceil(start.timestamp() / step_seconds) * step_seconds
+        current = datetime.fromtimestamp(timestamp, tz=start.tzinfo)
+        while current + length <= end:
+            starts.append(current)
+            current += timedelta(seconds=step_seconds)
+    return starts
+
+
+def free_slots(expert_ids, start_date, end_date, duration=60, step=None):
+    """{expert_id: [start, ...]} bookable appointment starts of the experts"""
+    return {
+        expert_id: slot_starts(intervals, duration, step)
+        for expert_id, intervals in free_intervals(expert_ids, start_date, end_date).items()
+    }
+
+
+def specialty_experts(specialty):
+    """Ids of the active experts of a specialty"""
+    return list(
+        Expert.objects.filter(specialty__iexact=specialty, user__is_active=True)
+        .values_list('user_id', flat=True)
+    )
+
+
+def check_slot(expert_id, start, duration, exclude_id=None):
+    """Raise SchedulingError when the expert cannot take this appointment"""
+    duration = int(duration)
+    if duration <= 0 or duration > getattr(settings, 'SCHEDULING_MAX_DURATION', 8 * 60):
+        raise SchedulingError(_('Invalid appointment duration.'), status=400)
+    start = _aware(start)
+    end = start + timedelta(minutes=duration)
+
+    if busy_intervals([expert_id], start, end, exclude_id=exclude_id):
+        raise SchedulingError(_('The expert already has an appointment at this time.'))
+
+    if ExpertAvailability.objects.filter(expert_id=expert_id).exists():
+        local_day = timezone.localtime(start, timezone.get_default_timezone()).date()
+        windows = availability_windows([expert_id], local_day, local_day + timedelta(days=1))[expert_id]
+        if not any(window_start <= start and end <= window_end for window_start, window_end in windows):
+            raise SchedulingError(_('The expert is not available at this time.'))
+
+
+def _lock_expert(expert_id):
+    # Verrou sur la ligne de l'expert : les réservations d'un même expert passent une à une
+    list(Utilisateur.objects.select_for_update().filter(pk=expert_id).values_list('pk', flat=True))
+
+
+def book_appointment(**fields):
+    """Create a RendezVous (fields as for the model) unless it overlaps another appointment of the expert"""
+    fields['date_time'] = _aware(fields['date_time'])
+    fields.setdefault('duration', 60)
+    expert_id = fields['expert'].pk if 'expert' in fields else fields['expert_id']
+    with transaction.atomic():
+        _lock_expert(expert_id)
+        check_slot(expert_id, fields['date_time'], fields['duration'])
+        return RendezVous.objects.create(**fields)
+
+
+def reschedule_appointment(appointment, date_time, duration=None):
+    """Move an appointment unless the new time overlaps another appointment of the expert"""
+    date_time = _aware(date_time)
+    with transaction.atomic():
+        _lock_expert(appointment.expert_id)
+        duration = duration if duration is not None else appointment.duration
+        check_slot(appointment.expert_id, date_time, duration, exclude_id=appointment.pk)
+        appointment.date_time = date_time
+        appointment.duration = int(duration)
+        appointment.save()
+    return appointment
@@ -0,0 +1,209 @@
+"""
+Admin search backed by an inverted token table (SearchToken).
+
+Each indexed row is split into normalized tokens (lowercase, accents and Arabic
+diacritics removed, Arabic letter variants folded) stored with a weight per
+field. A query matches rows having, for every term, a token starting with it,
+ranked by the summed weight of the matching tokens. Lookups are index range
+scans on (kind, token), so the cost does not grow with the table size.
+
+The table is kept in sync by signals (custom_requests.signals) and rebuilt
+with `manage.py rebuild_search_index`.
+"""
+import re
+import unicodedata
+
+from django.db import transaction
+from django.db.models import IntegerField, OuterRef, Subquery
+
+from accounts.models import Utilisateur
+from .models import Message, SearchToken, ServiceRequest
+
+TOKEN_MAX_LENGTH = SearchToken._meta.get_field('token').max_length
+MIN_TERM_LENGTH = 2
+MAX_QUERY_TERMS = 6
+MAX_TOKEN_WEIGHT = 100
+
+# Variantes de lettres arabes ramenées à une forme unique (les diacritiques et
+# la hamza combinante sont déjà retirés par la décomposition NFKD)
+LETTER_FOLDS = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي', 'ؤ': 'و', 'ة': 'ه',
+    'ـ': None,  # tatweel
+    'œ': 'oe', 'æ': 'ae',
+})
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Lowercase text without accents, diacritics or letter variants"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return text.casefold().translate(LETTER_FOLDS)
+
+
+def tokenize(text):
+    """Normalized words of text, truncated to the indexed length"""
+    return [
+        word[:TOKEN_MAX_LENGTH]
+        for word in _WORD_RE.findall(normalize(text))
+        if len(word) >= MIN_TERM_LENGTH
+    ]
+
+
+def query_terms(query):
+    """Distinct search terms of a query, in order"""
+    return list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+
+
+# Documents indexés : champs (texte, poids) de chaque type d'objet
+
+def _full_name(user):
+    return f"{user.first_name} {user.name}" if user else ''
+
+
+def request_fields(service_request):
+    return [
+        (service_request.title, 3),
+        (_full_name(service_request.client), 3),
+        (_full_name(service_request.expert), 3),
+        (service_request.service.title if service_request.service else '', 2),
+        (service_request.description, 1),
+    ]
+
+
+def user_fields(user):
+    phone_digits = re.sub(r'\D', '', user.phone or '')
+    return [
+        (user.first_name, 3),
+        (user.name, 3),
+        (user.email, 2),
+        (phone_digits, 2),
+    ]
+
+
+def message_fields(message):
+    return [
+        (_full_name(message.sender), 2),
+        (_full_name(message.recipient), 2),
+        (message.service_request.title if message.service_request else '', 2),
+        (message.content, 1),
+    ]
+
+
+# type -> (modèle, champs indexés, relations à charger)
+DOCUMENTS = {
+    'request': (ServiceRequest, request_fields, ('client', 'expert', 'service')),
+    'user': (Utilisateur, user_fields, ()),
+    'message': (Message, message_fields, ('sender', 'recipient', 'service_request')),
+}
+
+
+def document_tokens(kind, obj):
+    """{token: weight} of one object"""
+    _, fields, _ = DOCUMENTS[kind]
+    weights = {}
+    for text, weight in fields(obj):
+        for token in tokenize(text):
+            weights[token] = min(weights.get(token, 0) + weight, MAX_TOKEN_WEIGHT)
+    return weights
+
+
+def index_object(kind, obj):
+    """
+    Refresh the tokens of one object.
+
+    Returns True when its tokens changed; an unchanged object (status update,
+    last_login...) costs a single SELECT and no write.
+    """
+    tokens = document_tokens(kind, obj)
+    current = dict(
+        SearchToken.objects.filter(kind=kind, object_id=obj.pk).values_list('token', 'weight')
+    )
+    if current == tokens:
+        return False
+
+    with transaction.atomic():
+        SearchToken.objects.filter(kind=kind, object_id=obj.pk).delete()
+        SearchToken.objects.bulk_create([
+            SearchToken(kind=kind, object_id=obj.pk, token=token, weight=weight)
+            for token, weight in tokens.items()
+        ])
+    return True
+
+
+def index_objects(kind, objects):
+    """Replace the tokens of many objects (relations should be preloaded)"""
+    objects = list(objects)
+    if not objects:
+        return
+    with transaction.atomic():
+        SearchToken.objects.filter(kind=kind, object_id__in=[obj.pk for obj in objects]).delete()
+        SearchToken.objects.bulk_create([
+            SearchToken(kind=kind, object_id=obj.pk, token=token, weight=weight)
+            for obj in objects
+            for token, weight in document_tokens(kind, obj).items()
+        ], batch_size=1000)
+
+
+def reindex(kind, queryset=None, batch_size=1000):
+    """Rebuild the tokens of queryset (default: every object of kind) by primary key batches"""
+    model, _, related = DOCUMENTS[kind]
+    queryset = (model.objects.all() if queryset is None else queryset).select_related(*related)
+    last_pk = None
+    total = 0
+    while True:
+        batch = queryset.order_by('pk')
+        if last_pk is not None:
+            batch = batch.filter(pk__gt=last_pk)
+        batch = list(batch[:batch_size])
+        if not batch:
+            return total
+        index_objects(kind, batch)
+        total += len(batch)
+        last_pk = batch[-1].pk
+
+
+def next_prefix(term):
+    """Smallest string greater than every string starting with term"""
+    return term[:-1] + chr(ord(term[-1]) + 1)
+
+
+def _term_tokens(kind, term):
+    """
+    Rows of the token table matching term: every token starting with it.
+
+    The prefix is the range [term, next_prefix(term)[, read on the
+    (kind, token) index by both backends (startswith becomes LIKE BINARY
+    under MySQL and LIKE is not indexed by SQLite).
+    """
+    return SearchToken.objects.filter(kind=kind, token__gte=term, token__lt=next_prefix(term))
+
+
+def search_queryset(queryset, kind, query):
+    """
+    Restrict queryset to the objects matching every term of query, best first.
+
+    The search is a condition of the queryset itself (pk IN the object ids
+    of each term), so the filters of the list and the search are applied
+    together by the database and no match is left out. Rows are ranked by
+    the summed best weight of each term, then newest first. Matches are
+    read from the (kind, token, object_id, weight) index only: the cost
+    grows with the number of matching rows, not with the table. A query
+    without usable terms (shorter than MIN_TERM_LENGTH) matches nothing.
+    """
+    terms = query_terms(query)
+    if not terms:
+        return queryset.none()
+
+    rank = None
+    for term in terms:
+        tokens = _term_tokens(kind, term)
+        queryset = queryset.filter(pk__in=tokens.values('object_id'))
+        best = Subquery(
+            tokens.filter(object_id=OuterRef('pk')).order_by('-weight').values('weight')[:1],
+            output_field=IntegerField(),
+        )
+        rank = best if rank is None else rank + best
+    return queryset.alias(search_rank=rank).order_by('-search_rank', '-pk')
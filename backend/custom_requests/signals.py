@@ -0,0 +1,105 @@
+from django.db.models import Q
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from accounts.models import Utilisateur
+from messaging.events import broadcast_new_notifications, broadcast_notifications_changed
+from servicesbladi import storage
+from .models import Document, Message, Notification, ServiceRequest
+from .notifications import invalidate_notification_summary, notifications_changed
+from . import search
+from .stats import ROLLUPS, record_daily_event
+
+
+@receiver(post_save, sender=Notification)
+def notification_saved(sender, instance, created, raw=False, **kwargs):
+    """Keep the cached notification summary of the user in sync and push the change to its sockets"""
+    invalidate_notification_summary(instance.user_id)
+    if raw:
+        return
+    if created:
+        broadcast_new_notifications([instance])
+    else:
+        broadcast_notifications_changed(instance.user_id)
+
+
+@receiver(post_delete, sender=Notification)
+def notification_deleted(sender, instance, **kwargs):
+    notifications_changed(instance.user_id)
+
+
+# Compteurs de références des fichiers stockés par contenu (servicesbladi.storage)
+
+@receiver(post_init, sender=Document)
+def document_loaded(sender, instance, **kwargs):
+    storage.remember_file(instance)
+
+
+@receiver(post_save, sender=Document)
+def document_saved(sender, instance, created, raw=False, **kwargs):
+    """Count the reference of the document to its blob"""
+    if not raw:
+        storage.file_saved(instance, created)
+
+
+@receiver(post_delete, sender=Document)
+def document_deleted(sender, instance, **kwargs):
+    """Release the blob of a deleted document (collected by gc_blobs)"""
+    storage.file_deleted(instance)
+
+
+def _rollup_receiver(field, date_field):
+    def object_created(sender, instance, created, raw=False, **kwargs):
+        """Count the new row in today's DailyStat (fixtures are ignored)"""
+        if created and not raw:
+            record_daily_event(field, getattr(instance, date_field))
+    return object_created
+
+
+# Les receivers sont gardés au niveau du module : le signal ne garde qu'une référence faible
+_rollup_receivers = []
+for _field, (_model, _date_field) in ROLLUPS.items():
+    _receiver = _rollup_receiver(_field, _date_field)
+    post_save.connect(_receiver, sender=_model, dispatch_uid=f'daily_stat_{_field}')
+    _rollup_receivers.append(_receiver)
+
+
+# Index de recherche de l'administration (search.py). Les suppressions ne sont pas
+# suivies : les jetons orphelins ne correspondent plus à aucune ligne des listes et
+# sont purgés par `rebuild_search_index --prune`.
+
+@receiver(post_save, sender=ServiceRequest)
+def service_request_indexed(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        search.index_objects('request', [instance])
+    elif search.index_object('request', instance):
+        # Les messages de la demande sont indexés avec son titre
+        search.reindex('message', Message.objects.filter(service_request=instance))
+
+
+@receiver(post_save, sender=Message)
+def message_indexed(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        search.index_objects('message', [instance])
+    else:
+        search.index_object('message', instance)
+
+
+USER_SEARCH_FIELDS = {'first_name', 'name', 'email', 'phone'}
+
+
+@receiver(post_save, sender=Utilisateur)
+def user_indexed(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # La connexion ne met à jour que last_login : rien à réindexer
+    if raw or (update_fields and not USER_SEARCH_FIELDS.intersection(update_fields)):
+        return
+    if created:
+        search.index_objects('user', [instance])
+    elif search.index_object('user', instance):
+        # Les demandes et messages sont indexés avec le nom des participants
+        search.reindex('request', ServiceRequest.objects.filter(Q(client=instance) | Q(expert=instance)))
+        search.reindex('message', Message.objects.filter(Q(sender=instance) | Q(recipient=instance)))
@@ -0,0 +1,232 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from accounts.models import Utilisateur
+from resources.models import Resource
+from servicesbladi.buffers import CounterBuffer
+from servicesbladi.cache import bump_namespace, get_or_compute
+from .models import DailyStat, Document, Message, RendezVous, ServiceRequest
+
+ADMIN_STATS_NAMESPACE = 'admin_stats'
+
+# Champ de DailyStat -> (modèle, champ de date de création)
+ROLLUPS = {
+    'new_users': (Utilisateur, 'date_joined'),
+    'new_requests': (ServiceRequest, 'created_at'),
+    'new_appointments': (RendezVous, 'created_at'),
+    'new_documents': (Document, 'upload_date'),
+    'new_messages': (Message, 'sent_at'),
+}
+
+
+def record_daily_event(field, when=None, amount=1):
+    """
+    Add amount to one counter of the DailyStat row of the day.
+
+    Buffered in the process and counted once the transaction commits,
+    unless DAILY_STAT_BUFFER is 'off' (immediate UPDATE of the row).
+    """
+    day = timezone.localdate(when) if when else timezone.localdate()
+    if getattr(settings, 'DAILY_STAT_BUFFER', 'memory') == 'off':
+        write_daily_counts({day: {field: amount}})
+        return
+    # Une création annulée (rollback) n'est pas comptée
+    transaction.on_commit(lambda: _buffer.add(day, field, amount))
+
+
+def write_daily_counts(counts):
+    """Add {day: {field: n}} to the DailyStat rows (created on first use)"""
+    for day, fields in counts.items():
+        fields = {field: amount for field, amount in fields.items() if amount}
+        if not fields:
+            continue
+        increments = {field: F(field) + amount for field, amount in fields.items()}
+        if DailyStat.objects.filter(date=day).update(**increments):
+            continue
+        try:
+            with transaction.atomic():
+                DailyStat.objects.create(date=day, **fields)
+        except IntegrityError:
+            # Another process created the row in the meantime
+            DailyStat.objects.filter(date=day).update(**increments)
+
+
+def flush_daily_stats():
+    """Write the events buffered in this process. Returns the number of events written."""
+    return _buffer.flush()
+
+
+# Tampon des compteurs de DailyStat (DAILY_STAT_BUFFER = 'memory') : toutes les créations
+# du jour touchent la même ligne, écrite une fois par intervalle et non à chaque insertion.
+# Un processus tué perd au plus DAILY_STAT_FLUSH_INTERVAL secondes, que
+# `manage.py rebuild_daily_stats` répare. jour -> {champ: n}
+_buffer = CounterBuffer(
+    'daily statistics', write_daily_counts, ROLLUPS,
+    interval=lambda: getattr(settings, 'DAILY_STAT_FLUSH_INTERVAL', 10),
+    flush_size=lambda: getattr(settings, 'DAILY_STAT_FLUSH_SIZE', 1000),
+)
+
+
+def daily_series(days=7, end=None):
+    """
+    Return the rollups of the last days, oldest first, with missing days as zeros.
+
+    One query on DailyStat whatever the size of the underlying tables.
+    """
+    end = end or timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    rows = {row.date: row for row in DailyStat.objects.filter(date__gte=start, date__lte=end)}
+
+    series = []
+    for offset in range(days):
+        day = start + timedelta(days=offset)
+        row = rows.get(day)
+        series.append({
+            'date': day,
+            **{field: getattr(row, field) if row else 0 for field in ROLLUPS},
+        })
+    return series
+
+
+def rebuild_daily_stats(since=None):
+    """
+    Recompute the DailyStat rows from the source tables, grouped with TruncDate.
+
+    Used to backfill the rollups and to repair them after bulk imports or
+    deletions, which the signals do not see. Returns the number of days written.
+    """
+    totals = {}
+    for field, (model, date_field) in ROLLUPS.items():
+        queryset = model.objects.all()
+        if since:
+            queryset = queryset.filter(**{f'{date_field}__date__gte': since})
+        grouped = (
+            queryset.annotate(day=TruncDate(date_field))
+            .values('day')
+            .annotate(total=Count('pk'))
+            .order_by()
+        )
+        for row in grouped:
+            totals.setdefault(row['day'], {})[field] = row['total']
+
+    with transaction.atomic():
+        stale = DailyStat.objects.all()
+        if since:
+            stale = stale.filter(date__gte=since)
+        stale.delete()
+        DailyStat.objects.bulk_create([
+            DailyStat(date=day, **{field: counts.get(field, 0) for field in ROLLUPS})
+            for day, counts in totals.items()
+        ])
+    return len(totals)
+
+
+def request_aggregates():
+    return {
+        'total': Count('pk'),
+        'pending': Count('pk', filter=Q(status='pending')),
+        'in_progress': Count('pk', filter=Q(status='in_progress')),
+        'completed': Count('pk', filter=Q(status='completed')),
+    }
+
+
+def request_counts(queryset):
+    """Status breakdown of a (possibly filtered) ServiceRequest queryset in one query"""
+    return queryset.order_by().aggregate(**request_aggregates())
+
+
+def appointment_counts(queryset):
+    """Breakdown of a (possibly filtered) RendezVous queryset in one query"""
+    now = timezone.now()
+    return queryset.order_by().aggregate(
+        total=Count('pk'),
+        upcoming=Count('pk', filter=Q(date_time__gte=now)),
+        completed=Count('pk', filter=Q(status='completed')),
+        cancelled=Count('pk', filter=Q(status='cancelled')),
+        today=Count('pk', filter=Q(date_time__date=timezone.localdate())),
+    )
+
+
+def message_aggregates():
+    now = timezone.now()
+    return {
+        'total': Count('pk'),
+        'unread': Count('pk', filter=Q(is_read=False)),
+        'today': Count('pk', filter=Q(sent_at__date=timezone.localdate())),
+        'admin': Count('pk', filter=Q(sender__account_type='admin') | Q(recipient__account_type='admin')),
+        'recent': Count('pk', filter=Q(sent_at__gte=now - timedelta(days=1))),
+    }
+
+
+def message_counts(queryset):
+    """Breakdown of a (possibly filtered) Message queryset in one query"""
+    return queryset.order_by().aggregate(**message_aggregates())
+
+
+def bounded_counts(queryset, aggregates, limit=None):
+    """
+    Breakdown of a filtered admin list over at most PAGINATION_COUNT_LIMIT rows.
+
+    Returns the counts and the (total, exact, estimate) of the list for
+    servicesbladi.pagination, so the page does not count the rows again.
+    Past the limit, every count covers the same first `limit` rows (no card
+    exceeds the total) and the total is shown as "limit+": a second query
+    reading one row past the limit tells whether there are more.
+    """
+    limit = limit or getattr(settings, 'PAGINATION_COUNT_LIMIT', 10000)
+    queryset = queryset.order_by()
+    counts = queryset[:limit].aggregate(**aggregates)
+    if counts['total'] == limit and queryset[limit:limit + 1].exists():
+        return counts, (limit, False, False)
+    return counts, (counts['total'], True, False)
+
+
+def user_counts():
+    return Utilisateur.objects.aggregate(
+        total=Count('pk'),
+        clients=Count('pk', filter=Q(account_type__iexact='client')),
+        experts=Count('pk', filter=Q(account_type__iexact='expert')),
+        admins=Count('pk', filter=Q(account_type__iexact='admin')),
+        active=Count('pk', filter=Q(is_active=True)),
+        inactive=Count('pk', filter=Q(is_active=False)),
+        recent=Count('pk', filter=Q(date_joined__gte=timezone.now() - timedelta(days=7))),
+    )
+
+
+def get_admin_stats():
+    """
+    Return the site-wide statistics shown on the admin pages.
+
+    Each table is read with a single conditional aggregate and the snapshot
+    is cached for ADMIN_STATS_TIMEOUT seconds, so the admin home costs a
+    cache hit most of the time. Concurrent misses compute it only once.
+    """
+    return get_or_compute(
+        ADMIN_STATS_NAMESPACE, 'snapshot', compute_admin_stats,
+        timeout=getattr(settings, 'ADMIN_STATS_TIMEOUT', 60),
+    )
+
+
+def compute_admin_stats():
+    return {
+        'users': user_counts(),
+        'requests': request_counts(ServiceRequest.objects.all()),
+        'appointments': appointment_counts(RendezVous.objects.all()),
+        'messages': message_counts(Message.objects.all()),
+        'documents': Document.objects.count(),
+        'resources': Resource.objects.count(),
+        'top_services': list(
+            ServiceRequest.objects.values('service__title')
+            .annotate(count=Count('id'), name=Count('service__title'))
+            .order_by('-count')[:5]
+        ),
+    }
+
+
+def invalidate_admin_stats():
+    bump_namespace(ADMIN_STATS_NAMESPACE)
@@ -1,3 +1,250 @@
-from django.test import TestCase
+import io
+import os
+import shutil
+import tempfile
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.base import ContentFile
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from accounts.models import Utilisateur
+from servicesbladi import renditions
+from .admin_filters import filter_service_requests, filter_users
+from .exports import export_rows
+from .models import Document, Message, ServiceRequest
+from .retention import archive_messages
+from . import uploads
+
+
+class DocumentDeliveryTests(TestCase):
+    """Uploaded files are only shown in the browser when their type cannot run script"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root, RENDITION_WORKERS=0, FILE_DELIVERY='python')
+        cls.media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.client_user = Utilisateur.objects.create_user(
+            email='client@example.com', password='x', first_name='C', name='Client', account_type='client')
+        self.admin_user = Utilisateur.objects.create_user(
+            email='admin@example.com', password='x', first_name='A', name='Admin', account_type='admin')
+
+    def upload(self, name, content, mime_type):
+        document = Document(uploaded_by=self.client_user, name=name)
+        document.file.save(name, ContentFile(content), save=False)
+        document.save()
+        # Type annoncé par le navigateur ou détecté : ne doit pas suffire à afficher le fichier
+        Document.objects.filter(pk=document.pk).update(mime_type=mime_type)
+        return document
+
+    def fetch(self, document, inline=True):
+        self.client.force_login(self.admin_user)
+        url = reverse('custom_requests:download_document', args=[document.pk])
+        response = self.client.get(url + ('?inline=1' if inline else ''))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_html_is_never_inline(self):
+        document = self.upload('x.html', b'<script>alert(1)</script>', 'text/html')
+        response = self.fetch(document)
+        self.assertEqual(response['Content-Type'], 'application/octet-stream')
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+
+    def test_svg_and_xml_are_never_inline(self):
+        for name, mime_type in [('x.svg', 'image/svg+xml'), ('x.xml', 'application/xml')]:
+            response = self.fetch(self.upload(name, b'<svg onload="alert(1)"/>', mime_type))
+            self.assertEqual(response['Content-Type'], 'application/octet-stream')
+            self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+
+    def test_pdf_is_inline_in_a_sandbox(self):
+        response = self.fetch(self.upload('x.pdf', b'%PDF-1.4\n%%EOF\n', 'application/pdf'))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response['Content-Disposition'].startswith('inline'))
+        self.assertEqual(response['Content-Security-Policy'], 'sandbox')
+
+    def test_pdf_download_is_an_attachment(self):
+        response = self.fetch(self.upload('y.pdf', b'%PDF-1.4\n%%EOF\n', 'application/pdf'), inline=False)
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+        self.assertNotIn('Content-Security-Policy', response)
+
+    def test_thumbnail_needs_the_document_permission(self):
+        image = io.BytesIO()
+        Image.new('RGB', (600, 400), 'blue').save(image, 'PNG')
+        document = self.upload('scan.png', image.getvalue(), 'image/png')
+        document.refresh_from_db()
+        # Le cache partagé survit aux tests : pas de vignette d'un passage précédent
+        renditions.delete_renditions(document.file.name)
+        url = reverse('custom_requests:document_thumbnail', args=[document.pk])
+        # Le premier affichage lance le rendu (immédiat sans pool de threads)
+        self.assertIsNone(document.thumbnail_url)
+        self.assertEqual(document.thumbnail_url, url)
+
+        self.client.force_login(self.client_user)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+
+        other = Utilisateur.objects.create_user(
+            email='other@example.com', password='x', first_name='O', name='Other', account_type='client')
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+
+class SearchFilterTests(TestCase):
+    """The admin search and the list filters are applied together, before any ranking"""
+
+    def setUp(self):
+        self.client_user = Utilisateur.objects.create_user(
+            email='client@example.com', password='x', first_name='Karim', name='Benali', account_type='client')
+
+    def create_requests(self, count, title, status='new', description='dossier'):
+        return [
+            ServiceRequest.objects.create(client=self.client_user, title=title, description=description, status=status)
+            for _ in range(count)
+        ]
+
+    def test_filter_keeps_older_matches(self):
+        # Les correspondances terminées sont les plus anciennes, noyées sous les récentes
+        completed = self.create_requests(3, 'Demande de visa', status='completed')
+        self.create_requests(40, 'Demande de visa')
+        results = filter_service_requests(ServiceRequest.objects.all(), {'status': 'completed', 'search': 'visa'})
+        self.assertEqual(sorted(results.values_list('pk', flat=True)), sorted(r.pk for r in completed))
+
+    def test_every_term_must_match(self):
+        expected = self.create_requests(2, 'Visa travail', status='completed')
+        self.create_requests(2, 'Visa travail')
+        self.create_requests(2, 'Visa tourisme', status='completed')
+        results = filter_service_requests(ServiceRequest.objects.all(), {'status': 'completed', 'search': 'visa trav'})
+        self.assertEqual(sorted(results.values_list('pk', flat=True)), sorted(r.pk for r in expected))
+
+    def test_ranked_by_weight_then_newest(self):
+        in_description = self.create_requests(1, 'Renouvellement', description='visa')[0]
+        in_title = self.create_requests(2, 'Visa')
+        results = filter_service_requests(ServiceRequest.objects.all(), {'search': 'visa'})
+        self.assertEqual(list(results.values_list('pk', flat=True)), [in_title[1].pk, in_title[0].pk, in_description.pk])
+
+    def test_export_has_every_filtered_match(self):
+        completed = self.create_requests(5, 'Demande de visa', status='completed')
+        self.create_requests(5, 'Demande de visa')
+        rows = list(export_rows('requests', {'status': 'completed', 'search': 'visa'}, batch_size=2))
+        self.assertEqual([row[0] for row in rows], [r.pk for r in reversed(completed)])
+
+    def test_export_follows_list_order(self):
+        self.create_requests(5, 'Demande de visa')
+        listed = filter_service_requests(ServiceRequest.objects.all(), {}).order_by('-created_at', '-id')
+        rows = list(export_rows('requests', {}, batch_size=2))
+        self.assertEqual([row[0] for row in rows], list(listed.values_list('pk', flat=True)))
+
+    def test_search_with_user_filters(self):
+        expert = Utilisateur.objects.create_user(
+            email='karim.expert@example.com', password='x', first_name='Karim', name='Alaoui', account_type='expert')
+        results = filter_users(Utilisateur.objects.all(), {'user_type': 'expert', 'search': 'karim'})
+        self.assertEqual(list(results), [expert])
+        self.assertFalse(filter_users(Utilisateur.objects.all(), {'search': 'k'}).exists())
+
+    def test_prefix_matches_every_token(self):
+        # Plus de 20 mots distincts commencent par « ben » (Benali compris)
+        users = [
+            Utilisateur.objects.create_user(
+                email=f'ben{index}@example.com', password='x', first_name='Ali', name='Ben' + 'z' * index,
+                account_type='client')
+            for index in range(1, 27)
+        ] + [self.client_user]
+        results = filter_users(Utilisateur.objects.all(), {'search': 'ben'})
+        self.assertEqual(sorted(results.values_list('pk', flat=True)), sorted(user.pk for user in users))
+
+
+class ArchivedChatTests(TestCase):
+    """The chat of a closed request still shows its archived messages"""
+
+    def setUp(self):
+        self.client_user = Utilisateur.objects.create_user(
+            email='client@example.com', password='x', first_name='C', name='Client', account_type='client')
+        self.expert_user = Utilisateur.objects.create_user(
+            email='expert@example.com', password='x', first_name='E', name='Expert', account_type='expert')
+        self.service_request = ServiceRequest.objects.create(
+            client=self.client_user, expert=self.expert_user, title='Visa', description='dossier', status='completed')
+        self.sent = [
+            Message.objects.create(sender=sender, recipient=recipient, content=content,
+                                   service_request=self.service_request)
+            for sender, recipient, content in [
+                (self.expert_user, self.client_user, 'Bonjour'),
+                (self.client_user, self.expert_user, 'Merci'),
+            ]
+        ]
+        self.assertEqual(archive_messages(days=0), 2)
+
+    def test_api_pages_archived_messages(self):
+        self.client.force_login(self.client_user)
+        response = self.client.get(
+            reverse('custom_requests:api_messages'), {'request_id': self.service_request.pk}, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([message['id'] for message in response.json()['messages']], [m.pk for m in self.sent])
+
+    def test_client_is_not_sent_away(self):
+        self.client.force_login(self.client_user)
+        # Seul le contexte de la page est vérifié, pas le rendu du gabarit
+        with mock.patch('messaging.views.render', return_value=HttpResponse()) as render:
+            response = self.client.get(reverse('messaging:chat', args=[self.service_request.pk]), HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 200)
+        context = render.call_args.args[2]
+        self.assertEqual([message.pk for message in context['chat_messages']], [m.pk for m in self.sent])
+
+
+class UploadPurgeTests(TestCase):
+    """The purge never removes the file of a session opened while it runs"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir, ignore_errors=True)
+        override = override_settings(UPLOAD_TEMP_DIR=self.temp_dir, UPLOAD_ORPHAN_GRACE=3600)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = Utilisateur.objects.create_user(
+            email='client@example.com', password='x', first_name='C', name='Client', account_type='client')
+
+    def orphan(self, name, age):
+        path = os.path.join(self.temp_dir, name)
+        open(path, 'wb').close()
+        modified = time.time() - age
+        os.utime(path, (modified, modified))
+        return path
+
+    def test_recent_orphans_are_kept(self):
+        recent = self.orphan('recent.part', 60)
+        old = self.orphan('old.part', 2 * 3600)
+        uploads.purge_expired()
+        self.assertTrue(os.path.exists(recent))
+        self.assertFalse(os.path.exists(old))
+
+    def test_missing_file_is_gone(self):
+        session = uploads.open_session(self.user, 'a.bin', 10)
+        os.remove(uploads.temp_path(session))
+        with self.assertRaises(uploads.UploadError) as raised:
+            uploads.write_chunk(session, 0, 10, io.BytesIO(b'0123456789'))
+        self.assertEqual(raised.exception.status, 410)
+
+
+class SchedulingApiTests(TestCase):
+    """Malformed parameters of the scheduling API answer 400, not 500"""
+
+    def test_free_slots_rejects_a_non_numeric_expert(self):
+        user = Utilisateur.objects.create_user(
+            email='client@example.com', password='x', first_name='C', name='Client', account_type='client')
+        self.client.force_login(user)
+        response = self.client.get(reverse('custom_requests:api_free_slots'), {'expert_id': 'abc'}, HTTP_HOST='localhost')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
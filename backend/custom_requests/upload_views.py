@@ -0,0 +1,194 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.translation import gettext_lazy as _
+from django.views.decorators.http import require_http_methods, require_POST
+import json
+
+from .models import DOCUMENT_TYPES, Notification, RendezVous, ServiceRequest
+from . import uploads
+
+# Resumable upload API (see uploads.py):
+#   POST   api/uploads/                 -> open a session (filename, size, mime_type)
+#   PUT    api/uploads/<id>/            -> one chunk, Content-Range: bytes start-end/total
+#   GET    api/uploads/<id>/            -> state of the session (chunks still missing)
+#   DELETE api/uploads/<id>/            -> abandon the session
+#   POST   api/uploads/<id>/complete/   -> create the Document
+
+
+def _request_data(request):
+    """JSON body or form fields of a POST"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
+
+
+def _error(message, status):
+    return JsonResponse({'success': False, 'message': message}, status=status)
+
+
+def _can_attach(user, service_request=None, rendez_vous=None):
+    """Whether user may add a document to this request / appointment"""
+    if user.account_type.lower() == 'admin':
+        return True
+    if service_request is not None and user.id not in (service_request.client_id, service_request.expert_id):
+        return False
+    if rendez_vous is not None and user.id not in (rendez_vous.client_id, rendez_vous.expert_id):
+        return False
+    return True
+
+
+def _notify_document(document, user):
+    """Tell the other party of the request / appointment about a new document"""
+    service_request = document.service_request
+    rendez_vous = document.rendez_vous
+
+    if service_request is not None:
+        recipient_id = service_request.expert_id if user.id == service_request.client_id else service_request.client_id
+        if recipient_id and recipient_id != user.id:
+            Notification.objects.create(
+                user_id=recipient_id,
+                type='document',
+                title=_('New Document Uploaded'),
+                content=_(f'A new document "{document.name}" has been uploaded by {user.name} {user.first_name} for request "{service_request.title}".'),
+                related_service_request=service_request
+            )
+
+    if rendez_vous is not None:
+        recipient_id = rendez_vous.expert_id if user.id == rendez_vous.client_id else rendez_vous.client_id
+        if recipient_id and recipient_id != user.id:
+            Notification.objects.create(
+                user_id=recipient_id,
+                type='document',
+                title=_('New Document Uploaded'),
+                content=_(f'A new document "{document.name}" has been uploaded by {user.name} {user.first_name} for the appointment on {rendez_vous.date_time.strftime("%Y-%m-%d %H:%M")}.'),
+                related_rendez_vous=rendez_vous
+            )
+
+
+@login_required
+@require_POST
+def api_upload_init(request):
+    """Open a resumable upload session"""
+    data = _request_data(request)
+    if data is None:
+        return _error(_('Invalid request body.'), 400)
+
+    try:
+        session = uploads.open_session(
+            request.user,
+            data.get('filename'),
+            data.get('size'),
+            data.get('mime_type', ''),
+        )
+    except uploads.UploadError as e:
+        return _error(e.message, e.status)
+
+    return JsonResponse({'success': True, **uploads.session_state(session)}, status=201)
+
+
+@login_required
+@require_http_methods(['GET', 'PUT', 'DELETE'])
+def api_upload_detail(request, upload_id):
+    """State of an upload session (GET), one chunk (PUT) or abandon (DELETE)"""
+    session = uploads.get_session(request.user, upload_id)
+    if session is None:
+        return _error(_('Upload not found.'), 404)
+
+    if request.method == 'DELETE':
+        uploads.discard_session(session)
+        return JsonResponse({'success': True})
+
+    if request.method == 'PUT':
+        try:
+            length = int(request.META.get('CONTENT_LENGTH') or '')
+        except ValueError:
+            return _error(_('Content-Length is required.'), 411)
+
+        content_range = request.META.get('HTTP_CONTENT_RANGE')
+        if content_range:
+            parsed = uploads.parse_content_range(content_range)
+            if parsed is None or parsed[2] != session.size or parsed[1] - parsed[0] + 1 != length:
+                return _error(_('Invalid Content-Range.'), 416)
+            offset = parsed[0]
+        else:
+            try:
+                offset = int(request.GET.get('offset', ''))
+            except ValueError:
+                return _error(_('Content-Range or offset is required.'), 400)
+
+        try:
+            # Lecture du corps par blocs : un morceau n'est jamais chargé en mémoire
+            uploads.write_chunk(session, offset, length, request)
+        except uploads.UploadError as e:
+            return _error(e.message, e.status)
+
+    return JsonResponse({'success': True, **uploads.session_state(session)})
+
+
+@login_required
+@require_POST
+def api_upload_complete(request, upload_id):
+    """Create the Document of a fully received upload"""
+    session = uploads.get_session(request.user, upload_id)
+    if session is None:
+        return _error(_('Upload not found.'), 404)
+
+    data = _request_data(request)
+    if data is None:
+        return _error(_('Invalid request body.'), 400)
+
+    service_request = None
+    rendez_vous = None
+    service_request_id = data.get('service_request_id') or data.get('demande_id')
+    rendez_vous_id = data.get('rendez_vous_id')
+    if service_request_id:
+        service_request = ServiceRequest.objects.filter(id=service_request_id).first()
+        if service_request is None:
+            return _error(_('Request not found.'), 404)
+    if rendez_vous_id:
+        rendez_vous = RendezVous.objects.filter(id=rendez_vous_id).first()
+        if rendez_vous is None:
+            return _error(_('Appointment not found.'), 404)
+    if not _can_attach(request.user, service_request, rendez_vous):
+        return _error(_('You do not have permission to add documents here.'), 403)
+
+    document_type = data.get('type') or data.get('document_type') or 'other'
+    if document_type not in dict(DOCUMENT_TYPES):
+        document_type = 'other'
+    is_official = data.get('is_official') in (True, 'true', 'on', '1')
+
+    try:
+        document, created = uploads.complete_session(
+            session,
+            name=(data.get('name') or session.filename)[:255],
+            type=document_type,
+            service_request=service_request,
+            rendez_vous=rendez_vous,
+            is_official=is_official,
+            reference_number=(data.get('reference_number') or '')[:100],
+        )
+    except uploads.UploadError as e:
+        return _error(e.message, e.status)
+
+    if created:
+        _notify_document(document, request.user)
+
+    return JsonResponse({
+        'success': True,
+        'message': _('Document uploaded successfully.'),
+        'document': {
+            'id': document.id,
+            'name': document.name,
+            'type': document.type,
+            'url': reverse('custom_requests:download_document', args=[document.id]),
+            'mime_type': document.mime_type,
+            'file_size': document.file_size,
+            'service_request_id': document.service_request_id,
+            'rendez_vous_id': document.rendez_vous_id,
+        },
+    }, status=201 if created else 200)
@@ -0,0 +1,261 @@
+"""
+Resumable chunked uploads.
+
+A client opens an UploadSession (file name, size, MIME type), sends the file
+as fixed-size chunks with PUT requests, in any order and in parallel, then
+completes the session, which turns the assembled file into a Document.
+
+Each chunk is written in place at its offset in a temporary file under
+UPLOAD_TEMP_DIR and recorded as an UploadChunk only once fully received, so
+an interrupted transfer resumes with the chunks still missing. Completing
+moves the temporary file into the storage (a rename with FileSystemStorage),
+so no request holds a worker for more than one chunk.
+
+Expired sessions and their files are removed by `manage.py purge_uploads`.
+"""
+import os
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+
+from .models import Document, UploadChunk, UploadSession
+
+COPY_BLOCK_SIZE = 64 * 1024
+
+_CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
+
+class UploadError(Exception):
+    """Rejected upload operation, with the HTTP status to answer"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def _ttl():
+    return timedelta(seconds=getattr(settings, 'UPLOAD_SESSION_TTL', 24 * 3600))
+
+
+def temp_path(session):
+    return os.path.join(settings.UPLOAD_TEMP_DIR, f'{session.pk}.part')
+
+
+def open_session(user, filename, size, mime_type=''):
+    """Create an UploadSession and its (sparse) temporary file"""
+    filename = os.path.basename((filename or '').replace('\\', '/')).strip()[:255]
+    if not filename:
+        raise UploadError(_('A file name is required.'))
+    try:
+        size = int(size)
+    except (TypeError, ValueError):
+        raise UploadError(_('Invalid file size.'))
+    if size <= 0:
+        raise UploadError(_('The file is empty.'))
+    if size > settings.UPLOAD_MAX_SIZE:
+        raise UploadError(_('The file is too large.'), status=413)
+
+    now = timezone.now()
+    pending = UploadSession.objects.filter(
+        user=user, document__isnull=True, expires_at__gt=now
+    ).count()
+    if pending >= getattr(settings, 'UPLOAD_MAX_PENDING', 20):
+        raise UploadError(_('Too many uploads in progress.'), status=429)
+
+    session = UploadSession.objects.create(
+        user=user,
+        filename=filename,
+        size=size,
+        chunk_size=settings.UPLOAD_CHUNK_SIZE,
+        mime_type=(mime_type or '')[:100],
+        expires_at=now + _ttl(),
+    )
+    os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+    with open(temp_path(session), 'wb') as temp_file:
+        temp_file.truncate(size)
+    return session
+
+
+def get_session(user, upload_id):
+    """The user's live session with this id, or None"""
+    return UploadSession.objects.filter(
+        pk=upload_id, user=user, expires_at__gt=timezone.now()
+    ).first()
+
+
+def parse_content_range(value):
+    """(start, end, total) of a 'bytes start-end/total' header, or None"""
+    match = _CONTENT_RANGE_RE.match((value or '').strip())
+    if not match:
+        return None
+    start, end, total = (int(group) for group in match.groups())
+    if end < start:
+        return None
+    return start, end, total
+
+
+def received_chunks(session):
+    return list(session.chunks.order_by('index').values_list('index', flat=True))
+
+
+def session_state(session):
+    """JSON description of a session, with what is left to send"""
+    received = set(received_chunks(session))
+    return {
+        'upload_id': str(session.pk),
+        'filename': session.filename,
+        'size': session.size,
+        'chunk_size': session.chunk_size,
+        'chunk_count': session.chunk_count,
+        'received_chunks': sorted(received),
+        'missing_offsets': [
+            index * session.chunk_size
+            for index in range(session.chunk_count) if index not in received
+        ],
+        'complete': session.document_id is not None,
+        'document_id': session.document_id,
+        'expires_at': session.expires_at.isoformat(),
+    }
+
+
+def write_chunk(session, offset, length, stream):
+    """
+    Write the chunk starting at offset, read from stream (length bytes).
+
+    Chunks must start on a chunk boundary and have the full chunk length
+    (shorter for the last one). Sending a chunk again overwrites it, so a
+    client unsure whether a PUT went through simply repeats it.
+    """
+    if session.document_id is not None:
+        raise UploadError(_('This upload is already complete.'), status=409)
+    if offset < 0 or offset >= session.size or offset % session.chunk_size:
+        raise UploadError(_('Invalid chunk offset.'), status=416)
+    expected = min(session.chunk_size, session.size - offset)
+    if length != expected:
+        raise UploadError(_('Invalid chunk length.'), status=416)
+
+    written = 0
+    # r+b : chaque morceau est écrit à sa place, en parallèle des autres
+    try:
+        temp_file = open(temp_path(session), 'r+b')
+    except FileNotFoundError:
+        raise UploadError(_('This upload is no longer available. Please start again.'), status=410)
+    with temp_file:
+        temp_file.seek(offset)
+        while written < length:
+            block = stream.read(min(COPY_BLOCK_SIZE, length - written))
+            if not block:
+                break
+            temp_file.write(block)
+            written += len(block)
+    if written != length:
+        # Connexion interrompue : le morceau n'est pas enregistré et sera renvoyé
+        raise UploadError(_('Incomplete chunk.'))
+
+    index = offset // session.chunk_size
+    try:
+        with transaction.atomic():
+            UploadChunk.objects.get_or_create(session=session, index=index, defaults={'size': length})
+    except IntegrityError:
+        # Même morceau reçu deux fois en parallèle
+        pass
+    UploadSession.objects.filter(pk=session.pk).update(expires_at=timezone.now() + _ttl())
+    return index
+
+
+class AssembledFile(File):
+    """
+    Completed temporary file; temporary_file_path() lets FileSystemStorage
+    move it into place instead of copying it.
+    """
+
+    def __init__(self, path, name):
+        super().__init__(open(path, 'rb'), name)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+
+def complete_session(session, **fields):
+    """
+    Create the Document of a fully received session (fields are passed to
+    Document). Completing again returns the same document, so a client can
+    retry a completion whose response it lost. Returns (document, created).
+    """
+    with transaction.atomic():
+        session = UploadSession.objects.select_for_update().get(pk=session.pk)
+        if session.document_id is not None:
+            return session.document, False
+
+        received = session.chunks.aggregate(count=Count('pk'), total=Sum('size'))
+        if received['count'] != session.chunk_count or received['total'] != session.size:
+            raise UploadError(_('The upload is incomplete.'), status=409)
+
+        fields.setdefault('name', session.filename)
+        # Type MIME, empreinte et tailles : Document.save() (upload_handlers.apply_file_metadata)
+        document = Document(uploaded_by=session.user, **fields)
+        try:
+            assembled = AssembledFile(temp_path(session), session.filename)
+        except FileNotFoundError:
+            raise UploadError(_('This upload is no longer available. Please start again.'), status=410)
+        try:
+            document.file = assembled
+            document.save()
+        finally:
+            assembled.close()
+        # Contenu déjà stocké : le fichier temporaire n'a pas été déplacé
+        if os.path.exists(assembled.path):
+            os.remove(assembled.path)
+
+        session.document = document
+        session.expires_at = timezone.now() + _ttl()
+        session.save(update_fields=['document', 'expires_at'])
+        session.chunks.all().delete()
+    return document, True
+
+
+def discard_session(session):
+    """Delete a session and its temporary file"""
+    try:
+        os.remove(temp_path(session))
+    except FileNotFoundError:
+        pass
+    session.delete()
+
+
+def purge_expired(now=None):
+    """
+    Remove the expired sessions, their temporary files and the files left
+    without a session. Returns the number of sessions removed.
+
+    A file is only an orphan once untouched for UPLOAD_ORPHAN_GRACE seconds:
+    a session opened after the list of live sessions is read has a new file.
+    """
+    now = now or timezone.now()
+    expired = list(UploadSession.objects.filter(expires_at__lte=now))
+    for session in expired:
+        discard_session(session)
+
+    if os.path.isdir(settings.UPLOAD_TEMP_DIR):
+        live = {
+            f'{pk}.part' for pk in UploadSession.objects.filter(document__isnull=True).values_list('pk', flat=True)
+        }
+        oldest = now.timestamp() - getattr(settings, 'UPLOAD_ORPHAN_GRACE', 3600)
+        for name in os.listdir(settings.UPLOAD_TEMP_DIR):
+            if not name.endswith('.part') or name in live:
+                continue
+            path = os.path.join(settings.UPLOAD_TEMP_DIR, name)
+            try:
+                if os.path.getmtime(path) < oldest:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+    return len(expired)
@@ -1,6 +1,7 @@
 from django.urls import path, include
 from . import views
 from . import message_views
+from . import upload_views
 
 app_name = 'custom_requests'
 
@@ -30,6 +31,8 @@ urlpatterns = [
     path('documents/', views.documents_view, name='documents'),
     path('documents/upload/', views.upload_document_view, name='upload_document'),
     path('documents/delete/<int:document_id>/', views.delete_document_view, name='delete_document'),
+    path('documents/<int:document_id>/download/', views.download_document_view, name='download_document'),
+    path('documents/<int:document_id>/thumbnail/', views.document_thumbnail_view, name='document_thumbnail'),
     
     # Messaging views
     path('messages/', views.messages_view, name='messages'),
@@ -49,8 +52,13 @@ urlpatterns = [
     path('api/appointments/', views.api_client_appointments, name='api_appointments'),
     path('api/expert/requests/', views.api_expert_requests, name='api_expert_requests'),
     path('api/documents/upload/', views.api_upload_document, name='api_upload_document'),
+    path('api/uploads/', upload_views.api_upload_init, name='api_upload_init'),
+    path('api/uploads/<uuid:upload_id>/', upload_views.api_upload_detail, name='api_upload_detail'),
+    path('api/uploads/<uuid:upload_id>/complete/', upload_views.api_upload_complete, name='api_upload_complete'),
     path('api/messages/', views.api_messages, name='api_messages'),
     path('api/notifications/', views.api_notifications, name='api_notifications'),
+    path('api/slots/', views.api_free_slots, name='api_free_slots'),
+    path('api/availability/', views.api_expert_availability, name='api_expert_availability'),
     
     # AJAX endpoints
     path('ajax/create-request/', views.ajax_create_request, name='ajax_create_request'),
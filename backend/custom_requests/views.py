@@ -3,17 +3,27 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, HttpResponse
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.contrib import messages
+from django.urls import reverse
 import json
 import os
 import mimetypes
 
 from accounts.models import Utilisateur, Client, Expert
+from servicesbladi import renditions
+from servicesbladi.delivery import serve_file
 from services.models import Service, ServiceCategory
-from .models import ServiceRequest, RendezVous, Document, Message, Notification
+from .models import ServiceRequest, RendezVous, Document, Message, Notification, ExpertAvailability, AvailabilityException
+from .notifications import admin_audience, dispatch_notifications, notifications_changed
+from .retention import archived_notifications, request_messages
+from .scheduling import SchedulingError, book_appointment, free_slots, specialty_experts
+from .conversations import conversation_summaries
+from . import message_sync
 
 # Client request management views
 @login_required
@@ -69,8 +79,6 @@ def create_request_view(request, service_id):
                     type='other',
                     name=file.name,
                     file=file,
-                    mime_type=file.content_type,
-                    file_size=file.size // 1024  # Convert to KB
                 )
             
             # Process files[] as list instead of individually
@@ -82,22 +90,29 @@ def create_request_view(request, service_id):
                     type='other',
                     name=file.name,
                     file=file,
-                    mime_type=file.content_type,
-                    file_size=file.size // 1024  # Convert to KB
                 )
             
-            # Create a notification for admins
-            for admin_user in Utilisateur.objects.filter(account_type='admin', is_active=True):
-                Notification.objects.create(
-                    user=admin_user,
-                    type='request_update',
-                    title=_('New Service Request'),
-                    content=_(f'A new service request "{title}" has been created by {client.user.name} {client.user.first_name}.'),
-                    related_demande=demande
-                )
+            # Documents already sent through the resumable upload API (api/uploads/)
+            document_ids = request.POST.getlist('document_ids')
+            if document_ids:
+                Document.objects.filter(
+                    id__in=[document_id for document_id in document_ids if document_id.isdigit()],
+                    uploaded_by=request.user,
+                    service_request__isnull=True,
+                    rendez_vous__isnull=True
+                ).update(service_request=demande)
+            
+            # Create a notification for admins (written in the background)
+            dispatch_notifications(
+                admin_audience(),
+                'request_update',
+                _('New Service Request'),
+                _(f'A new service request "{title}" has been created by {client.user.name} {client.user.first_name}.'),
+                related_service_request=demande
+            )
             
             # Redirect to client requests view using the consistent URL naming
-            return redirect('custom_requests:client_demandes')
+            return redirect('client_demandes')
             
         context = {
             'service': service,
@@ -185,7 +200,7 @@ def request_detail_view(request, request_id):
     
     # Get documents and messages related to this request
     documents = Document.objects.filter(service_request=demande).order_by('-upload_date')
-    messages = Message.objects.filter(service_request=demande).order_by('sent_at')
+    messages = request_messages(demande)
     appointments = RendezVous.objects.filter(service_request=demande).order_by('date_time')
     
     # Handle new message submission
@@ -411,8 +426,8 @@ def create_appointment_view(request):
             if demande_id:
                 demande = get_object_or_404(ServiceRequest, id=demande_id, client=request.user)
             
-            # Create the appointment
-            appointment = RendezVous.objects.create(
+            # Create the appointment, unless the expert is busy or closed at this time
+            appointment = book_appointment(
                 client=request.user,
                 expert=expert.user,
                 service=service,
@@ -436,6 +451,8 @@ def create_appointment_view(request):
             
         except (Expert.DoesNotExist, Service.DoesNotExist):
             messages.error(request, _('Invalid expert or service.'))
+        except SchedulingError as e:
+            messages.error(request, e.message)
         except ValueError:
             messages.error(request, _('Invalid date or time format.'))
     
@@ -707,8 +724,6 @@ def upload_document_view(request):
                 type=document_type,
                 name=name or file.name,
                 file=file,
-                mime_type=file.content_type,
-                file_size=file.size // 1024,  # Convert to KB
                 is_official=is_official,
                 reference_number=reference_number
             )
@@ -789,6 +804,53 @@ def upload_document_view(request):
     
     return render(request, 'upload_document.html', context)
 
+def can_view_document(user, document):
+    """Admins, the uploader and the client / expert of the request or appointment"""
+    if user.account_type.lower() == 'admin' or document.uploaded_by_id == user.id:
+        return True
+    for related in (document.service_request, document.rendez_vous):
+        if related is not None and user.id in (related.client_id, related.expert_id):
+            return True
+    return False
+
+@login_required
+def download_document_view(request, document_id):
+    """Send a document to the people allowed to see it (?inline=1 to open it in the browser)"""
+    document = get_object_or_404(
+        Document.objects.select_related('service_request', 'rendez_vous'), id=document_id
+    )
+    if not document.file or not can_view_document(request.user, document):
+        return HttpResponse(status=404)
+    
+    return serve_file(
+        request,
+        document.file,
+        filename=document.download_name,
+        as_attachment=request.GET.get('inline') != '1',
+        content_type=document.mime_type or None,
+        etag=document.sha256 or None,
+    )
+
+@login_required
+def document_thumbnail_view(request, document_id):
+    """Send the preview of a document to the people allowed to see the document (?size=medium)"""
+    document = get_object_or_404(
+        Document.objects.select_related('service_request', 'rendez_vous'), id=document_id
+    )
+    if not document.file or not can_view_document(request.user, document):
+        return HttpResponse(status=404)
+    
+    size = request.GET.get('size', 'small')
+    if not renditions.rendition_ready(document.file, document.mime_type, size):
+        return HttpResponse(status=404)
+    return serve_file(
+        request,
+        renditions.rendition_file(document.file, size),
+        filename=f'{os.path.splitext(document.download_name)[0]}.jpg',
+        as_attachment=False,
+        content_type='image/jpeg',
+    )
+
 @login_required
 def delete_document_view(request, document_id):
     """Delete a document"""
@@ -821,40 +883,7 @@ def delete_document_view(request, document_id):
 @login_required
 def messages_view(request):
     """Display user's messages"""
-    messages = Message.objects.filter(
-        Q(sender=request.user) | Q(recipient=request.user)
-    ).order_by('-sent_at')
-    
-    # Group messages by conversation
-    conversations = {}
-    for message in messages:
-        # Determine the other party in the conversation
-        other_party = message.recipient if message.sender == request.user else message.sender
-        
-        # Create a unique key for this conversation
-        conversation_key = f"{min(request.user.id, other_party.id)}_{max(request.user.id, other_party.id)}"
-        
-        if conversation_key not in conversations:
-            conversations[conversation_key] = {
-                'other_party': other_party,
-                'latest_message': message,
-                'unread_count': 1 if message.recipient == request.user and not message.is_read else 0
-            }
-        else:
-            # Update latest message if this one is newer
-            if message.sent_at > conversations[conversation_key]['latest_message'].sent_at:
-                conversations[conversation_key]['latest_message'] = message
-            
-            # Update unread count
-            if message.recipient == request.user and not message.is_read:
-                conversations[conversation_key]['unread_count'] += 1
-    
-    # Convert dictionary to list and sort by latest message date
-    conversations_list = sorted(
-        conversations.values(),
-        key=lambda x: x['latest_message'].sent_at,
-        reverse=True
-    )
+    conversations_list = conversation_summaries(request.user)
     
     context = {
         'conversations': conversations_list,
@@ -973,6 +1002,7 @@ def notifications_view(request):
     # Mark all as read if requested
     if request.GET.get('mark_all_read'):
         notifications.filter(is_read=False).update(is_read=True)
+        notifications_changed(request.user.id)
     
     context = {
         'notifications': notifications,
@@ -1087,8 +1117,6 @@ def ajax_create_request(request):
                 type='other',
                 name=file.name,
                 file=file,
-                mime_type=file.content_type,
-                file_size=file.size // 1024  # Convert to KB
             )
             
         # Process files[] as list instead of individually
@@ -1100,19 +1128,16 @@ def ajax_create_request(request):
                 type='other',
                 name=file.name,
                 file=file,
-                mime_type=file.content_type,
-                file_size=file.size // 1024  # Convert to KB
             )
         
-        # Create a notification for admins
-        for admin_user in Utilisateur.objects.filter(account_type='admin', is_active=True):
-            Notification.objects.create(
-                user=admin_user,
-                type='request_update',
-                title=_('New Service Request'),
-                content=_(f'A new service request "{title}" has been created by {client.user.name} {client.user.first_name}.'),
-                related_service_request=demande
-            )
+        # Create a notification for admins (written in the background)
+        dispatch_notifications(
+            admin_audience(),
+            'request_update',
+            _('New Service Request'),
+            _(f'A new service request "{title}" has been created by {client.user.name} {client.user.first_name}.'),
+            related_service_request=demande
+        )
         
         return JsonResponse({
             'success': True,
@@ -1219,7 +1244,7 @@ def api_request_detail(request, request_id):
         
         # Get messages
         messages_data = []
-        for msg in Message.objects.filter(service_request=demande).order_by('sent_at'):
+        for msg in request_messages(demande):
             messages_data.append({
                 'id': msg.id,
                 'sender': {
@@ -1448,8 +1473,6 @@ def api_upload_document(request):
             type=document_type,
             name=name,
             file=file,
-            mime_type=file.content_type,
-            file_size=file.size // 1024,  # Convert to KB
             is_official=is_official,
             reference_number=reference_number
         )
@@ -1498,7 +1521,7 @@ def api_upload_document(request):
                 'id': document.id,
                 'name': document.name,
                 'type': document.type,
-                'file_url': document.file.url if document.file else None,
+                'file_url': reverse('custom_requests:download_document', args=[document.id]) if document.file else None,
                 'upload_date': document.upload_date.isoformat()
             }
         })
@@ -1514,105 +1537,87 @@ def api_upload_document(request):
 def api_messages(request):
     """API endpoint for user messages"""
     if request.method == 'GET':
-        # Get messages with a specific user if provided
+        # Keyset pagination: after_id (new messages), before_id (history), limit.
+        # New messages are pushed by the chat and notification sockets; after_id
+        # fetches what arrived while a socket was closed.
+        after_id = message_sync.parse_cursor(request.GET.get('after_id'))
+        before_id = message_sync.parse_cursor(request.GET.get('before_id'))
+        limit = message_sync.parse_limit(request.GET.get('limit'))
+        
+        other_user = None
         other_user_id = request.GET.get('user_id')
+        request_id = request.GET.get('request_id')
         if other_user_id:
             try:
                 other_user = Utilisateur.objects.get(id=other_user_id)
-                messages_query = Message.objects.filter(
-                    (Q(sender=request.user) & Q(recipient=other_user)) |
-                    (Q(sender=other_user) & Q(recipient=request.user))
-                ).order_by('sent_at')
-                
-                # Mark messages as read
-                Message.objects.filter(sender=other_user, recipient=request.user, is_read=False).update(
-                    is_read=True,
-                    read_at=timezone.now()
-                )
-                
-                # Prepare response data
-                messages_data = []
-                for message in messages_query:
-                    messages_data.append({
-                        'id': message.id,
-                        'sender': {
-                            'id': message.sender.id,
-                            'name': f"{message.sender.name} {message.sender.first_name}",
-                            'account_type': message.sender.account_type
-                        },
-                        'content': message.content,
-                        'sent_at': message.sent_at.isoformat(),
-                        'is_read': message.is_read,
-                        'is_mine': message.sender == request.user
-                    })
-                
-                return JsonResponse({
-                    'success': True,
-                    'messages': messages_data,
-                    'other_user': {
-                        'id': other_user.id,
-                        'name': f"{other_user.name} {other_user.first_name}",
-                        'account_type': other_user.account_type
-                    }
-                })
-                
-            except Utilisateur.DoesNotExist:
+            except (Utilisateur.DoesNotExist, ValueError):
                 return JsonResponse({
                     'success': False,
                     'message': _('User not found.')
                 }, status=404)
+            conversation = message_sync.pair_messages(request.user, other_user.id)
+            read_scope = {'sender_id': other_user.id}
+        elif request_id:
+            service_request = ServiceRequest.objects.filter(id=message_sync.parse_cursor(request_id)).first()
+            if service_request is None:
+                return JsonResponse({
+                    'success': False,
+                    'message': _('Request not found.')
+                }, status=404)
+            account_type = request.user.account_type.lower()
+            if not (account_type == 'admin' or
+                    (account_type == 'client' and service_request.client_id == request.user.id) or
+                    (account_type == 'expert' and service_request.expert_id == request.user.id)):
+                return JsonResponse({
+                    'success': False,
+                    'message': _('You do not have permission to view these messages.')
+                }, status=403)
+            conversation = message_sync.request_conversation(service_request)
+            read_scope = {'service_request_id': service_request.id}
+        else:
+            conversation = None
         
-        # Otherwise, return conversation summary
-        messages = Message.objects.filter(
-            Q(sender=request.user) | Q(recipient=request.user)
-        ).order_by('-sent_at')
-        
-        # Group messages by conversation
-        conversations = {}
-        for message in messages:
-            # Determine the other party in the conversation
-            other_party = message.recipient if message.sender == request.user else message.sender
-            
-            # Create a unique key for this conversation
-            conversation_key = f"{min(request.user.id, other_party.id)}_{max(request.user.id, other_party.id)}"
+        if conversation is not None:
+            page, has_more = message_sync.message_page(conversation, after_id, before_id, limit)
+            message_sync.mark_page_read(request.user, page, **read_scope)
             
-            if conversation_key not in conversations:
-                conversations[conversation_key] = {
-                    'user': {
-                        'id': other_party.id,
-                        'name': f"{other_party.name} {other_party.first_name}",
-                        'account_type': other_party.account_type
-                    },
-                    'latest_message': {
-                        'id': message.id,
-                        'content': message.content,
-                        'sent_at': message.sent_at.isoformat(),
-                        'is_read': message.is_read,
-                        'is_mine': message.sender == request.user
-                    },
-                    'unread_count': 1 if message.recipient == request.user and not message.is_read else 0
+            data = {
+                'success': True,
+                'messages': [message_sync.serialize_message(message, request.user) for message in page],
+                'has_more': has_more,
+                # Curseurs à renvoyer au prochain appel
+                'after_id': page[-1].id if page else after_id,
+                'before_id': page[0].id if page else before_id,
+            }
+            if other_user is not None:
+                data['other_user'] = {
+                    'id': other_user.id,
+                    'name': f"{other_user.name} {other_user.first_name}",
+                    'account_type': other_user.account_type
                 }
-            else:
-                # Update latest message if this one is newer
-                if message.sent_at > timezone.datetime.fromisoformat(conversations[conversation_key]['latest_message']['sent_at']):
-                    conversations[conversation_key]['latest_message'] = {
-                        'id': message.id,
-                        'content': message.content,
-                        'sent_at': message.sent_at.isoformat(),
-                        'is_read': message.is_read,
-                        'is_mine': message.sender == request.user
-                    }
-                
-                # Update unread count
-                if message.recipient == request.user and not message.is_read:
-                    conversations[conversation_key]['unread_count'] += 1
-        
-        # Convert dictionary to list and sort by latest message date
-        conversations_list = sorted(
-            conversations.values(),
-            key=lambda x: x['latest_message']['sent_at'],
-            reverse=True
-        )
+            # CacheControlMiddleware ajoute l'ETag : un appel sans nouveauté répond 304
+            return JsonResponse(data)
+        
+        # Otherwise, return conversation summary
+        conversations_list = []
+        for conversation in conversation_summaries(request.user):
+            other_party = conversation['other_party']
+            message = conversation['latest_message']
+            conversations_list.append({
+                'user': {
+                    'id': other_party.id,
+                    'name': f"{other_party.name} {other_party.first_name}",
+                    'account_type': other_party.account_type
+                },
+                'latest_message': {
+                    'id': message.id,
+                    'content': message.content,
+                    'sent_at': message.sent_at.isoformat(),
+                    'is_read': message.is_read,
+                    'is_mine': message.sender_id == request.user.id
+                },
+                'unread_count': conversation['unread_count']
+            })
         
         return JsonResponse({
             'success': True,
@@ -1682,8 +1687,11 @@ def api_messages(request):
 @login_required
 @csrf_exempt
 def api_notifications(request):
-    """API endpoint for user notifications"""
-    notifications_query = Notification.objects.filter(user=request.user).order_by('-created_at')
+    """API endpoint for user notifications (?archived=true: the archived ones, see retention.py)"""
+    if request.GET.get('archived') == 'true':
+        notifications_query = archived_notifications(request.user)
+    else:
+        notifications_query = Notification.objects.filter(user=request.user).order_by('-created_at')
     
     # Get only unread if specified
     unread_only = request.GET.get('unread_only') == 'true'
@@ -1709,9 +1717,9 @@ def api_notifications(request):
             'content': notification.content,
             'created_at': notification.created_at.isoformat(),
             'is_read': notification.is_read,
-            'related_service_request_id': notification.related_service_request.id if notification.related_service_request else None,
-            'related_rendez_vous_id': notification.related_rendez_vous.id if notification.related_rendez_vous else None,
-            'related_message_id': notification.related_message.id if notification.related_message else None
+            'related_service_request_id': notification.related_service_request_id,
+            'related_rendez_vous_id': notification.related_rendez_vous_id,
+            'related_message_id': notification.related_message_id
         })
     
     return JsonResponse({
@@ -1719,3 +1727,146 @@ def api_notifications(request):
         'notifications': notifications_data,
         'unread_count': Notification.objects.filter(user=request.user, is_read=False).count()
     })
+
+def _slot_range(request):
+    """(from, to) dates of a free-slot query, today and the next 13 days by default"""
+    from datetime import datetime, timedelta
+    today = timezone.localdate()
+    start = datetime.strptime(request.GET['from'], '%Y-%m-%d').date() if request.GET.get('from') else today
+    end = datetime.strptime(request.GET['to'], '%Y-%m-%d').date() if request.GET.get('to') else start + timedelta(days=13)
+    if end < start:
+        raise ValueError('to before from')
+    # Période bornée : le calcul reste linéaire en nombre de jours
+    return max(start, today), min(end, start + timedelta(days=getattr(settings, 'SCHEDULING_MAX_DAYS', 92) - 1))
+
+@login_required
+def api_free_slots(request):
+    """Bookable appointment starts of one expert (?expert_id=) or of the experts of a specialty (?specialty=)"""
+    try:
+        start, end = _slot_range(request)
+        duration = int(request.GET.get('duration', 60))
+        if duration <= 0:
+            raise ValueError('duration')
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'message': _('Invalid date range or duration.')
+        }, status=400)
+    
+    if request.GET.get('expert_id'):
+        try:
+            expert_id = int(request.GET['expert_id'])
+        except ValueError:
+            return JsonResponse({
+                'success': False,
+                'message': _('Invalid expert.')
+            }, status=400)
+        expert_ids = list(Expert.objects.filter(
+            user_id=expert_id, user__is_active=True
+        ).values_list('user_id', flat=True))
+    elif request.GET.get('specialty'):
+        expert_ids = specialty_experts(request.GET['specialty'])
+    else:
+        return JsonResponse({
+            'success': False,
+            'message': _('An expert or a specialty is required.')
+        }, status=400)
+    
+    slots = free_slots(expert_ids, start, end, duration=duration)
+    names = dict(
+        (user_id, f"{first_name} {name}")
+        for user_id, first_name, name in Utilisateur.objects.filter(pk__in=expert_ids).values_list('pk', 'first_name', 'name')
+    )
+    
+    return JsonResponse({
+        'success': True,
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        'duration': duration,
+        'experts': [
+            {
+                'expert_id': expert_id,
+                'name': names.get(expert_id, ''),
+                'slots': [timezone.localtime(slot).isoformat() for slot in slots[expert_id]],
+            }
+            for expert_id in expert_ids
+        ]
+    })
+
+@login_required
+def api_expert_availability(request):
+    """
+    Weekly hours and exceptions of the logged-in expert. POST a JSON body with
+    "weekly" (replaces all the weekly windows) and/or "exceptions" (replace
+    the exceptions of the dates they name).
+    """
+    if request.user.account_type.lower() != 'expert':
+        return JsonResponse({
+            'success': False,
+            'message': _('Only experts have opening hours.')
+        }, status=403)
+    
+    if request.method == 'POST':
+        from datetime import datetime
+        try:
+            data = json.loads(request.body)
+            weekly = [
+                ExpertAvailability(
+                    expert=request.user,
+                    weekday=int(window['weekday']),
+                    start_time=datetime.strptime(window['start'], '%H:%M').time(),
+                    end_time=datetime.strptime(window['end'], '%H:%M').time(),
+                )
+                for window in data.get('weekly', ())
+            ]
+            exceptions = [
+                AvailabilityException(
+                    expert=request.user,
+                    date=datetime.strptime(exception['date'], '%Y-%m-%d').date(),
+                    start_time=datetime.strptime(exception['start'], '%H:%M').time() if exception.get('start') else None,
+                    end_time=datetime.strptime(exception['end'], '%H:%M').time() if exception.get('end') else None,
+                    is_available=bool(exception.get('is_available', False)),
+                    reason=str(exception.get('reason', ''))[:255],
+                )
+                for exception in data.get('exceptions', ())
+            ]
+            if any(not 0 <= window.weekday <= 6 or window.end_time <= window.start_time for window in weekly):
+                raise ValueError('window')
+            if any((exception.start_time is None) != (exception.end_time is None)
+                   or (exception.start_time and exception.end_time <= exception.start_time)
+                   or (exception.is_available and exception.start_time is None)
+                   for exception in exceptions):
+                raise ValueError('exception')
+        except (ValueError, KeyError, TypeError, AttributeError):
+            return JsonResponse({
+                'success': False,
+                'message': _('Invalid opening hours.')
+            }, status=400)
+        
+        with transaction.atomic():
+            if 'weekly' in data:
+                ExpertAvailability.objects.filter(expert=request.user).delete()
+                ExpertAvailability.objects.bulk_create(weekly)
+            if exceptions:
+                AvailabilityException.objects.filter(
+                    expert=request.user, date__in={exception.date for exception in exceptions}
+                ).delete()
+                AvailabilityException.objects.bulk_create(exceptions)
+    
+    return JsonResponse({
+        'success': True,
+        'weekly': [
+            {'weekday': window.weekday, 'start': window.start_time.strftime('%H:%M'), 'end': window.end_time.strftime('%H:%M')}
+            for window in ExpertAvailability.objects.filter(expert=request.user)
+        ],
+        'exceptions': [
+            {
+                'date': exception.date.isoformat(),
+                'start': exception.start_time.strftime('%H:%M') if exception.start_time else None,
+                'end': exception.end_time.strftime('%H:%M') if exception.end_time else None,
+                'is_available': exception.is_available,
+                'reason': exception.reason,
+            }
+            for exception in AvailabilityException.objects.filter(expert=request.user, date__gte=timezone.localdate())
+        ]
+    })
@@ -1,22 +1,53 @@
 import json
+import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.contrib.auth import get_user_model
-from custom_requests.models import CustomRequest, Message
+from custom_requests.models import Message, Notification, ServiceRequest
+from custom_requests.notifications import get_notification_summary
+
+from .events import chat_group_name, notification_event_data, user_group_name
+from .writebehind import get_message_queue
+
+logger = logging.getLogger(__name__)
 
-User = get_user_model()
 
 class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    Consumer pour la messagerie en temps réel entre client et expert.
+
+    La demande, ses participants et l'indicateur « l'expert a déjà écrit »
+    sont chargés une seule fois à la connexion puis gardés pour toute la
+    durée du socket. Les changements d'expert arrivent par l'événement de
+    groupe chat.permissions (voir messaging.events), de sorte qu'un message
+    entrant ne coûte que ses INSERT, eux-mêmes regroupés par lots dans la file
+    d'écriture différée (voir messaging.writebehind).
+    """
+
     async def connect(self):
-        self.request_id = self.scope['url_route']['kwargs']['request_id']
-        self.room_group_name = f'chat_{self.request_id}'
+        self.user = self.scope["user"]
+
+        if not self.user.is_authenticated:
+            # Rejeter la connexion si l'utilisateur n'est pas authentifié
+            await self.close()
+            return
+
+        self.request_id = int(self.scope['url_route']['kwargs']['request_id'])
+        self.room_group_name = chat_group_name(self.request_id)
+        self.account_type = self.user.account_type.lower()
+        self.sender_name = f"{self.user.first_name} {self.user.name}"
+
+        participants = await self.load_participants()
+        if participants is None:
+            await self.close()
+            return
+        self.client_id, self.expert_id, self.expert_has_spoken = participants
 
-        # Vérifier si l'utilisateur est autorisé à accéder à cette demande
-        if not await self.is_user_authorized():
+        if not self.can_access_chat():
+            # Rejeter la connexion si l'utilisateur n'a pas les permissions
             await self.close()
             return
 
-        # Rejoindre la room group
+        # Rejoindre le groupe de chat
         await self.channel_layer.group_add(
             self.room_group_name,
             self.channel_name
@@ -25,65 +56,248 @@ class ChatConsumer(AsyncWebsocketConsumer):
         await self.accept()
 
     async def disconnect(self, close_code):
-        # Quitter la room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        # Ne rien laisser dans la file d'écriture différée
+        await get_message_queue().flush()
+
+        # Quitter le groupe de chat
+        if hasattr(self, 'room_group_name'):
+            await self.channel_layer.group_discard(
+                self.room_group_name,
+                self.channel_name
+            )
 
     async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
+        try:
+            text_data_json = json.loads(text_data)
+        except ValueError:
+            return
+
+        # Gérer les indicateurs de frappe
+        if 'typing' in text_data_json:
+            await self.channel_layer.group_send(
+                self.room_group_name,
+                {
+                    'type': 'typing_status',
+                    'user_id': self.user.id,
+                    'user_name': self.sender_name,
+                    'is_typing': text_data_json['typing']
+                }
+            )
+            return
+
+        if 'message' not in text_data_json:
+            return
+
         message = text_data_json['message']
 
-        # Sauvegarder le message en base de données
-        saved_message = await self.save_message(message)
+        # Un client ne peut pas initier la conversation
+        if self.account_type == 'client' and not self.expert_has_spoken:
+            # L'expert a pu écrire depuis une vue HTTP: vérifier une seule fois en base
+            self.expert_has_spoken = await self.fetch_expert_has_spoken()
+            if not self.expert_has_spoken:
+                await self.send(text_data=json.dumps({
+                    'error': 'Vous ne pouvez pas initier une conversation avec un expert. '
+                             'Veuillez attendre que l\'expert vous contacte.'
+                }))
+                return
+
+        recipient_id = self.expert_id if self.account_type == 'client' else self.client_id
+        if not recipient_id:
+            await self.send(text_data=json.dumps({
+                'error': 'Aucun expert n\'est encore assigné à cette demande.'
+            }))
+            return
+
+        try:
+            saved = await get_message_queue().submit(
+                sender_id=self.user.id,
+                recipient_id=recipient_id,
+                service_request_id=self.request_id,
+                content=message,
+                sender_name=self.sender_name,
+            )
+        except Exception:
+            logger.exception("Erreur lors de l'enregistrement du message de la demande %s", self.request_id)
+            await self.send(text_data=json.dumps({
+                'error': 'Une erreur est survenue lors de l\'envoi du message. Veuillez réessayer.'
+            }))
+            return
 
-        # Envoyer le message à la room group
         await self.channel_layer.group_send(
             self.room_group_name,
             {
                 'type': 'chat_message',
                 'message': message,
-                'user_id': self.scope['user'].id,
-                'username': self.scope['user'].username or self.scope['user'].email,
-                'timestamp': saved_message.timestamp.isoformat() if saved_message else None
+                'sender_id': self.user.id,
+                'sender_name': self.sender_name,
+                'sender_type': self.user.account_type,
+                'timestamp': saved.sent_at.isoformat(),
+                # Accusé de réception : l'expéditeur reçoit l'identifiant enregistré
+                'message_id': saved.id,
+                'client_msg_id': text_data_json.get('client_msg_id'),
             }
         )
 
     async def chat_message(self, event):
-        # Envoyer le message au websocket
+        # Le premier message de l'expert débloque le client sans requête
+        if event['sender_id'] == self.expert_id:
+            self.expert_has_spoken = True
+
         await self.send(text_data=json.dumps({
             'message': event['message'],
-            'user_id': event['user_id'],
-            'username': event['username'],
-            'timestamp': event['timestamp']
+            'sender_id': event['sender_id'],
+            'sender_name': event['sender_name'],
+            'sender_type': event['sender_type'],
+            'timestamp': event['timestamp'],
+            'message_id': event.get('message_id'),
+            'client_msg_id': event.get('client_msg_id'),
         }))
 
+    async def typing_status(self, event):
+        await self.send(text_data=json.dumps({
+            'typing': {
+                'user_id': event['user_id'],
+                'user_name': event['user_name'],
+                'is_typing': event['is_typing']
+            }
+        }))
+
+    async def chat_read(self, event):
+        # Accusé de lecture : inutile de le renvoyer à celui qui a lu
+        if event['reader_id'] == self.user.id:
+            return
+
+        await self.send(text_data=json.dumps({
+            'read': {
+                'user_id': event['reader_id'],
+                'up_to_id': event['up_to_id'],
+            }
+        }))
+
+    async def chat_permissions(self, event):
+        """Mettre à jour les participants en cache après une (ré)affectation"""
+        self.client_id = event['client_id']
+        self.expert_id = event['expert_id']
+        self.expert_has_spoken = event['expert_has_spoken']
+
+        if not self.can_access_chat():
+            await self.close()
+
+    def can_access_chat(self):
+        """Vérifier, à partir des participants en cache, l'accès à la conversation"""
+        if self.account_type == 'admin':
+            return True
+        if self.account_type == 'client':
+            return self.user.id == self.client_id
+        if self.account_type == 'expert':
+            return self.user.id == self.expert_id
+        return False
+
     @database_sync_to_async
-    def is_user_authorized(self):
-        """Vérifie si l'utilisateur est autorisé à accéder à cette conversation"""
-        user = self.scope['user']
-        if not user.is_authenticated:
-            return False
+    def load_participants(self):
+        """Charger en une requête le client, l'expert et l'indicateur de premier message"""
+        row = (
+            ServiceRequest.objects
+            .filter(id=self.request_id)
+            .values_list('client_id', 'expert_id')
+            .first()
+        )
+        if row is None:
+            return None
 
-        try:
-            request = CustomRequest.objects.get(pk=self.request_id)
-            # Vérifier si l'utilisateur est le client ou l'expert associé à cette demande
-            return user == request.client or user == request.expert or user.is_staff
-        except CustomRequest.DoesNotExist:
+        client_id, expert_id = row
+        expert_has_spoken = bool(expert_id) and Message.objects.filter(
+            service_request_id=self.request_id,
+            sender_id=expert_id,
+            recipient_id=client_id,
+        ).exists()
+        return client_id, expert_id, expert_has_spoken
+
+    @database_sync_to_async
+    def fetch_expert_has_spoken(self):
+        if not self.expert_id:
             return False
+        return Message.objects.filter(
+            service_request_id=self.request_id,
+            sender_id=self.expert_id,
+            recipient_id=self.client_id,
+        ).exists()
+
+
+class NotificationConsumer(AsyncWebsocketConsumer):
+    """
+    Notifications en temps réel d'un utilisateur (remplace le polling).
+
+    Le socket rejoint le groupe personnel user_<id>. À la connexion il reçoit
+    le nombre de notifications non lues et les dernières notifications ; ensuite
+    seuls les changements arrivent, poussés après le commit par
+    messaging.events :
+      - notification.created : la nouvelle notification et le compteur incrémenté,
+        sans requête ;
+      - notification.changed (notifications lues ou supprimées) : le compteur,
+        recompté en une requête.
+    Les accusés de lecture des conversations privées (chat.read) passent par
+    le même groupe.
+    """
+
+    async def connect(self):
+        self.user = self.scope["user"]
+
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.group_name = user_group_name(self.user.id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+        self.unread_count, latest = await self.load_summary()
+        await self.send(text_data=json.dumps({
+            'type': 'notifications.summary',
+            'unread_count': self.unread_count,
+            'notifications': latest,
+        }))
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive(self, text_data):
+        # Le client ne fait que recevoir ; ses messages (ping de maintien) sont ignorés
+        pass
+
+    async def notification_created(self, event):
+        notification = event['notification']
+        if not notification['is_read']:
+            self.unread_count += 1
+
+        await self.send(text_data=json.dumps({
+            'type': 'notification.created',
+            'unread_count': self.unread_count,
+            'notification': notification,
+        }))
+
+    async def notification_changed(self, event):
+        self.unread_count = await self.count_unread()
+        await self.send(text_data=json.dumps({
+            'type': 'notifications.changed',
+            'unread_count': self.unread_count,
+        }))
+
+    async def chat_read(self, event):
+        await self.send(text_data=json.dumps({
+            'type': 'chat.read',
+            'read': {
+                'user_id': event['reader_id'],
+                'up_to_id': event['up_to_id'],
+            }
+        }))
 
     @database_sync_to_async
-    def save_message(self, message_text):
-        """Enregistre le message dans la base de données"""
-        user = self.scope['user']
-        try:
-            request = CustomRequest.objects.get(pk=self.request_id)
-            message = Message.objects.create(
-                request=request,
-                sender=user,
-                content=message_text
-            )
-            return message
-        except CustomRequest.DoesNotExist:
-            return None
+    def load_summary(self):
+        summary = get_notification_summary(self.user.id)
+        return summary['unread_count'], [notification_event_data(n) for n in summary['latest']]
+
+    @database_sync_to_async
+    def count_unread(self):
+        return Notification.objects.filter(user_id=self.user.id, is_read=False).count()
@@ -0,0 +1,134 @@
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+
+from custom_requests.models import Message
+
+
+def chat_group_name(request_id):
+    return f'chat_{request_id}'
+
+
+def chat_permissions_event(service_request):
+    """Build the event telling open chat sockets who may talk on a request"""
+    expert_id = service_request.expert_id
+    expert_has_spoken = bool(expert_id) and Message.objects.filter(
+        service_request=service_request,
+        sender_id=expert_id,
+        recipient_id=service_request.client_id,
+    ).exists()
+
+    return {
+        'type': 'chat.permissions',
+        'client_id': service_request.client_id,
+        'expert_id': expert_id,
+        'expert_has_spoken': expert_has_spoken,
+    }
+
+
+def broadcast_chat_permissions(service_request):
+    """
+    Push the current participants of a request to its chat group.
+
+    ChatConsumer caches the participants at connect, so every view that
+    changes the expert of a request must call this. The event is sent once
+    the transaction commits so consumers never see uncommitted state; an
+    unavailable channel layer only costs the push (robust=True).
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    def send():
+        async_to_sync(channel_layer.group_send)(
+            chat_group_name(service_request.id),
+            chat_permissions_event(service_request),
+        )
+
+    transaction.on_commit(send, robust=True)
+
+
+def user_group_name(user_id):
+    return f'user_{user_id}'
+
+
+def broadcast_read_receipt(reader_id, up_to_id, service_request_id=None, other_user_id=None):
+    """
+    Tell the other participant that reader_id has read everything up to up_to_id.
+
+    Service request chats get the event on their chat group; private
+    conversations on the personal group of the other user. A failed push
+    never fails the request marking the messages read (robust=True).
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    if service_request_id is not None:
+        group = chat_group_name(service_request_id)
+    else:
+        group = user_group_name(other_user_id)
+
+    event = {
+        'type': 'chat.read',
+        'reader_id': reader_id,
+        'up_to_id': up_to_id,
+        'service_request_id': service_request_id,
+    }
+    transaction.on_commit(lambda: async_to_sync(channel_layer.group_send)(group, event), robust=True)
+
+
+def notification_event_data(notification):
+    """JSON form of a notification pushed to NotificationConsumer"""
+    return {
+        'id': notification.id,
+        'type': notification.type,
+        'title': notification.title,
+        'content': notification.content,
+        'created_at': notification.created_at.isoformat() if notification.created_at else None,
+        'is_read': notification.is_read,
+        'related_service_request_id': notification.related_service_request_id,
+        'related_rendez_vous_id': notification.related_rendez_vous_id,
+        'related_message_id': notification.related_message_id,
+    }
+
+
+def broadcast_new_notifications(notifications):
+    """
+    Push new notifications to the personal groups of their users.
+
+    Sent once the transaction commits; an unavailable channel layer only
+    costs the push (robust=True), never the request that created them.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    events = [
+        (user_group_name(notification.user_id), {
+            'type': 'notification.created',
+            'notification': notification_event_data(notification),
+        })
+        for notification in notifications
+    ]
+
+    def send():
+        group_send = async_to_sync(channel_layer.group_send)
+        for group, event in events:
+            group_send(group, event)
+
+    transaction.on_commit(send, robust=True)
+
+
+def broadcast_notifications_changed(*user_ids):
+    """Tell the sockets of these users to refresh their unread count (notifications read or deleted)"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    def send():
+        group_send = async_to_sync(channel_layer.group_send)
+        for user_id in set(user_ids):
+            group_send(user_group_name(user_id), {'type': 'notification.changed'})
+
+    transaction.on_commit(send, robust=True)
@@ -0,0 +1,176 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+
+class FileChannelLayer(BaseChannelLayer):
+    """
+    Channel layer storing messages and group memberships in a shared directory.
+
+    It is a local stand-in for channels_redis: every process pointing at the
+    same directory (several Daphne workers, tests, the fan-out benchmark) sees
+    the same channels and groups, without running a Redis server. Each message
+    is one JSON file written atomically (write then rename) and claimed by the
+    receiver with a rename, so two processes never consume the same message.
+    Not meant for production traffic.
+    """
+
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None,
+                 poll_interval=0.01):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity)
+        self.path = str(path)
+        self.group_expiry = group_expiry
+        self.poll_interval = poll_interval
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        os.makedirs(self._channels_dir, exist_ok=True)
+        os.makedirs(self._groups_dir, exist_ok=True)
+
+    @property
+    def _channels_dir(self):
+        return os.path.join(self.path, 'channels')
+
+    @property
+    def _groups_dir(self):
+        return os.path.join(self.path, 'groups')
+
+    def _channel_dir(self, channel):
+        return os.path.join(self._channels_dir, channel)
+
+    def _group_dir(self, group):
+        return os.path.join(self._groups_dir, group)
+
+    # Channel layer API
+
+    async def send(self, channel, message):
+        assert isinstance(message, dict), 'message is not a dict'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        assert '__asgi_channel__' not in message
+
+        directory = self._channel_dir(channel)
+        os.makedirs(directory, exist_ok=True)
+        if len(self._pending(directory)) >= self.get_capacity(channel):
+            raise ChannelFull(channel)
+
+        # Le nom commence par l'horodatage pour conserver l'ordre et gérer l'expiration
+        name = f'{time.time_ns():020d}-{uuid.uuid4().hex}.msg'
+        tmp_path = os.path.join(directory, f'.{name}.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            json.dump(message, handle)
+        os.replace(tmp_path, os.path.join(directory, name))
+
+    async def receive(self, channel):
+        assert self.valid_channel_name(channel)
+        directory = self._channel_dir(channel)
+        os.makedirs(directory, exist_ok=True)
+
+        while True:
+            message = self._claim_next(directory)
+            if message is not None:
+                return message
+            await asyncio.sleep(self.poll_interval)
+
+    async def new_channel(self, prefix='specific'):
+        return f'{prefix}.file!{uuid.uuid4().hex}'
+
+    async def flush(self):
+        for root in (self._channels_dir, self._groups_dir):
+            for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+                for filename in filenames:
+                    self._unlink(os.path.join(dirpath, filename))
+                if dirpath != root:
+                    try:
+                        os.rmdir(dirpath)
+                    except OSError:
+                        pass
+
+    async def close(self):
+        pass
+
+    # Groups extension
+
+    async def group_add(self, group, channel):
+        assert self.valid_group_name(group), 'Group name not valid'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        directory = self._group_dir(group)
+        os.makedirs(directory, exist_ok=True)
+        # La date de modification du fichier sert de date d'adhésion
+        with open(os.path.join(directory, channel), 'w'):
+            pass
+
+    async def group_discard(self, group, channel):
+        assert self.valid_group_name(group), 'Group name not valid'
+        assert self.valid_channel_name(channel), 'Channel name not valid'
+        self._unlink(os.path.join(self._group_dir(group), channel))
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), 'Message is not a dict'
+        assert self.valid_group_name(group), 'Group name not valid'
+        for channel in self._group_channels(group):
+            try:
+                await self.send(channel, message)
+            except ChannelFull:
+                pass
+
+    # Helpers
+
+    def _pending(self, directory):
+        try:
+            return sorted(name for name in os.listdir(directory) if name.endswith('.msg'))
+        except FileNotFoundError:
+            return []
+
+    def _claim_next(self, directory):
+        """Atomically take the oldest unexpired message of a channel directory"""
+        now_ns = time.time_ns()
+        for name in self._pending(directory):
+            path = os.path.join(directory, name)
+            claimed = f'{path}.{os.getpid()}.claimed'
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                # Déjà pris par un autre processus
+                continue
+
+            try:
+                sent_ns = int(name.split('-', 1)[0])
+                if now_ns - sent_ns > self.expiry * 1_000_000_000:
+                    continue
+                with open(claimed, encoding='utf-8') as handle:
+                    return json.load(handle)
+            finally:
+                self._unlink(claimed)
+        return None
+
+    def _group_channels(self, group):
+        directory = self._group_dir(group)
+        try:
+            names = os.listdir(directory)
+        except FileNotFoundError:
+            return []
+
+        channels = []
+        oldest = time.time() - self.group_expiry
+        for name in names:
+            path = os.path.join(directory, name)
+            try:
+                if os.path.getmtime(path) < oldest:
+                    self._unlink(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            channels.append(name)
+        return channels
+
+    @staticmethod
+    def _unlink(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
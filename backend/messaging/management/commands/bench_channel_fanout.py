@@ -0,0 +1,107 @@
+import asyncio
+import multiprocessing
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+BENCH_GROUP = 'bench_fanout'
+
+
+def _worker(alias, messages, timeout, ready, results):
+    """Join the benchmark group and report the delivery latency of each message"""
+    import django
+    django.setup()
+    from channels.layers import get_channel_layer
+
+    async def run():
+        layer = get_channel_layer(alias)
+        channel = await layer.new_channel()
+        await layer.group_add(BENCH_GROUP, channel)
+        ready.put(channel)
+
+        latencies = []
+        deadline = time.monotonic() + timeout
+        while len(latencies) < messages:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                message = await asyncio.wait_for(layer.receive(channel), remaining)
+            except asyncio.TimeoutError:
+                break
+            latencies.append(time.time() - message['sent_at'])
+
+        await layer.group_discard(BENCH_GROUP, channel)
+        return latencies
+
+    results.put(asyncio.run(run()))
+
+
+class Command(BaseCommand):
+    help = 'Measure group_send fan-out latency across several worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of receiving processes')
+        parser.add_argument('--messages', type=int, default=200, help='Messages sent to the group')
+        parser.add_argument('--layer', default='default', help='Alias in settings.CHANNEL_LAYERS')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Seconds a worker waits for messages')
+
+    def handle(self, *args, **options):
+        from channels.layers import get_channel_layer
+
+        alias = options['layer']
+        workers = options['workers']
+        count = options['messages']
+        layer = get_channel_layer(alias)
+        if layer is None:
+            raise CommandError(f"No channel layer configured for alias '{alias}'")
+
+        self.stdout.write(f"Layer: {layer.__class__.__module__}.{layer.__class__.__name__}")
+        self.stdout.write(f"{workers} workers, {count} messages")
+
+        context = multiprocessing.get_context('spawn')
+        ready = context.Queue()
+        results = context.Queue()
+        processes = [
+            context.Process(target=_worker, args=(alias, count, options['timeout'], ready, results))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        for _ in processes:
+            ready.get(timeout=60)
+
+        async def send_all():
+            started = time.monotonic()
+            for index in range(count):
+                await layer.group_send(BENCH_GROUP, {
+                    'type': 'bench.message',
+                    'index': index,
+                    'sent_at': time.time(),
+                })
+            return time.monotonic() - started
+
+        send_duration = asyncio.run(send_all())
+
+        latencies = []
+        for _ in processes:
+            latencies.extend(results.get())
+        for process in processes:
+            process.join()
+
+        expected = count * workers
+        self.stdout.write(f"Sent {count} group messages in {send_duration * 1000:.1f} ms")
+        self.stdout.write(f"Delivered {len(latencies)}/{expected}")
+        if not latencies:
+            self.stdout.write(self.style.ERROR(
+                "Nothing reached the workers: this layer does not fan out across processes"
+            ))
+            return
+
+        latencies_ms = sorted(latency * 1000 for latency in latencies)
+        p95 = latencies_ms[max(0, int(len(latencies_ms) * 0.95) - 1)]
+        self.stdout.write(
+            f"Latency ms: p50={statistics.median(latencies_ms):.2f} "
+            f"p95={p95:.2f} max={latencies_ms[-1]:.2f}"
+        )
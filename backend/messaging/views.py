@@ -1,7 +1,9 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from custom_requests.models import ServiceRequest, Message
+from custom_requests.models import ArchivedMessage, ServiceRequest, Message
+from custom_requests.read_receipts import mark_read_up_to
+from custom_requests.retention import request_messages
 
 # Create your views here.
 
@@ -19,12 +21,16 @@ def chat_view(request, request_id):
             messages.error(request, "Vous n'avez pas accès à cette conversation.")
             return redirect('client_dashboard')
         
-        # Vérifier si l'expert a déjà envoyé un message
-        has_expert_message = Message.objects.filter(
-            sender=service_request.expert,
-            recipient=request.user,
-            service_request=service_request
-        ).exists()
+        # Vérifier si l'expert a déjà envoyé un message (archivé compris)
+        expert_messages = {
+            'sender': service_request.expert,
+            'recipient': request.user,
+            'service_request': service_request,
+        }
+        has_expert_message = (
+            Message.objects.filter(**expert_messages).exists()
+            or ArchivedMessage.objects.filter(**expert_messages).exists()
+        )
         
         if not has_expert_message:
             messages.warning(request, "L'expert n'a pas encore initié la conversation. Veuillez patienter.")
@@ -45,20 +51,20 @@ def chat_view(request, request_id):
         messages.error(request, "Vous n'avez pas les autorisations nécessaires pour accéder à cette page.")
         return redirect('home')
     
-    # Récupérer les messages de cette conversation
-    chat_messages = Message.objects.filter(
-        service_request=service_request
-    ).order_by('sent_at')
+    # Récupérer les messages de cette conversation, archivés compris
+    chat_messages = list(request_messages(service_request))
     
-    # Marquer les messages non lus comme lus
-    unread_messages = chat_messages.filter(recipient=request.user, is_read=False)
-    for msg in unread_messages:
-        msg.is_read = True
-        msg.save()
+    # Dernier message affiché : la page reprend à partir de lui (api/messages/?after_id=…)
+    last_message_id = chat_messages[-1].id if chat_messages else 0
+    
+    # Marquer comme lus les messages affichés (une seule requête UPDATE)
+    if chat_messages:
+        mark_read_up_to(request.user, up_to_id=last_message_id, service_request_id=service_request.id)
     
     context = {
         'service_request': service_request,
         'chat_messages': chat_messages,
+        'last_message_id': last_message_id,
         'user_type': request.user.account_type.lower(),
         'request_id': request_id
     }
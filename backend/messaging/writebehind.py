@@ -0,0 +1,144 @@
+import asyncio
+import atexit
+import weakref
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+
+from custom_requests.models import Message, Notification
+from custom_requests.notifications import invalidate_notification_summary
+from custom_requests.search import index_objects
+from custom_requests.stats import record_daily_event
+from .events import broadcast_new_notifications
+
+
+def persist_messages(entries):
+    """
+    Insert a batch of chat messages and their recipient notifications.
+
+    Each entry is a dict with sender_id, recipient_id, service_request_id,
+    content and sender_name. Returns the saved Message objects, in order.
+    bulk_create skips post_save, so the notification summaries of the
+    recipients, the daily message rollup and the search index are updated here.
+    """
+    messages = [
+        Message(
+            sender_id=entry['sender_id'],
+            recipient_id=entry['recipient_id'],
+            service_request_id=entry['service_request_id'],
+            content=entry['content'],
+        )
+        for entry in entries
+    ]
+
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            Message.objects.bulk_create(messages)
+            # bulk_create ne déclenche pas post_save : compter le lot dans le cumul du jour
+            # et l'indexer pour la recherche
+            record_daily_event('new_messages', amount=len(messages))
+            index_objects('message', Message.objects.filter(
+                pk__in=[message.pk for message in messages]
+            ).select_related('sender', 'recipient', 'service_request'))
+        else:
+            # MySQL ne renvoie pas les clés d'un INSERT multiple : une requête par
+            # message, mais toujours une seule transaction pour tout le lot
+            for message in messages:
+                message.save(force_insert=True)
+
+        notifications = Notification.objects.bulk_create([
+            Notification(
+                user_id=entry['recipient_id'],
+                type='message',
+                title='Nouveau message',
+                content=f"Vous avez reçu un nouveau message de {entry['sender_name']}",
+                related_message_id=message.id,
+                related_service_request_id=entry['service_request_id'],
+            )
+            for entry, message in zip(entries, messages)
+        ])
+
+    invalidate_notification_summary(*{entry['recipient_id'] for entry in entries})
+    broadcast_new_notifications(notifications)
+    return messages
+
+
+class MessageWriteBehind:
+    """
+    Per-event-loop queue coalescing chat messages into batched INSERTs.
+
+    submit() returns once the message is committed, with the saved Message,
+    so callers can ack its id. Batches are flushed when batch_size messages
+    are waiting or interval seconds after the first one, whichever comes
+    first; a burst in a busy room therefore costs one trip to the database
+    thread instead of one per message.
+    """
+
+    def __init__(self, batch_size, interval):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._pending = []
+        self._timer = None
+
+    async def submit(self, **entry):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((entry, future))
+
+        if len(self._pending) >= self.batch_size:
+            loop.create_task(self.flush())
+        elif self._timer is None:
+            self._timer = loop.call_later(self.interval, lambda: loop.create_task(self.flush()))
+
+        return await future
+
+    async def flush(self):
+        """Persist everything queued so far"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        try:
+            messages = await database_sync_to_async(persist_messages)([entry for entry, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, future), message in zip(batch, messages):
+            if not future.done():
+                future.set_result(message)
+
+    def flush_sync(self):
+        """Persist leftovers when no event loop is running any more (process exit)"""
+        batch, self._pending = self._pending, []
+        if batch:
+            persist_messages([entry for entry, _ in batch])
+
+
+_queues = weakref.WeakKeyDictionary()
+
+
+def get_message_queue():
+    """Return the write-behind queue of the running event loop"""
+    loop = asyncio.get_running_loop()
+    queue = _queues.get(loop)
+    if queue is None:
+        queue = MessageWriteBehind(
+            batch_size=getattr(settings, 'CHAT_WRITE_BEHIND_BATCH_SIZE', 100),
+            interval=getattr(settings, 'CHAT_WRITE_BEHIND_INTERVAL', 0.05),
+        )
+        _queues[loop] = queue
+    return queue
+
+
+@atexit.register
+def _flush_on_exit():
+    for queue in list(_queues.values()):
+        queue.flush_sync()
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ResourcesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'resources'
+
+    def ready(self):
+        # Register signal handlers
+        from . import signals  # noqa: F401
@@ -1,11 +1,12 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import FileResponse
-from django.db.models import F
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
 
+from servicesbladi.delivery import is_first_request
+from . import counters
 from .models import Resource, ResourceFile, ResourceLink
+from .views import serve_resource_file
 from accounts.models import Client
 
 
@@ -37,19 +38,15 @@ def client_resources_view(request):
 @login_required
 def client_download_resource_view(request, resource_file_id):
     """Download a resource file for a client"""
-    resource_file = get_object_or_404(ResourceFile, id=resource_file_id)
+    resource_file = get_object_or_404(ResourceFile.objects.select_related('resource'), id=resource_file_id)
     
     # Check if resource is active
     if not resource_file.resource.is_active:
         messages.error(request, _('This resource is not available.'))
         return redirect('resources:client_resources')
     
-    # Increment download count
-    Resource.objects.filter(id=resource_file.resource.id).update(download_count=F('download_count') + 1)
+    # Increment download count (not for the resumption of a download)
+    if is_first_request(request):
+        counters.count_download(resource_file.resource_id)
     
-    # Return the file as a response
-    return FileResponse(
-        resource_file.file, 
-        as_attachment=True, 
-        filename=resource_file.file.name.split('/')[-1]
-    )
+    return serve_resource_file(request, resource_file)
@@ -0,0 +1,199 @@
+"""
+Buffered view and download counters of the resources.
+
+Counting a hit with an UPDATE of the Resource row makes a popular guide a
+hot row during traffic spikes. Hits are instead counted with count_view()
+and count_download(), accumulated, then flushed in batches: one UPDATE of
+Resource per resource and one upsert of its ResourceDailyStat per day,
+whatever the number of hits in between. ResourceDailyStat feeds the
+popularity ranking (popular_resources).
+
+RESOURCE_COUNTER_BUFFER selects where hits accumulate:
+
+- 'memory' (default): in the process (servicesbladi.buffers.CounterBuffer),
+  flushed every RESOURCE_COUNTER_FLUSH_INTERVAL seconds by a thread, at
+  once when it holds RESOURCE_COUNTER_FLUSH_SIZE hits, and on a normal
+  exit. A crashed (killed) process loses at most its hits of the last
+  RESOURCE_COUNTER_FLUSH_INTERVAL seconds.
+- 'cache': in the shared cache (atomic incr: meant for Redis), flushed by
+  one process at a time every RESOURCE_COUNTER_FLUSH_INTERVAL seconds (by
+  the same thread) and by `manage.py flush_resource_counters`. Hits survive the crash of a
+  process; losing the cache loses at most one interval of hits (a crash
+  in the middle of a flush counts its hits twice rather than losing them).
+- 'off': immediate UPDATE on every hit (former behaviour).
+
+The counters shown on the pages lag behind by at most one interval.
+"""
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from servicesbladi.buffers import CounterBuffer
+from .models import Resource, ResourceDailyStat
+
+# Champ de ResourceDailyStat -> champ cumulé de Resource
+COUNTER_FIELDS = {
+    'views': 'view_count',
+    'downloads': 'download_count',
+}
+
+# Dernier vidage du cache partagé par ce processus (mode 'cache')
+_last_cache_flush = time.monotonic()
+
+
+def _mode():
+    return getattr(settings, 'RESOURCE_COUNTER_BUFFER', 'memory')
+
+
+def _interval():
+    return getattr(settings, 'RESOURCE_COUNTER_FLUSH_INTERVAL', 10)
+
+
+def _shared_cache():
+    # Directement l'alias partagé : incr() doit être atomique entre processus
+    return caches['shared']
+
+
+def _cache_key(field, resource_id, day):
+    return f'resource_counter:{field}:{day.isoformat()}:{resource_id}'
+
+
+def count_view(resource_id):
+    _count('views', resource_id)
+
+
+def count_download(resource_id):
+    _count('downloads', resource_id)
+
+
+def _count(field, resource_id):
+    mode = _mode()
+    day = timezone.localdate()
+    if mode == 'off':
+        write_counts({(resource_id, day): {field: 1}})
+        return
+    if mode == 'cache':
+        _buffer.start()
+        cache = _shared_cache()
+        key = _cache_key(field, resource_id, day)
+        # add() puis incr() : la clé est créée une seule fois ; elle expire une fois
+        # le jour passé et vidé (flush_cache lit aujourd'hui et hier)
+        if not cache.add(key, 1, timeout=3 * 24 * 3600):
+            cache.incr(key)
+        _maybe_flush_cache()
+        return
+    _buffer.add((resource_id, day), field)
+
+
+def write_counts(counts):
+    """
+    Add {(resource_id, day): {'views': n, 'downloads': n}} to the Resource
+    totals and to the ResourceDailyStat rows, in one transaction.
+    """
+    totals = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    for (resource_id, _), fields in counts.items():
+        for field, amount in fields.items():
+            totals[resource_id][field] += amount
+
+    with transaction.atomic():
+        for resource_id, fields in totals.items():
+            Resource.objects.filter(pk=resource_id).update(**{
+                COUNTER_FIELDS[field]: F(COUNTER_FIELDS[field]) + amount
+                for field, amount in fields.items() if amount
+            })
+        for (resource_id, day), fields in counts.items():
+            fields = {field: amount for field, amount in fields.items() if amount}
+            if fields:
+                _add_daily(resource_id, day, fields)
+
+
+def _add_daily(resource_id, day, fields):
+    increments = {field: F(field) + amount for field, amount in fields.items()}
+    if ResourceDailyStat.objects.filter(resource_id=resource_id, date=day).update(**increments):
+        return
+    if not Resource.objects.filter(pk=resource_id).exists():
+        # Ressource supprimée depuis la visite
+        return
+    try:
+        with transaction.atomic():
+            ResourceDailyStat.objects.create(resource_id=resource_id, date=day, **fields)
+    except IntegrityError:
+        # Ligne créée entre-temps par un autre processus
+        ResourceDailyStat.objects.filter(resource_id=resource_id, date=day).update(**increments)
+
+
+def flush():
+    """Write the hits buffered in this process. Returns the number of hits written."""
+    return _buffer.flush()
+
+
+def _maybe_flush_cache():
+    global _last_cache_flush
+    if time.monotonic() - _last_cache_flush < _interval():
+        return
+    _last_cache_flush = time.monotonic()
+    # Un seul processus vide le cache par intervalle
+    if _shared_cache().add('resource_counter:flush_lock', 1, timeout=_interval()):
+        flush_cache()
+
+
+def flush_cache(days=2):
+    """
+    Write the hits accumulated in the shared cache for the last days.
+    Returns the number of hits written.
+    """
+    cache = _shared_cache()
+    today = timezone.localdate()
+    resource_ids = list(Resource.objects.values_list('pk', flat=True))
+    keys = {
+        _cache_key(field, resource_id, today - timedelta(days=offset)): (field, resource_id, today - timedelta(days=offset))
+        for offset in range(days) for resource_id in resource_ids for field in COUNTER_FIELDS
+    }
+    values = {key: value for key, value in cache.get_many(list(keys)).items() if value}
+    if not values:
+        return 0
+    counts = defaultdict(dict)
+    for key, value in values.items():
+        field, resource_id, day = keys[key]
+        counts[(resource_id, day)][field] = value
+    write_counts(counts)
+    # Après l'écriture : une erreur de la base ne perd rien. Soustraire ce qui a été
+    # écrit (et non supprimer la clé) garde les visites comptées entre-temps
+    for key, value in values.items():
+        cache.decr(key, value)
+    return sum(values.values())
+
+
+def popular_resources(queryset=None, field='views', days=30, limit=5):
+    """
+    Resources of the queryset ranked by their views (or downloads) of the
+    last days, from ResourceDailyStat; the all-time counters break ties.
+    """
+    queryset = Resource.objects.all() if queryset is None else queryset
+    since = timezone.localdate() - timedelta(days=days - 1)
+    return (
+        queryset.annotate(recent=Sum(f'daily_stats__{field}', filter=Q(daily_stats__date__gte=since)))
+        .order_by(F('recent').desc(nulls_last=True), f'-{COUNTER_FIELDS[field]}', '-id')[:limit]
+    )
+
+
+def _tick():
+    if _mode() == 'cache':
+        _maybe_flush_cache()
+    else:
+        _buffer.flush()
+
+
+# (resource_id, jour) -> {'views': n, 'downloads': n}
+_buffer = CounterBuffer(
+    'resource counters', write_counts, COUNTER_FIELDS,
+    interval=_interval,
+    flush_size=lambda: getattr(settings, 'RESOURCE_COUNTER_FLUSH_SIZE', 1000),
+    tick=_tick,
+)
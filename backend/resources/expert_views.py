@@ -90,7 +90,6 @@ def add_resource(request):
                     file=file,
                     language='fr',  # Default language
                     file_format=file.name.split('.')[-1] if '.' in file.name else 'unknown',
-                    file_size=file.size // 1024  # Convert bytes to KB
                 )
                 print(f"File added: {file.name}")
             
@@ -176,7 +175,6 @@ def edit_resource(request, resource_id):
                     file=file,
                     language='fr',  # Default language
                     file_format=file_format,
-                    file_size=file.size // 1024  # Convert bytes to KB
                 )
                 print(f"Added new file: {file.name}")
             
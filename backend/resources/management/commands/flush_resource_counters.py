@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from resources import counters
+
+
+class Command(BaseCommand):
+    help = 'Write the resource view and download counters buffered in the shared cache (RESOURCE_COUNTER_BUFFER = cache)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2, help='Days of buffered counters to read (today included)')
+
+    def handle(self, *args, **options):
+        hits = counters.flush_cache(days=options['days'])
+        self.stdout.write(self.style.SUCCESS(f"{hits} hit(s) written"))
@@ -0,0 +1,32 @@
+# Generated by Django 4.2 on 2026-10-18 08:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resourcefile',
+            name='byte_size',
+            field=models.BigIntegerField(blank=True, null=True, verbose_name='file size in bytes'),
+        ),
+        migrations.AddField(
+            model_name='resourcefile',
+            name='mime_type',
+            field=models.CharField(blank=True, max_length=100, verbose_name='MIME type'),
+        ),
+        migrations.AddField(
+            model_name='resourcefile',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64, verbose_name='SHA-256'),
+        ),
+        migrations.AddIndex(
+            model_name='resourcefile',
+            index=models.Index(fields=['sha256'], name='resfile_sha256_idx'),
+        ),
+    ]
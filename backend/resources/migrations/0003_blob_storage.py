@@ -0,0 +1,19 @@
+# Generated by Django 4.2 on 2026-10-18 08:17
+
+from django.db import migrations, models
+import servicesbladi.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0002_file_metadata'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='resourcefile',
+            name='file',
+            field=models.FileField(storage=servicesbladi.storage.blob_storage, upload_to='resources/%Y/%m/', verbose_name='file'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2 on 2026-10-18 08:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('resources', '0003_blob_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResourceDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('views', models.PositiveIntegerField(default=0, verbose_name='views')),
+                ('downloads', models.PositiveIntegerField(default=0, verbose_name='downloads')),
+                ('resource', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='resources.resource')),
+            ],
+            options={
+                'verbose_name': 'resource daily statistic',
+                'verbose_name_plural': 'resource daily statistics',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='resourcedailystat',
+            index=models.Index(fields=['date', 'resource'], name='resource_stat_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='resourcedailystat',
+            constraint=models.UniqueConstraint(fields=('resource', 'date'), name='resource_daily_stat_unique'),
+        ),
+    ]
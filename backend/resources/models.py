@@ -1,6 +1,9 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 from accounts.models import Utilisateur
+from servicesbladi.delivery import download_name
+from servicesbladi.storage import blob_storage
+from servicesbladi.upload_handlers import apply_file_metadata
 
 class Resource(models.Model):
     """Resource model for downloadable resources and information"""
@@ -52,12 +55,51 @@ class ResourceFile(models.Model):
     """Resource file model"""
     resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='files')
     language = models.CharField(_('language'), max_length=10)
-    file = models.FileField(_('file'), upload_to='resources/%Y/%m/')
+    file = models.FileField(_('file'), upload_to='resources/%Y/%m/', storage=blob_storage)
     file_format = models.CharField(_('file format'), max_length=20)
     file_size = models.IntegerField(_('file size in KB'), blank=True, null=True)
+    byte_size = models.BigIntegerField(_('file size in bytes'), blank=True, null=True)
+    mime_type = models.CharField(_('MIME type'), max_length=100, blank=True)
+    sha256 = models.CharField(_('SHA-256'), max_length=64, blank=True)
     
     def __str__(self):
         return f"{self.resource.title} - {self.language} ({self.file_format})"
+    
+    def save(self, *args, **kwargs):
+        # Type MIME détecté, empreinte et taille calculés pendant la réception du fichier
+        apply_file_metadata(self)
+        super().save(*args, **kwargs)
+    
+    @property
+    def download_name(self):
+        # Les fichiers sont stockés sous leur empreinte : le nom vient de la ressource
+        return download_name(f"{self.resource.title} ({self.language})", self.file.name)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['sha256'], name='resfile_sha256_idx'),
+        ]
+
+class ResourceDailyStat(models.Model):
+    """Views and downloads of a resource on one day, written by the counter buffer (see counters.py)"""
+    resource = models.ForeignKey(Resource, on_delete=models.CASCADE, related_name='daily_stats')
+    date = models.DateField(_('date'))
+    views = models.PositiveIntegerField(_('views'), default=0)
+    downloads = models.PositiveIntegerField(_('downloads'), default=0)
+    
+    def __str__(self):
+        return f"{self.resource_id} {self.date.isoformat()}"
+    
+    class Meta:
+        verbose_name = _('resource daily statistic')
+        verbose_name_plural = _('resource daily statistics')
+        constraints = [
+            models.UniqueConstraint(fields=['resource', 'date'], name='resource_daily_stat_unique'),
+        ]
+        indexes = [
+            # Classement de popularité sur une période
+            models.Index(fields=['date', 'resource'], name='resource_stat_date_idx'),
+        ]
 
 class ResourceLink(models.Model):
     """Resource link model for external resources"""
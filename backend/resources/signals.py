@@ -0,0 +1,34 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from servicesbladi import storage
+from servicesbladi.cache import bump_namespace
+from .models import FAQ, ResourceFile
+from .views import FAQ_CACHE_NAMESPACE
+
+
+@receiver(post_save, sender=FAQ)
+@receiver(post_delete, sender=FAQ)
+def faq_changed(sender, instance, **kwargs):
+    """Drop the cached FAQ pages after a change"""
+    bump_namespace(FAQ_CACHE_NAMESPACE)
+
+
+# Compteurs de références des fichiers stockés par contenu (servicesbladi.storage)
+
+@receiver(post_init, sender=ResourceFile)
+def resource_file_loaded(sender, instance, **kwargs):
+    storage.remember_file(instance)
+
+
+@receiver(post_save, sender=ResourceFile)
+def resource_file_saved(sender, instance, created, raw=False, **kwargs):
+    """Count the reference of the resource file to its blob"""
+    if not raw:
+        storage.file_saved(instance, created)
+
+
+@receiver(post_delete, sender=ResourceFile)
+def resource_file_deleted(sender, instance, **kwargs):
+    """Release the blob of a deleted resource file (collected by gc_blobs)"""
+    storage.file_deleted(instance)
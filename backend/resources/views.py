@@ -1,13 +1,31 @@
+import os
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse, FileResponse
+from django.http import JsonResponse
 from django.utils.translation import gettext_lazy as _
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import translation
-from django.db.models import Q, F
+from django.db.models import Q
 
+from servicesbladi.cache import get_or_compute
+from servicesbladi.delivery import is_first_request, serve_file
+from . import counters
 from .models import Resource, ResourceFile, ResourceLink, ConsulateEmbassy, FAQ
 
+# Espace de noms du cache de la FAQ, invalidé par resources.signals
+FAQ_CACHE_NAMESPACE = 'faq'
+FAQ_CACHE_TIMEOUT = 3600
+
+def serve_resource_file(request, resource_file):
+    return serve_file(
+        request,
+        resource_file.file,
+        filename=resource_file.download_name,
+        content_type=resource_file.mime_type or None,
+        etag=resource_file.sha256 or None,
+    )
+
 # Resource views
 def resource_list_view(request):
     """Display list of available resources"""
@@ -42,8 +60,8 @@ def resource_detail_view(request, resource_id):
     """Display details of a specific resource"""
     resource = get_object_or_404(Resource, id=resource_id, is_active=True)
     
-    # Increment view count
-    Resource.objects.filter(id=resource_id).update(view_count=F('view_count') + 1)
+    # Increment view count (buffered, see counters.py)
+    counters.count_view(resource.id)
     
     # Get resource files
     files = ResourceFile.objects.filter(resource=resource)
@@ -85,17 +103,18 @@ def resource_category_view(request, category):
 
 def download_resource_view(request, resource_file_id):
     """Download a resource file"""
-    resource_file = get_object_or_404(ResourceFile, id=resource_file_id)
+    resource_file = get_object_or_404(ResourceFile.objects.select_related('resource'), id=resource_file_id)
     
-    # Increment download count for the resource
-    Resource.objects.filter(id=resource_file.resource.id).update(download_count=F('download_count') + 1)
+    # Increment download count for the resource (not for the resumption of a download)
+    if is_first_request(request):
+        counters.count_download(resource_file.resource_id)
     
-    # Return the file as a response
-    return FileResponse(
-        resource_file.file, 
-        as_attachment=True, 
-        filename=resource_file.file.name.split('/')[-1]
-    )
+    return serve_resource_file(request, resource_file)
+
+def uploaded_file_format(name):
+    """ResourceFile.file_format of an uploaded file: its extension"""
+    extension = os.path.splitext(name)[1][1:].lower()
+    return extension[:20] or 'unknown'
 
 # Expert resource management views
 @login_required
@@ -133,9 +152,9 @@ def add_resource(request):
             ResourceFile.objects.create(
                 resource=resource,
                 file=file,
-                file_name=file.name,
-                file_size=file.size,
-                uploaded_by=request.user
+                # Langue principale de la ressource, format d'après l'extension
+                language=resource.available_languages.split(',')[0],
+                file_format=uploaded_file_format(file.name),
             )
         
         # Handle links
@@ -184,9 +203,9 @@ def edit_resource(request, resource_id):
             ResourceFile.objects.create(
                 resource=resource,
                 file=file,
-                file_name=file.name,
-                file_size=file.size,
-                uploaded_by=request.user
+                # Langue principale de la ressource, format d'après l'extension
+                language=resource.available_languages.split(',')[0],
+                file_format=uploaded_file_format(file.name),
             )
         
         # Handle new links
@@ -312,13 +331,10 @@ def embassy_detail_view(request, country, city):
     return render(request, 'resources/embassy_detail.html', context)
 
 # FAQ views
-def faq_view(request):
-    """Display frequently asked questions"""
-    # Get current language
-    current_language = translation.get_language()
-    
-    # Filter active FAQs in the current language
-    faqs = FAQ.objects.filter(is_active=True, language=current_language)
+def group_faqs(language):
+    """Active FAQs of a language grouped by category"""
+    # Filter active FAQs in the language
+    faqs = FAQ.objects.filter(is_active=True, language=language)
     
     # Group by category
     categories = {}
@@ -326,6 +342,18 @@ def faq_view(request):
         if faq.category not in categories:
             categories[faq.category] = []
         categories[faq.category].append(faq)
+    return categories
+
+def faq_view(request):
+    """Display frequently asked questions"""
+    # Get current language
+    current_language = translation.get_language()
+    
+    categories = get_or_compute(
+        FAQ_CACHE_NAMESPACE, f'grouped:{current_language}',
+        lambda: group_faqs(current_language),
+        timeout=FAQ_CACHE_TIMEOUT,
+    )
     
     context = {
         'categories': categories,
@@ -339,7 +367,13 @@ def faq_category_view(request, category):
     current_language = translation.get_language()
     
     # Filter active FAQs in the current language and category
-    faqs = FAQ.objects.filter(is_active=True, language=current_language, category=category).order_by('order', 'created_at')
+    faqs = get_or_compute(
+        FAQ_CACHE_NAMESPACE, f'category:{current_language}:{category}',
+        lambda: list(FAQ.objects.filter(
+            is_active=True, language=current_language, category=category
+        ).order_by('order', 'created_at')),
+        timeout=FAQ_CACHE_TIMEOUT,
+    )
     
     context = {
         'faqs': faqs,
@@ -397,8 +431,7 @@ def api_resource_detail(request, resource_id):
         resource = Resource.objects.get(id=resource_id, is_active=True)
         
         # Increment view count
-        resource.view_count += 1
-        resource.save()
+        counters.count_view(resource.id)
         
         # Get resource files
         files_data = []
@@ -520,34 +553,42 @@ def api_embassy_country(request, country):
         'embassies': embassy_data
     })
 
-@csrf_exempt
-def api_faq_list(request):
-    """API endpoint to list FAQs"""
-    # Get current language
-    current_language = translation.get_language()
-    
-    # Filter active FAQs in the specified language
-    language = request.GET.get('language', current_language)
+def serialize_faqs(language, category=None):
+    """Active FAQs of a language (optionally one category) as dicts"""
     faqs = FAQ.objects.filter(is_active=True, language=language)
     
     # Filter by category if specified
-    category = request.GET.get('category')
     if category:
         faqs = faqs.filter(category=category)
     
     # Sort FAQs by order and creation date
     faqs = faqs.order_by('category', 'order', 'created_at')
     
-    # Prepare response data
-    faq_data = []
-    for faq in faqs:
-        faq_data.append({
+    return [
+        {
             'id': faq.id,
             'question': faq.question,
             'answer': faq.answer,
             'category': faq.category,
             'language': faq.language,
-        })
+        }
+        for faq in faqs
+    ]
+
+@csrf_exempt
+def api_faq_list(request):
+    """API endpoint to list FAQs"""
+    # Get current language
+    current_language = translation.get_language()
+    
+    # Language and optional category to list
+    language = request.GET.get('language', current_language)
+    category = request.GET.get('category')
+    faq_data = get_or_compute(
+        FAQ_CACHE_NAMESPACE, f'api:{language}:{category or ""}',
+        lambda: serialize_faqs(language, category),
+        timeout=FAQ_CACHE_TIMEOUT,
+    )
     
     # Group by category if requested
     group_by_category = request.GET.get('group_by_category') == 'true'
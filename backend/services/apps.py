@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ServicesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'services'
+
+    def ready(self):
+        # Register signal handlers
+        from . import signals  # noqa: F401
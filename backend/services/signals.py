@@ -0,0 +1,25 @@
+from django.db.models.signals import post_save, post_delete
+
+from servicesbladi.cache import bump_namespace
+from .models import (
+    ServiceCategory, ServiceType, Service, TourismService, AdministrativeService,
+    InvestmentService, RealEstateService, FiscalService,
+)
+from .views import CATALOG_CACHE_NAMESPACE
+
+# Avec l'héritage multi-tables, post_save n'est envoyé que pour la classe concrète :
+# chaque sous-classe de Service doit être connectée
+CATALOG_MODELS = (
+    ServiceCategory, ServiceType, Service, TourismService, AdministrativeService,
+    InvestmentService, RealEstateService, FiscalService,
+)
+
+
+def catalog_changed(sender, **kwargs):
+    """Drop every cached catalog list after a change"""
+    bump_namespace(CATALOG_CACHE_NAMESPACE)
+
+
+for _model in CATALOG_MODELS:
+    post_save.connect(catalog_changed, sender=_model, dispatch_uid=f'catalog_save_{_model._meta.model_name}')
+    post_delete.connect(catalog_changed, sender=_model, dispatch_uid=f'catalog_delete_{_model._meta.model_name}')
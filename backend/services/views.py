@@ -12,18 +12,40 @@ from django.conf import settings
 from .models import ServiceCategory, ServiceType, Service, TourismService, AdministrativeService
 from .models import InvestmentService, RealEstateService, FiscalService
 from accounts.models import Expert, Utilisateur
+from servicesbladi.cache import get_or_compute
+
+# Espace de noms du cache du catalogue, invalidé par services.signals
+CATALOG_CACHE_NAMESPACE = 'services'
+CATALOG_CACHE_TIMEOUT = 600
+
+
+def active_services(model):
+    """Cached list of the active services of one catalog model"""
+    return get_or_compute(
+        CATALOG_CACHE_NAMESPACE, f'active:{model._meta.model_name}',
+        lambda: list(model.objects.filter(is_active=True)),
+        timeout=CATALOG_CACHE_TIMEOUT,
+    )
 
 def all_services_view(request):
     """View for the main services page showing all categories"""
-    categories = ServiceCategory.objects.all()
+    categories = get_or_compute(
+        CATALOG_CACHE_NAMESPACE, 'categories',
+        lambda: list(ServiceCategory.objects.all()),
+        timeout=CATALOG_CACHE_TIMEOUT,
+    )
     
     # If no categories exist yet, create default ones
-    if not categories.exists():
+    if not categories:
         categories = create_default_categories()
     
-    featured_services = Service.objects.filter(
-        is_active=True
-    ).select_related('expert', 'expert__user', 'service_type')[:6]
+    featured_services = get_or_compute(
+        CATALOG_CACHE_NAMESPACE, 'featured',
+        lambda: list(Service.objects.filter(
+            is_active=True
+        ).select_related('expert', 'expert__user', 'service_type')[:6]),
+        timeout=CATALOG_CACHE_TIMEOUT,
+    )
     
     context = {
         'categories': categories,
@@ -97,7 +119,7 @@ def create_default_categories():
 
 def tourism_services_view(request):
     """View for tourism services"""
-    tourism_services = TourismService.objects.filter(is_active=True)
+    tourism_services = active_services(TourismService)
     
     context = {
         'services': tourism_services,
@@ -109,7 +131,7 @@ def tourism_services_view(request):
 
 def administrative_services_view(request):
     """View for administrative services"""
-    admin_services = AdministrativeService.objects.filter(is_active=True)
+    admin_services = active_services(AdministrativeService)
     
     context = {
         'services': admin_services,
@@ -121,7 +143,7 @@ def administrative_services_view(request):
 
 def fiscal_services_view(request):
     """View for fiscal services"""
-    fiscal_services = FiscalService.objects.filter(is_active=True)
+    fiscal_services = active_services(FiscalService)
     
     context = {
         'services': fiscal_services,
@@ -133,7 +155,7 @@ def fiscal_services_view(request):
 
 def real_estate_services_view(request):
     """View for real estate services"""
-    real_estate_services = RealEstateService.objects.filter(is_active=True)
+    real_estate_services = active_services(RealEstateService)
     
     context = {
         'services': real_estate_services,
@@ -145,7 +167,7 @@ def real_estate_services_view(request):
 
 def investment_services_view(request):
     """View for investment services"""
-    investment_services = InvestmentService.objects.filter(is_active=True)
+    investment_services = active_services(InvestmentService)
     
     context = {
         'services': investment_services,
@@ -0,0 +1,121 @@
+"""
+Per-process buffer of counter increments written in batches.
+
+Counting an event with an UPDATE of a shared row (the counters of a
+popular resource, the DailyStat row of the day) makes it a hot row. A
+CounterBuffer accumulates {key: {field: n}} in the process instead, and
+hands the whole batch to a write function:
+
+- from the request adding to it, once it holds flush_size() increments or
+  interval() seconds have passed since the last write;
+- from a daemon thread, started by the first increment of the process,
+  every interval() seconds even when no more requests come;
+- when the process exits normally.
+
+A failed write puts the increments back in the buffer for the next one; a
+killed process loses at most one interval of increments. Used by
+resources.counters and custom_requests.stats.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+
+from django.db import DatabaseError, connection
+
+logger = logging.getLogger(__name__)
+
+
+class CounterBuffer:
+    """
+    Buffer of increments for write(counts), counts being {key: {field: n}}.
+
+    interval and flush_size are callables, so that the settings are read
+    when used. tick replaces flush() as the periodic work of the thread.
+    """
+
+    def __init__(self, name, write, fields, interval, flush_size, tick=None):
+        self.name = name
+        self.write = write
+        self.fields = tuple(fields)
+        self.interval = interval
+        self.flush_size = flush_size
+        self.tick = tick or self.flush
+        self._lock = threading.Lock()
+        self._pending = defaultdict(lambda: dict.fromkeys(self.fields, 0))
+        self._pending_count = 0
+        self._last_flush = time.monotonic()
+        # Processus qui a lancé le thread d'écriture (un fork n'hérite pas du thread)
+        self._flusher_pid = None
+        atexit.register(self._flush_at_exit)
+
+    def __bool__(self):
+        return bool(self._pending)
+
+    def add(self, key, field, amount=1):
+        """Buffer an increment, writing the buffer when it is due"""
+        self.start()
+        with self._lock:
+            self._pending[key][field] += amount
+            self._pending_count += amount
+            due = (
+                self._pending_count >= self.flush_size()
+                or time.monotonic() - self._last_flush >= self.interval()
+            )
+        if due:
+            try:
+                self.flush()
+            except DatabaseError:
+                # Les incréments restent dans le tampon ; la requête aboutit quand même
+                logger.exception('Flushing the %s failed', self.name)
+
+    def flush(self):
+        """Write the buffered increments. Returns their number."""
+        with self._lock:
+            counts = {key: dict(fields) for key, fields in self._pending.items()}
+            count = self._pending_count
+            self._pending.clear()
+            self._pending_count = 0
+            self._last_flush = time.monotonic()
+        if not counts:
+            return 0
+        try:
+            self.write(counts)
+        except Exception:
+            # Base indisponible : les incréments sont remis dans le tampon pour la prochaine fois
+            with self._lock:
+                for key, fields in counts.items():
+                    for field, amount in fields.items():
+                        self._pending[key][field] += amount
+                self._pending_count += count
+            raise
+        return count
+
+    def start(self):
+        """Start the flush thread of this process, once"""
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid != os.getpid():
+                threading.Thread(target=self._flush_loop, name=self.name.replace(' ', '-'), daemon=True).start()
+                self._flusher_pid = os.getpid()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.interval())
+            try:
+                self.tick()
+            except Exception:
+                logger.exception('Flushing the %s failed', self.name)
+            finally:
+                # Connexion propre au thread : pas de connexion ouverte entre deux intervalles
+                connection.close()
+
+    def _flush_at_exit(self):
+        if self._pending:
+            try:
+                self.flush()
+            except Exception:
+                pass
@@ -0,0 +1,253 @@
+"""
+Tiered cache backend and namespaced, stampede-safe caching helpers.
+
+CACHES['default'] uses TieredCache: a small per-process LRU in front of the
+'shared' alias (Redis in production, a file-based cache in development).
+Code that caches expensive results goes through get_or_compute() so keys are
+namespaced and versioned, and a cold key is filled by a single worker.
+"""
+import hashlib
+import math
+import pickle
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+_MISSING = object()
+
+
+class TieredCache(BaseCache):
+    """
+    Per-process LRU in front of a shared cache alias.
+
+    OPTIONS:
+    - SHARED: alias of the shared backend (defaults to LOCATION)
+    - LOCAL_MAX_ENTRIES: size of the in-process LRU (default 1000)
+    - LOCAL_TIMEOUT: seconds a value may be served from process memory
+      (default 5). Writes and deletes made by other processes become visible
+      here after at most this delay; this process sees its own immediately.
+
+    Values are pickled in the LRU so callers never share mutable objects.
+    add() and incr() always go to the shared backend, which keeps them
+    atomic when that backend is (Redis is, the file-based cache is not).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', location)
+        self._local_max_entries = int(options.get('LOCAL_MAX_ENTRIES', 1000))
+        self._local_timeout = float(options.get('LOCAL_TIMEOUT', 5))
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _timeout(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    # Cache local
+
+    def _local_get(self, key):
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return _MISSING
+            expires, payload = entry
+            if expires <= time.monotonic():
+                del self._local[key]
+                return _MISSING
+            self._local.move_to_end(key)
+        return pickle.loads(payload)
+
+    def _local_set(self, key, value, timeout):
+        ttl = self._local_timeout if timeout is None else min(self._local_timeout, timeout)
+        if ttl <= 0:
+            self._local_delete(key)
+            return
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._local[key] = (time.monotonic() + ttl, payload)
+            self._local.move_to_end(key)
+            while len(self._local) > self._local_max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key):
+        with self._lock:
+            self._local.pop(key, None)
+
+    # API du backend
+
+    def get(self, key, default=None, version=None):
+        local_key = self.make_and_validate_key(key, version)
+        value = self._local_get(local_key)
+        if value is not _MISSING:
+            return value
+
+        value = self.shared.get(key, _MISSING, version)
+        if value is _MISSING:
+            return default
+        self._local_set(local_key, value, None)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        self.shared.set(key, value, timeout, version)
+        self._local_set(self.make_and_validate_key(key, version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        if not self.shared.add(key, value, timeout, version):
+            return False
+        self._local_set(self.make_and_validate_key(key, version), value, timeout)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, self._timeout(timeout), version)
+
+    def delete(self, key, version=None):
+        self._local_delete(self.make_and_validate_key(key, version))
+        return self.shared.delete(key, version)
+
+    def has_key(self, key, version=None):
+        if self._local_get(self.make_and_validate_key(key, version)) is not _MISSING:
+            return True
+        return self.shared.has_key(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(self.make_and_validate_key(key, version))
+        return self.shared.incr(key, delta, version)
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            value = self._local_get(self.make_and_validate_key(key, version))
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+
+        if missing:
+            for key, value in self.shared.get_many(missing, version).items():
+                self._local_set(self.make_and_validate_key(key, version), value, None)
+                found[key] = value
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(timeout)
+        failed = self.shared.set_many(data, timeout, version) or []
+        for key, value in data.items():
+            if key not in failed:
+                self._local_set(self.make_and_validate_key(key, version), value, timeout)
+        return failed
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            self._local_delete(self.make_and_validate_key(key, version))
+        return self.shared.delete_many(keys, version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        return self.shared.clear()
+
+
+# Clés versionnées par espace de noms
+
+_UNSAFE_KEY_RE = re.compile(r'[\s\x00-\x1f\x7f]')
+
+
+def namespace_version(namespace):
+    """Current version of a namespace, created on first use"""
+    key = f'ns:{namespace}:version'
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, None):
+            version = cache.get(key) or version
+    return version
+
+
+def bump_namespace(namespace):
+    """Invalidate every key of a namespace at once (old entries simply expire)"""
+    cache.set(f'ns:{namespace}:version', time.time_ns(), None)
+
+
+def namespaced_key(namespace, key):
+    """
+    Build '<namespace>:<deploy version>:<namespace version>:<key>'.
+
+    settings.CACHE_VERSION changes with each deploy and bump_namespace()
+    after a model change, so stale entries are never read back. Keys with
+    whitespace or control characters, or that are too long, are hashed.
+    """
+    key = str(key)
+    if len(key) > 150 or _UNSAFE_KEY_RE.search(key):
+        key = hashlib.sha1(key.encode()).hexdigest()
+    deploy = getattr(settings, 'CACHE_VERSION', '')
+    return f'{namespace}:{deploy}:{namespace_version(namespace)}:{key}'
+
+
+def _fill(full_key, compute, timeout):
+    started = time.monotonic()
+    value = compute()
+    duration = time.monotonic() - started
+    # La durée du calcul sert au recalcul anticipé (XFetch)
+    cache.set(full_key, (value, time.time() + timeout, duration), timeout)
+    return value
+
+
+def get_or_compute(namespace, key, compute, timeout=300, beta=1.0, lock_timeout=30):
+    """
+    Return the cached value of namespace/key, computing it with compute() if needed.
+
+    Stampede protection:
+    - single flight: on a miss only the worker that wins cache.add() on the
+      lock key computes; the others wait for its result (up to lock_timeout
+      seconds) instead of running the same expensive query;
+    - early recompute: shortly before expiry one worker, chosen at random
+      with a probability that grows as expiry nears and with the cost of
+      the computation, refreshes the value while the others keep serving
+      the current one.
+    """
+    full_key = namespaced_key(namespace, key)
+    lock_key = f'{full_key}:lock'
+
+    entry = cache.get(full_key)
+    if entry is not None:
+        value, expires_at, duration = entry
+        if time.time() - duration * beta * math.log(1.0 - random.random()) < expires_at:
+            return value
+        if not cache.add(lock_key, 1, lock_timeout):
+            return value
+        try:
+            return _fill(full_key, compute, timeout)
+        finally:
+            cache.delete(lock_key)
+
+    if cache.add(lock_key, 1, lock_timeout):
+        try:
+            return _fill(full_key, compute, timeout)
+        finally:
+            cache.delete(lock_key)
+
+    # Un autre worker calcule déjà la valeur : l'attendre
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(full_key)
+        if entry is not None:
+            return entry[0]
+        if not cache.has_key(lock_key):
+            break
+    return _fill(full_key, compute, timeout)
@@ -1,5 +1,7 @@
 import time
 import random
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
 
 def language_context(request):
     """
@@ -14,6 +16,9 @@ def notifications_context(request):
     """
     Context processor that adds unread notifications count and recent notifications
     to the template context for authenticated users.
+
+    Both values are lazy: the cached summary is only fetched when a template
+    actually renders the notification bell.
     """
     if not request.user.is_authenticated:
         return {
@@ -22,22 +27,13 @@ def notifications_context(request):
         }
     
     # Import here to avoid circular imports
-    from custom_requests.models import Notification
-    
-    # Get unread notifications count
-    unread_count = Notification.objects.filter(
-        user=request.user,
-        is_read=False
-    ).count()
+    from custom_requests.notifications import get_notification_summary
     
-    # Get recent notifications (limit to 5)
-    notifications = Notification.objects.filter(
-        user=request.user
-    ).order_by('-created_at')[:5]
+    summary = SimpleLazyObject(lambda: get_notification_summary(request.user.id))
     
     return {
-        'unread_notifications_count': unread_count,
-        'notifications': notifications
+        'unread_notifications_count': SimpleLazyObject(lambda: summary['unread_count']),
+        'notifications': SimpleLazyObject(lambda: summary['latest'])
     }
 
 def cache_version_context(request):
@@ -49,14 +45,20 @@ def cache_version_context(request):
     if not hasattr(request, 'request_time'):
         request.request_time = int(time.time())
     
-    # Version de cache si pas dans la session
-    if 'cache_version' not in request.session:
-        cache_version = f"{request.request_time}.{random.randint(1000, 9999)}"
-        request.session['cache_version'] = cache_version
-        request.session.modified = True
+    # En mode ETag, la version est fixe par déploiement
+    if getattr(settings, 'CACHE_CONTROL_MODE', 'etag') != 'no-store':
+        return {
+            'cache_version': getattr(settings, 'CACHE_VERSION', ''),
+            'request_time': request.request_time,
+            'timestamp': request.request_time,
+        }
+    
+    # Version générée par CacheControlMiddleware pour cette requête (jamais stockée en session)
+    if not hasattr(request, 'cache_version'):
+        request.cache_version = f"{request.request_time}.{random.randint(1000, 9999)}"
     
     return {
-        'cache_version': request.session.get('cache_version', ''),
+        'cache_version': request.cache_version,
         'request_time': request.request_time,
         'timestamp': int(time.time()),
     }
\ No newline at end of file
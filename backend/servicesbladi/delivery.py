@@ -0,0 +1,224 @@
+"""
+Delivery of protected files (documents, resource files).
+
+Views check the permissions, then serve_file() answers with the file in
+the way FILE_DELIVERY selects:
+
+- 'nginx': an empty response with X-Accel-Redirect; nginx sends the file
+  from an `internal` location mapping FILE_DELIVERY_ACCEL_PREFIX onto
+  MEDIA_ROOT, with Range support, and the worker is released at once.
+- 'sendfile': the same with X-Sendfile (Apache mod_xsendfile, lighttpd).
+- 'python' (default): Django sends the file itself, with conditional
+  requests (ETag / Last-Modified), single byte ranges and If-Range, so an
+  interrupted download resumes. A whole file is handed to the server's
+  wsgi.file_wrapper, which gunicorn turns into a zero-copy sendfile().
+
+Files are uploaded by users and served from the site's own origin: only
+the types of INLINE_TYPES (PDF, raster images) are ever shown in the
+browser, with `Content-Security-Policy: sandbox`. Anything else (HTML, SVG,
+XML...) is sent as an application/octet-stream attachment, so an uploaded
+page can never run script in the session of the person opening it.
+
+Example nginx location for 'nginx':
+
+    location /protected-media/ {
+        internal;
+        alias /srv/servicesbladi/backend/media/;
+    }
+"""
+import mimetypes
+import os
+import re
+from collections import namedtuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Types affichables dans le navigateur sans exécuter de script ; jamais text/html,
+# image/svg+xml ni XML
+INLINE_TYPES = {
+    'application/pdf',
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/bmp',
+}
+SAFE_ATTACHMENT_TYPE = 'application/octet-stream'
+
+# Fichier d'un stockage sans champ de modèle (vignettes), accepté par serve_file()
+StoredFile = namedtuple('StoredFile', 'storage name')
+
+
+def download_name(title, stored_name):
+    """File name offered to the browser: the title, with the extension of the stored file"""
+    extension = os.path.splitext(stored_name or '')[1]
+    title = (title or '').strip().replace('/', '-').replace('\\', '-') or 'download'
+    if extension and not title.lower().endswith(extension.lower()):
+        title += extension
+    return title
+
+
+class RangeFile:
+    """
+    Read-only view of `length` bytes of a file from `start`. Without
+    fileno(), servers stream it with read() instead of sending the whole
+    file with sendfile().
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single 'bytes=' range, None to ignore the header
+    (invalid or several ranges: the whole file is sent), or False when the
+    range cannot be satisfied.
+    """
+    match = _RANGE_RE.match((header or '').strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if first == '':
+        # Suffixe : les N derniers octets
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = size - 1 if last == '' else min(int(last), size - 1)
+    if last != '' and int(last) < start:
+        return None
+    if start >= size:
+        return False
+    return start, end
+
+
+def is_first_request(request):
+    """False for the Range requests resuming a download, so that it is counted once"""
+    requested = request.META.get('HTTP_RANGE', '').strip()
+    return not requested or requested.startswith('bytes=0-')
+
+
+def _if_range_matches(value, etag, last_modified):
+    value = (value or '').strip()
+    if not value:
+        return True
+    if value.startswith(('"', 'W/')):
+        # Seule une ETag forte identique autorise la reprise
+        return value == etag
+    return parse_http_date_safe(value) == last_modified
+
+
+def _headers(response, filename, as_attachment, content_type):
+    response['Content-Type'] = content_type
+    disposition = content_disposition_header(as_attachment, filename)
+    if disposition:
+        response['Content-Disposition'] = disposition
+    response['X-Content-Type-Options'] = 'nosniff'
+    if not as_attachment:
+        # Même un PDF affiché ne peut ni exécuter de script ni accéder à l'origine du site
+        response['Content-Security-Policy'] = 'sandbox'
+    return response
+
+
+def safe_disposition(content_type, as_attachment):
+    """
+    (content_type, as_attachment) actually sent: inline only for INLINE_TYPES,
+    every other type as an application/octet-stream attachment.
+    """
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in INLINE_TYPES:
+        return content_type, as_attachment
+    return SAFE_ATTACHMENT_TYPE, True
+
+
+def serve_file(request, field_file, filename=None, as_attachment=True, content_type=None, etag=None):
+    """
+    Response sending a stored file (a FieldFile or a StoredFile). etag
+    defaults to the modification time and size; pass the SHA-256 of the
+    content when it is known. as_attachment is ignored for the types that
+    are not safe to show (see safe_disposition).
+    """
+    filename = filename or os.path.basename(field_file.name)
+    content_type, as_attachment = safe_disposition(
+        content_type or mimetypes.guess_type(filename)[0], as_attachment
+    )
+    storage = field_file.storage
+
+    try:
+        path = storage.path(field_file.name)
+    except NotImplementedError:
+        # Stockage distant : pas de chemin local, envoi simple par Django
+        response = FileResponse(storage.open(field_file.name, 'rb'), as_attachment=as_attachment, filename=filename)
+        return _headers(response, filename, as_attachment, content_type)
+
+    mode = getattr(settings, 'FILE_DELIVERY', 'python')
+    if mode == 'nginx':
+        response = HttpResponse()
+        prefix = getattr(settings, 'FILE_DELIVERY_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = quote(prefix + field_file.name)
+        return _headers(response, filename, as_attachment, content_type)
+    if mode == 'sendfile':
+        response = HttpResponse()
+        response['X-Sendfile'] = path
+        return _headers(response, filename, as_attachment, content_type)
+
+    try:
+        file = open(path, 'rb')
+    except FileNotFoundError:
+        return HttpResponse(status=404)
+    stat = os.fstat(file.fileno())
+    size = stat.st_size
+    last_modified = int(stat.st_mtime)
+    etag = f'"{etag}"' if etag else f'"{last_modified:x}-{size:x}"'
+
+    conditional = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if conditional is not None:
+        file.close()
+        return conditional
+
+    byte_range = None
+    if request.method in ('GET', 'HEAD') and 'HTTP_RANGE' in request.META:
+        if _if_range_matches(request.META.get('HTTP_IF_RANGE'), etag, last_modified):
+            byte_range = parse_range(request.META['HTTP_RANGE'], size)
+
+    if byte_range is False:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    if byte_range is None:
+        response = FileResponse(file, as_attachment=as_attachment, filename=filename)
+        response['Content-Length'] = size
+    else:
+        start, end = byte_range
+        response = FileResponse(RangeFile(file, start, end - start + 1),
+                                as_attachment=as_attachment, filename=filename)
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Fichiers privés : jamais dans un cache partagé
+    response['Cache-Control'] = 'private, no-cache'
+    return _headers(response, filename, as_attachment, content_type)
@@ -36,7 +36,7 @@ from custom_requests.admin_views import (
     admin_add_resource, admin_edit_resource, admin_delete_resource,
     admin_toggle_resource_visibility, admin_messages_view, admin_mark_message_read,
     admin_profile_view, admin_edit_profile_view, admin_assign_expert, admin_update_request_status,
-    admin_request_detail, admin_send_message, admin_user_detail
+    admin_request_detail, admin_send_message, admin_user_detail, admin_export_view
 )
 
 # Import admin bulk action views
@@ -118,6 +118,7 @@ urlpatterns = [
     path('admin/ressources/<int:resource_id>/delete/', admin_delete_resource, name='admin_delete_resource'),
     path('admin/ressources/<int:resource_id>/toggle-visibility/', admin_toggle_resource_visibility, name='admin_toggle_resource_visibility'),
     path('admin/messages/', admin_messages_view, name='admin_messages'),
+    path('admin/export/<str:kind>/', admin_export_view, name='admin_export'),
     path('admin/messages/<int:message_id>/mark-read/', admin_mark_message_read, name='admin_mark_message_read'),
     path('admin/profile/', admin_profile_view, name='admin_profile'),
     path('admin/profile/edit/', admin_edit_profile_view, name='admin_edit_profile'),
@@ -1,6 +1,12 @@
 from django.contrib import messages
+import hashlib
 import time
 import random
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import HttpResponseNotModified
+from django.utils.cache import get_conditional_response, patch_vary_headers, quote_etag
 from django.utils.deprecation import MiddlewareMixin
 from django.utils import timezone
 
@@ -17,44 +23,127 @@ class MessageMiddleware(MiddlewareMixin):
         return None
 
 class CacheControlMiddleware(MiddlewareMixin):
-    """Middleware to control browser caching of static files"""
-    
+    """
+    Middleware to control browser caching.
+
+    Two modes are available through settings.CACHE_CONTROL_MODE:
+    - 'etag' (default): responses get a strong ETag computed from the body and
+      conditional GETs are answered with 304. Anonymous pages listed in
+      CACHE_CONTROL_WATERMARKS are validated from the models' updated_at
+      watermark before the view runs.
+    - 'no-store': legacy behaviour, every response is marked as non cacheable.
+
+    Static files never reach this middleware (runserver serves them itself,
+    the web server does in production): the long-lived Cache-Control of the
+    hashed names of ManifestStaticFilesStorage is set there.
+    """
+
     def process_request(self, request):
         # Générer un timestamp unique pour cette requête
         request.request_time = int(time.time())
-        
-        # Toujours générer une nouvelle version pour le cache à chaque requête
-        cache_version = f"{int(time.time())}.{random.randint(1000, 9999)}"
-        request.session['cache_version'] = cache_version
-        request.session['request_time'] = request.request_time
-        request.session.modified = True
-        
+
         # Ajouter un indicateur si c'est une requête WebSocket
         if request.path.startswith('/ws/'):
             request.is_websocket = True
-            
+
+        if self.mode() == 'no-store':
+            # Toujours générer une nouvelle version pour le cache à chaque requête,
+            # gardée sur la requête pour ne pas réécrire la session
+            request.cache_version = f"{int(time.time())}.{random.randint(1000, 9999)}"
+            return None
+
+        # Valider les pages publiques à partir du filigrane updated_at, sans exécuter la vue
+        watermark_etag = self.watermark_etag(request)
+        if watermark_etag:
+            request.watermark_etag = watermark_etag
+            if watermark_etag in self.if_none_match(request):
+                response = HttpResponseNotModified()
+                response['ETag'] = watermark_etag
+                return response
+
         return None
-    
+
     def process_response(self, request, response):
+        if self.mode() == 'no-store':
+            return self.no_store_response(request, response)
+
+        content_type = response.get('Content-Type', '')
+        if not content_type.startswith(('text/html', 'text/css', 'application/javascript', 'application/json')):
+            return response
+
+        if request.method not in ('GET', 'HEAD') or response.status_code != 200 or response.streaming:
+            # Les réponses non cachables ne doivent pas être stockées
+            response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+            return response
+
+        if not response.has_header('ETag'):
+            etag = getattr(request, 'watermark_etag', None)
+            if not etag:
+                etag = quote_etag(hashlib.sha256(response.content).hexdigest()[:32])
+            response['ETag'] = etag
+
+        # Le navigateur garde la page mais la revalide à chaque fois
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ('Cookie',))
+
+        return get_conditional_response(request, etag=response['ETag'], response=response)
+
+    @staticmethod
+    def mode():
+        return getattr(settings, 'CACHE_CONTROL_MODE', 'etag')
+
+    @staticmethod
+    def if_none_match(request):
+        header = request.META.get('HTTP_IF_NONE_MATCH', '')
+        return [tag.strip() for tag in header.split(',') if tag.strip()]
+
+    def watermark_etag(self, request):
+        """Build an ETag from the latest updated_at of the models behind an anonymous page"""
+        if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+            return None
+
+        model_labels = None
+        for prefix, labels in getattr(settings, 'CACHE_CONTROL_WATERMARKS', {}).items():
+            if request.path.startswith(prefix):
+                model_labels = labels
+                break
+        if not model_labels:
+            return None
+
+        # Un message flash en attente change la page (et doit être consommé par la vue)
+        if len(messages.get_messages(request)):
+            return None
+
+        parts = [request.get_full_path(), getattr(request, 'LANGUAGE_CODE', '')]
+        for label in model_labels:
+            model = apps.get_model(label)
+            # Le nombre de lignes détecte aussi les suppressions
+            aggregate = model.objects.aggregate(latest=Max('updated_at'), total=Count('pk'))
+            latest = aggregate['latest']
+            parts.append(f"{label}:{latest.isoformat() if latest else ''}:{aggregate['total']}")
+
+        return quote_etag(hashlib.sha256('|'.join(parts).encode()).hexdigest()[:32])
+
+    def no_store_response(self, request, response):
         # Ajouter des en-têtes no-cache pour toutes les réponses HTML
         if response.get('Content-Type', '').startswith('text/html'):
             response['Cache-Control'] = 'no-cache, no-store, must-revalidate, max-age=0, private'
             response['Pragma'] = 'no-cache'
             response['Expires'] = '0'
             response['X-Accel-Expires'] = '0'  # Pour Nginx
-            
+
             # Ajouter un ETag aléatoire pour forcer le rechargement
             response['ETag'] = f'W/"{time.time()}-{random.randint(1000, 9999)}"'
-            
+
         # Aussi pour JS, CSS, JSON et autres ressources importantes
         elif response.get('Content-Type', '').startswith(('text/css', 'application/javascript', 'application/json')):
             response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
             response['Pragma'] = 'no-cache'
             response['Expires'] = '0'
-            
+
         # Pour les WebSockets, s'assurer qu'ils ne sont pas mis en cache non plus
         if getattr(request, 'is_websocket', False):
             response['Cache-Control'] = 'no-cache, no-store, must-revalidate'
             response['Pragma'] = 'no-cache'
-        
+
         return response
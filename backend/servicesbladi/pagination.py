@@ -0,0 +1,293 @@
+"""
+Seek (keyset) pagination for the admin lists.
+
+Paginator answers every page with an exact COUNT(*) and an OFFSET scan, both
+proportional to the table. A keyset page instead continues from the sort key
+of the last row it showed (WHERE (created_at, id) < (...) ORDER BY ... LIMIT),
+so page 5,000 costs the same as page 1. Totals are shown from the table
+statistics for unfiltered lists and counted up to PAGINATION_COUNT_LIMIT rows
+otherwise.
+
+paginate() returns a KeysetPage, or an OffsetPage wrapping Django's Paginator
+when the list has no stable sort key (search results ranked by relevance) or
+when ADMIN_PAGINATION is 'offset'. Both expose the same attributes to the
+admin/partials/_pagination.html template.
+"""
+import base64
+import json
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+
+CURSOR_PARAMS = ('after', 'before', 'last', 'page')
+
+
+def estimated_count(model, using='default'):
+    """Row count of the model's table from the database statistics, or None"""
+    table = model._meta.db_table
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(
+                "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s", [table]
+            )
+        elif connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+        elif connection.vendor == 'sqlite':
+            # sqlite_stat1 n'existe qu'après un ANALYZE
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table])
+            row = cursor.fetchone()
+            return int(row[0].split()[0]) if row else None
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+def _format_number(value):
+    return f'{value:,}'.replace(',', ' ')
+
+
+class _BasePage:
+    """List behaviour shared by both page types (iteration over the rows of the page)"""
+
+    def __init__(self, object_list, params):
+        self.object_list = object_list
+        self.params = params
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def _querystring(self, **cursor):
+        params = self.params.copy()
+        for key in CURSOR_PARAMS:
+            params.pop(key, None)
+        for key, value in cursor.items():
+            params[key] = value
+        return params.urlencode()
+
+
+class KeysetPage(_BasePage):
+
+    def __init__(self, object_list, params, ordering, has_previous, has_next, total):
+        super().__init__(object_list, params)
+        self.ordering = ordering
+        self._has_previous = has_previous
+        self._has_next = has_next
+        self.total, self.total_is_exact, self.total_is_estimate = total
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_next(self):
+        return self._has_next
+
+    @property
+    def first_querystring(self):
+        return self._querystring()
+
+    @property
+    def previous_querystring(self):
+        if not self.object_list:
+            return self.first_querystring
+        return self._querystring(before=encode_cursor(self.object_list[0], self.ordering))
+
+    @property
+    def next_querystring(self):
+        if not self.object_list:
+            return self.last_querystring
+        return self._querystring(after=encode_cursor(self.object_list[-1], self.ordering))
+
+    @property
+    def last_querystring(self):
+        return self._querystring(last=1)
+
+    @property
+    def label(self):
+        return self.total_display
+
+    @property
+    def total_display(self):
+        if self.total is None:
+            return ''
+        if self.total_is_estimate:
+            return f'≈ {_format_number(self.total)}'
+        if not self.total_is_exact:
+            return f'{_format_number(self.total)}+'
+        return _format_number(self.total)
+
+
+class OffsetPage(_BasePage):
+    """Django Page with the KeysetPage interface"""
+
+    def __init__(self, page, params):
+        super().__init__(page.object_list, params)
+        self.page = page
+        self.number = page.number
+        self.total = page.paginator.count
+        self.total_is_exact = True
+        self.total_is_estimate = False
+
+    def has_previous(self):
+        return self.page.has_previous()
+
+    def has_next(self):
+        return self.page.has_next()
+
+    @property
+    def first_querystring(self):
+        return self._querystring(page=1)
+
+    @property
+    def previous_querystring(self):
+        return self._querystring(page=self.page.previous_page_number())
+
+    @property
+    def next_querystring(self):
+        return self._querystring(page=self.page.next_page_number())
+
+    @property
+    def last_querystring(self):
+        return self._querystring(page=self.page.paginator.num_pages)
+
+    @property
+    def label(self):
+        return f'Page {self.number} / {self.page.paginator.num_pages}'
+
+    @property
+    def total_display(self):
+        return _format_number(self.total)
+
+
+def _parse_ordering(ordering):
+    return [(field.lstrip('-'), field.startswith('-')) for field in ordering]
+
+
+def _sort_value(obj, field):
+    return obj.pk if field in ('pk', 'id') else getattr(obj, field)
+
+
+def encode_cursor(obj, ordering):
+    values = []
+    for field, _ in _parse_ordering(ordering):
+        value = _sort_value(obj, field)
+        values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    """Sort key values of a cursor, or None when it is missing or invalid"""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        fields = _parse_ordering(ordering)
+        if not isinstance(values, list) or len(values) != len(fields):
+            return None
+        return [
+            model._meta.pk.to_python(value) if field in ('pk', 'id')
+            else model._meta.get_field(field).to_python(value)
+            for (field, _), value in zip(fields, values)
+        ]
+    except (ValueError, TypeError, ValidationError, FieldDoesNotExist):
+        return None
+
+
+def seek_filter(ordering, values, forward):
+    """Rows strictly after (forward) or before the sort key values"""
+    fields = _parse_ordering(ordering)
+    condition = Q()
+    for index, (field, descending) in enumerate(fields):
+        lookup = 'lt' if descending == forward else 'gt'
+        equal = {previous: values[position] for position, (previous, _) in enumerate(fields[:index])}
+        condition |= Q(**equal, **{f'{field}__{lookup}': values[index]})
+    return condition
+
+
+def _reverse(ordering):
+    return [field[1:] if field.startswith('-') else f'-{field}' for field in ordering]
+
+
+def page_total(queryset):
+    """(total, exact, estimate) of a list, without counting more than PAGINATION_COUNT_LIMIT rows"""
+    if not queryset.query.where:
+        estimate = estimated_count(queryset.model, queryset.db)
+        if estimate is not None:
+            return estimate, False, True
+    limit = getattr(settings, 'PAGINATION_COUNT_LIMIT', 10000)
+    count = queryset.order_by()[:limit + 1].count()
+    if count > limit:
+        return limit, False, False
+    return count, True, False
+
+
+def keyset_page(queryset, params, per_page, ordering, total=None):
+    model = queryset.model
+    after = decode_cursor(params.get('after'), model, ordering)
+    before = decode_cursor(params.get('before'), model, ordering)
+
+    if after is not None:
+        rows = list(queryset.filter(seek_filter(ordering, after, True)).order_by(*ordering)[:per_page + 1])
+        has_previous, has_next = True, len(rows) > per_page
+        rows = rows[:per_page]
+    elif before is not None or params.get('last'):
+        backwards = queryset.order_by(*_reverse(ordering))
+        if before is not None:
+            backwards = backwards.filter(seek_filter(ordering, before, False))
+        rows = list(backwards[:per_page + 1])
+        has_previous, has_next = len(rows) > per_page, before is not None
+        rows = rows[:per_page][::-1]
+    else:
+        rows = list(queryset.order_by(*ordering)[:per_page + 1])
+        has_previous, has_next = False, len(rows) > per_page
+        rows = rows[:per_page]
+
+    return KeysetPage(rows, params, ordering, has_previous, has_next, total or page_total(queryset))
+
+
+def offset_page(queryset, params, per_page, total=None):
+    paginator = Paginator(queryset, per_page)
+    if total and total[1]:
+        # Nombre exact déjà compté par l'appelant : pas de second COUNT(*)
+        paginator.count = total[0]
+    try:
+        page = paginator.page(params.get('page'))
+    except PageNotAnInteger:
+        # If page is not an integer, deliver first page
+        page = paginator.page(1)
+    except EmptyPage:
+        # If page is out of range, deliver last page of results
+        page = paginator.page(paginator.num_pages)
+    return OffsetPage(page, params)
+
+
+def paginate(queryset, params, per_page, ordering=None, total=None):
+    """
+    Page of queryset for the query string params (request.GET).
+
+    ordering is the unique sort key of the list, ending with the primary
+    key (e.g. ('-created_at', '-id')); without it, or when ADMIN_PAGINATION
+    is 'offset', the page number pagination is used. total is the
+    (total, exact, estimate) of the list when the caller already counted it.
+    """
+    if ordering is None or getattr(settings, 'ADMIN_PAGINATION', 'keyset') == 'offset':
+        return offset_page(queryset, params, per_page, total)
+    return keyset_page(queryset, params, per_page, ordering, total)
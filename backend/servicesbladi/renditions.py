@@ -0,0 +1,259 @@
+"""
+Thumbnails ("renditions") of documents and profile pictures.
+
+Lists show a small JPEG instead of the original file: a rendition is
+generated for every size of RENDITION_SIZES, by Pillow for images and from
+the first page of PDFs when pdftoppm (poppler) is installed. Renditions are
+stored in the default storage under renditions/<size>/<aa>/<key>.jpg, the
+key being a hash of the source file name: blob names already are content
+hashes, so identical documents share their thumbnails.
+
+Generation never runs in the request: a new file is queued once its row is
+committed (Document.save, Utilisateur.save) and a list meeting a file
+without rendition queues it too, showing the usual icon meanwhile. Jobs
+run in a per-process pool of RENDITION_WORKERS threads (Pillow releases the
+GIL while decoding and resizing). Whether a rendition exists is remembered
+in the cache, so a list of 50 documents costs 50 cache reads and no file
+access. `manage.py generate_renditions` renders the existing files.
+
+Profile pictures are public and their renditions are linked from
+MEDIA_URL. Renditions of documents show their content (passport and ID
+scans): they are sent by a view checking the permissions of the document,
+with delivery.serve_file() and rendition_file().
+"""
+import hashlib
+import io
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import storages
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from .delivery import StoredFile
+
+logger = logging.getLogger(__name__)
+
+RENDITION_PREFIX = 'renditions/'
+
+# Types ouverts par Pillow ; les PDF dépendent de pdftoppm
+IMAGE_TYPES = {
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp', 'image/bmp', 'image/tiff',
+}
+PDF_TYPE = 'application/pdf'
+
+# Valeurs du cache : rendu disponible, ou échec (fichier illisible, rendu trop long...)
+READY = 'ready'
+FAILED = 'failed'
+
+_executor = None
+_executor_lock = threading.Lock()
+_in_flight = set()
+
+
+def _sizes():
+    return getattr(settings, 'RENDITION_SIZES', {'small': 160, 'medium': 480})
+
+
+def _rendition_storage():
+    return storages['default']
+
+
+def pdf_renderer():
+    """Path of pdftoppm, or None when PDF previews are not available"""
+    return shutil.which(getattr(settings, 'RENDITION_PDFTOPPM', 'pdftoppm'))
+
+
+def is_supported(mime_type):
+    if mime_type in IMAGE_TYPES:
+        return True
+    return mime_type == PDF_TYPE and pdf_renderer() is not None
+
+
+def rendition_name(source_name, size='small'):
+    key = hashlib.sha256(source_name.encode()).hexdigest()
+    return f'{RENDITION_PREFIX}{size}/{key[:2]}/{key}.jpg'
+
+
+def _cache_key(source_name):
+    return 'rendition:' + hashlib.sha256(source_name.encode()).hexdigest()
+
+
+def rendition_ready(field_file, mime_type, size='small'):
+    """
+    Whether the rendition of a stored file exists: False while it does not
+    (generation is then queued) or when the file cannot be previewed.
+    """
+    name = getattr(field_file, 'name', None)
+    if not name or size not in _sizes() or not is_supported(mime_type):
+        return False
+
+    state = cache.get(_cache_key(name))
+    if state is None:
+        # Inconnu du cache (premier affichage, cache vidé) : le disque fait foi
+        if _rendition_storage().exists(rendition_name(name, size)):
+            state = READY
+            cache.set(_cache_key(name), READY, getattr(settings, 'RENDITION_CACHE_TIMEOUT', 24 * 3600))
+        else:
+            submit(field_file.storage, name, mime_type)
+    return state == READY
+
+
+def thumbnail_url(field_file, mime_type, size='small'):
+    """Public URL (MEDIA_URL) of the rendition of a public file, None until it exists"""
+    if not rendition_ready(field_file, mime_type, size):
+        return None
+    return _rendition_storage().url(rendition_name(field_file.name, size))
+
+
+def rendition_file(field_file, size='small'):
+    """The rendition of a stored file, to send with delivery.serve_file()"""
+    return StoredFile(_rendition_storage(), rendition_name(field_file.name, size))
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'RENDITION_WORKERS', 2),
+                thread_name_prefix='rendition',
+            )
+        return _executor
+
+
+def submit(storage, name, mime_type, force=False):
+    """Queue the renditions of a file (once per file at a time in this process)"""
+    if not name or not is_supported(mime_type):
+        return
+    if getattr(settings, 'RENDITION_WORKERS', 2) <= 0:
+        # Pas de pool (tests, scripts) : rendu immédiat
+        generate(storage, name, mime_type, force=force)
+        return
+    with _executor_lock:
+        if name in _in_flight:
+            return
+        _in_flight.add(name)
+    try:
+        _get_executor().submit(_run, storage, name, mime_type, force)
+    except RuntimeError:
+        # Pool arrêté (fin du processus)
+        _in_flight.discard(name)
+
+
+def _run(storage, name, mime_type, force):
+    try:
+        generate(storage, name, mime_type, force=force)
+    except Exception:
+        logger.exception('Rendition of %s failed', name)
+    finally:
+        with _executor_lock:
+            _in_flight.discard(name)
+
+
+def generate_on_commit(field_file, mime_type):
+    """Queue the renditions of a newly saved file once the transaction commits"""
+    storage, name = field_file.storage, field_file.name
+    # force : un nom réutilisé après suppression ne doit pas garder l'ancienne vignette
+    transaction.on_commit(lambda: submit(storage, name, mime_type, force=True))
+
+
+def _open_source(storage, name, mime_type, max_size):
+    """Pillow image of the file, or of the first page of a PDF"""
+    if mime_type == PDF_TYPE:
+        return _render_pdf_page(storage.path(name), max_size)
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        # JPEG : décodage directement à une échelle réduite (1/2 à 1/8), bien plus rapide
+        image.draft('RGB', (max_size, max_size))
+        image.load()
+    return image
+
+
+def _render_pdf_page(path, max_size):
+    renderer = pdf_renderer()
+    if renderer is None:
+        raise OSError('pdftoppm is not installed')
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, 'page')
+        subprocess.run(
+            [renderer, '-f', '1', '-l', '1', '-singlefile', '-jpeg',
+             '-scale-to', str(max_size), path, output],
+            check=True, capture_output=True,
+            timeout=getattr(settings, 'RENDITION_PDF_TIMEOUT', 30),
+        )
+        with Image.open(output + '.jpg') as page:
+            page.load()
+            return page.copy()
+
+
+def _flatten(image):
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # Transparence posée sur du blanc (JPEG n'a pas de canal alpha)
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _write(storage, name, data):
+    # Écriture dans un fichier temporaire puis renommage : une vignette n'est
+    # jamais servie à moitié écrite
+    path = storage.path(name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    descriptor, temp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    try:
+        with os.fdopen(descriptor, 'wb') as output:
+            output.write(data)
+        os.replace(temp, path)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+
+def generate(storage, name, mime_type, force=False):
+    """
+    Render every size of a stored file. Returns True when the renditions
+    exist afterwards; a file that cannot be rendered is remembered as failed.
+    """
+    target = _rendition_storage()
+    sizes = sorted(_sizes().items(), key=lambda item: item[1], reverse=True)
+    if not force and all(target.exists(rendition_name(name, size)) for size, _ in sizes):
+        cache.set(_cache_key(name), READY, getattr(settings, 'RENDITION_CACHE_TIMEOUT', 24 * 3600))
+        return True
+
+    try:
+        image = _flatten(_open_source(storage, name, mime_type, sizes[0][1]))
+        quality = getattr(settings, 'RENDITION_QUALITY', 80)
+        # Du plus grand au plus petit : chaque taille est réduite depuis la précédente
+        for size, pixels in sizes:
+            image.thumbnail((pixels, pixels), Image.LANCZOS)
+            output = io.BytesIO()
+            image.save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+            _write(target, rendition_name(name, size), output.getvalue())
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError,
+            subprocess.SubprocessError) as e:
+        logger.warning('Cannot render %s: %s', name, e)
+        cache.set(_cache_key(name), FAILED, getattr(settings, 'RENDITION_FAILURE_TIMEOUT', 24 * 3600))
+        return False
+
+    cache.set(_cache_key(name), READY, getattr(settings, 'RENDITION_CACHE_TIMEOUT', 24 * 3600))
+    return True
+
+
+def delete_renditions(name):
+    """Remove the renditions of a file that no longer exists"""
+    target = _rendition_storage()
+    for size in _sizes():
+        target.delete(rendition_name(name, size))
+    cache.delete(_cache_key(name))
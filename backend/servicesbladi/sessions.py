@@ -0,0 +1,119 @@
+"""
+Session engine: database store behind a shared cache, written only on change.
+
+Enabled with SESSION_ENGINE = 'servicesbladi.sessions' (SESSION_MODE='cached').
+"""
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.cache import caches
+from django.utils import timezone
+
+KEY_PREFIX = 'servicesbladi.sessions.'
+
+
+class SessionStore(DBStore):
+    """
+    Database sessions read through the SESSION_CACHE_ALIAS cache.
+
+    - Reads hit the cache; the database is only read on a cache miss.
+    - save() compares the session with what was last read or written and
+      skips the UPDATE when nothing changed, even with SESSION_SAVE_EVERY_REQUEST.
+    - The expiry date is pushed forward lazily: an unchanged session is only
+      written again once its remaining lifetime drops below
+      SESSION_REFRESH_THRESHOLD seconds.
+    - clear_expired() (manage.py clearsessions) deletes in batches of
+      SESSION_CLEANUP_BATCH_SIZE rows so it never locks the table for long.
+    """
+
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        self._cache = caches[settings.SESSION_CACHE_ALIAS]
+        # État tel qu'il est stocké (données sérialisées et date d'expiration)
+        self._stored_state = None
+        self._stored_expiry = None
+        super().__init__(session_key)
+
+    @property
+    def cache_key(self):
+        return self.cache_key_prefix + self._get_or_create_session_key()
+
+    def _state(self, data):
+        return self.serializer().dumps(data)
+
+    def _remember(self, data, expiry):
+        self._stored_state = self._state(data)
+        self._stored_expiry = expiry
+
+    def _cache_session(self, data, expiry):
+        timeout = (expiry - timezone.now()).total_seconds()
+        if timeout > 0:
+            self._cache.set(self.cache_key, {'data': data, 'expiry': expiry}, timeout)
+
+    def load(self):
+        cached = self._cache.get(self.cache_key)
+        if cached is not None and cached['expiry'] > timezone.now():
+            self._remember(cached['data'], cached['expiry'])
+            return cached['data']
+
+        session = self._get_session_from_db()
+        if session is None:
+            self._stored_state = None
+            return {}
+
+        data = self.decode(session.session_data)
+        self._remember(data, session.expire_date)
+        self._cache_session(data, session.expire_date)
+        return data
+
+    def needs_write(self):
+        """True when the session changed or its stored expiry is due for a refresh"""
+        data = self._get_session()
+        if self._stored_state is None or self._state(data) != self._stored_state:
+            return True
+
+        threshold = getattr(settings, 'SESSION_REFRESH_THRESHOLD', settings.SESSION_COOKIE_AGE // 2)
+        # Une expiration personnalisée plus courte que le seuil ne doit pas forcer une écriture à chaque requête
+        threshold = min(threshold, self.get_expiry_age() / 2)
+        remaining = (self._stored_expiry - timezone.now()).total_seconds()
+        return remaining < threshold
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        if not must_create and not self.needs_write():
+            return
+
+        super().save(must_create=must_create)
+        data = self._get_session(no_load=must_create)
+        expiry = self.get_expiry_date()
+        self._remember(data, expiry)
+        self._cache_session(data, expiry)
+
+    def delete(self, session_key=None):
+        super().delete(session_key)
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self._cache.delete(self.cache_key_prefix + session_key)
+
+    def flush(self):
+        self.clear()
+        self.delete()
+        self._session_key = None
+        self._stored_state = None
+
+    @classmethod
+    def clear_expired(cls):
+        model = cls.get_model_class()
+        batch_size = getattr(settings, 'SESSION_CLEANUP_BATCH_SIZE', 1000)
+        now = timezone.now()
+        while True:
+            keys = list(
+                model.objects.filter(expire_date__lt=now)
+                .values_list('session_key', flat=True)[:batch_size]
+            )
+            if not keys:
+                break
+            model.objects.filter(session_key__in=keys).delete()
@@ -163,8 +163,14 @@ STATICFILES_DIRS = [
 ]
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
-# Ajouter versioning aux fichiers statiques pour éviter les problèmes de cache
-STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    # Ajouter versioning aux fichiers statiques pour éviter les problèmes de cache
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'},
+    # Stockage par contenu des documents et fichiers de ressources (servicesbladi.storage) :
+    # un contenu identique n'est stocké qu'une fois, sous MEDIA_ROOT/blobs/
+    'blobs': {'BACKEND': 'servicesbladi.storage.ContentAddressedStorage'},
+}
 
 # Media files
 MEDIA_URL = '/media/'
@@ -175,6 +181,9 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Les index partiels (lignes non lues) sont ignorés par MySQL, qui ne les supporte pas
+SILENCED_SYSTEM_CHECKS = ['models.W037']
+
 # Crispy Forms settings
 CRISPY_ALLOWED_TEMPLATE_PACKS = 'bootstrap5'
 CRISPY_TEMPLATE_PACK = 'bootstrap5'
@@ -224,24 +233,226 @@ AUTHENTICATION_BACKENDS = [
 
 # Django Channels
 ASGI_APPLICATION = 'servicesbladi.asgi.application'
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer',
-        'CONFIG': {
-            'capacity': 1500,  # default is 100
+# CHANNEL_LAYER_BACKEND choisit la couche de canaux :
+# - 'memory' : un seul processus (développement), group_send ne sort pas du processus
+# - 'redis'  : channels_redis, obligatoire dès qu'il y a plusieurs workers ASGI
+# - 'file'   : répertoire partagé entre processus locaux (tests, benchmark), sans Redis
+CHANNEL_LAYER_BACKEND = os.environ.get('CHANNEL_LAYER_BACKEND', 'memory')
+
+if CHANNEL_LAYER_BACKEND == 'redis':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [os.environ.get('CHANNEL_REDIS_URL', 'redis://127.0.0.1:6379/1')],
+                'capacity': 1500,
+                'expiry': 60,
+                'group_expiry': 86400,
+            },
         },
-    },
-}
+    }
+elif CHANNEL_LAYER_BACKEND == 'file':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'messaging.layers.FileChannelLayer',
+            'CONFIG': {
+                'path': os.environ.get('CHANNEL_LAYER_PATH', os.path.join(BASE_DIR, 'channel_layer')),
+                'capacity': 1500,
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+            'CONFIG': {
+                'capacity': 1500,  # default is 100
+            },
+        },
+    }
+
+# File d'écriture différée du chat (messaging.writebehind) : les messages reçus par
+# les websockets sont insérés par lots, dès BATCH_SIZE messages ou après INTERVAL secondes
+CHAT_WRITE_BEHIND_BATCH_SIZE = 100
+CHAT_WRITE_BEHIND_INTERVAL = 0.05
 
 # Paramètres de session et de cache
-SESSION_ENGINE = 'django.contrib.sessions.backends.db'  # Utiliser la base de données pour les sessions
+# SESSION_MODE 'cached' (défaut) : base de données derrière le cache 'sessions', écriture
+# uniquement si la session change (servicesbladi.sessions) ; 'db' : ancien comportement
+SESSION_MODE = os.environ.get('SESSION_MODE', 'cached')
+if SESSION_MODE == 'db':
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'  # Utiliser la base de données pour les sessions
+else:
+    SESSION_ENGINE = 'servicesbladi.sessions'
+SESSION_CACHE_ALIAS = 'sessions'
 SESSION_COOKIE_AGE = 86400  # Durée de vie de la session (en secondes) - 1 jour
-SESSION_SAVE_EVERY_REQUEST = True  # Enregistrer la session à chaque requête
+SESSION_SAVE_EVERY_REQUEST = True  # Le moteur 'cached' n'écrit que si la session a changé
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True  # Expirer la session à la fermeture du navigateur
+# Une session inchangée n'est réécrite (expiration repoussée) que sous ce temps restant
+SESSION_REFRESH_THRESHOLD = SESSION_COOKIE_AGE // 2
+# manage.py clearsessions supprime les sessions expirées par lots
+SESSION_CLEANUP_BATCH_SIZE = 1000
+
+# Contrôle du cache HTTP (servicesbladi.middleware.CacheControlMiddleware)
+# 'etag': ETags forts + réponses 304
+# 'no-store': ancien comportement, aucune réponse n'est mise en cache
+CACHE_CONTROL_MODE = os.environ.get('CACHE_CONTROL_MODE', 'etag')
+# Pages publiques validées à partir du dernier updated_at des modèles (avant la vue).
+# Chaque préfixe liste TOUS les modèles lus par ses pages (ils doivent avoir un
+# champ updated_at). Pas de page avec formulaire (jeton CSRF) : /services/,
+# /services/category/... et /services/detail/... affichent index.html et son
+# formulaire de contact, /services/contact/ ses messages.
+CACHE_CONTROL_WATERMARKS = {
+    '/services/tourism/': ['services.TourismService'],
+    '/services/administrative/': ['services.AdministrativeService'],
+    '/services/investment/': ['services.InvestmentService'],
+    '/services/real-estate/': ['services.RealEstateService'],
+    '/services/fiscal/': ['services.FiscalService'],
+    '/resources/faq/': ['resources.FAQ'],
+}
+# Version exposée aux templates (cache_version) ; à changer à chaque déploiement
+CACHE_VERSION = os.environ.get('CACHE_VERSION', '1.0')
+
+# Durée de vie du résumé des notifications en cache (invalidé par signaux)
+NOTIFICATION_SUMMARY_TIMEOUT = 300
+
+# Notifications envoyées à une audience (custom_requests.notifications.dispatch_notifications) :
+# 'thread' (défaut) écrit les lots hors de la requête, 'sync' dans la requête (scripts, tests)
+NOTIFICATION_DISPATCH = os.environ.get('NOTIFICATION_DISPATCH', 'thread')
+NOTIFICATION_BATCH_SIZE = 500
+
+# Rétention (custom_requests.retention, `manage.py archive_old_data`) : notifications lues
+# et messages des demandes clôturées déplacés vers les tables d'archive après ces délais
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', 90))
+MESSAGE_RETENTION_DAYS = int(os.environ.get('MESSAGE_RETENTION_DAYS', 180))
+RETENTION_BATCH_SIZE = 1000
+
+# Prise de rendez-vous (custom_requests.scheduling) : pas des créneaux proposés (minutes),
+# durée maximale d'un rendez-vous (minutes) et période maximale d'une recherche de créneaux (jours)
+SCHEDULING_SLOT_STEP = 30
+SCHEDULING_MAX_DURATION = 8 * 60
+SCHEDULING_MAX_DAYS = 92
+
+# Durée de vie de l'instantané des statistiques d'administration (custom_requests.stats)
+ADMIN_STATS_TIMEOUT = 60
+# Compteurs journaliers (DailyStat) : 'memory' (tampon par processus écrit par un thread
+# toutes les DAILY_STAT_FLUSH_INTERVAL secondes, et dès DAILY_STAT_FLUSH_SIZE créations)
+# ou 'off' (UPDATE de la ligne du jour à chaque création)
+DAILY_STAT_BUFFER = os.environ.get('DAILY_STAT_BUFFER', 'memory')
+DAILY_STAT_FLUSH_INTERVAL = 10
+DAILY_STAT_FLUSH_SIZE = 1000
+
+# Pagination des listes d'administration (servicesbladi.pagination) : 'keyset'
+# (curseurs, coût constant quelle que soit la page) ou 'offset' (numéros de page)
+ADMIN_PAGINATION = os.environ.get('ADMIN_PAGINATION', 'keyset')
+# Au-delà de ce nombre de lignes, le total d'une liste filtrée s'affiche « 10 000+ »
+PAGINATION_COUNT_LIMIT = 10000
+
+# Téléversements reprenables (custom_requests.uploads) : fichiers en cours sous
+# MEDIA_ROOT, taille des morceaux, taille maximale d'un fichier, sessions ouvertes
+# par utilisateur, durée de vie d'une session inactive et délai avant de supprimer
+# un fichier sans session (secondes)
+UPLOAD_TEMP_DIR = os.path.join(MEDIA_ROOT, 'uploads', 'tmp')
+UPLOAD_CHUNK_SIZE = 2 * 1024 * 1024
+UPLOAD_MAX_SIZE = int(os.environ.get('UPLOAD_MAX_SIZE', 200 * 1024 * 1024))
+UPLOAD_MAX_PENDING = 20
+UPLOAD_SESSION_TTL = 24 * 3600
+UPLOAD_ORPHAN_GRACE = 3600
+
+# Gestionnaires de téléversement : empreinte SHA-256, taille et type MIME réel
+# calculés pendant la réception (servicesbladi.upload_handlers)
+FILE_UPLOAD_HANDLERS = [
+    'servicesbladi.upload_handlers.HashingMemoryFileUploadHandler',
+    'servicesbladi.upload_handlers.HashingTemporaryFileUploadHandler',
+]
 
-# Paramètres de cache - Désactiver autant que possible
-CACHES = {
-    'default': {
+# Âge minimal (secondes) d'un blob sans référence avant que gc_blobs ne le supprime
+BLOB_GC_GRACE = 3600
+
+# Envoi des documents et fichiers de ressources (servicesbladi.delivery), une fois
+# les droits vérifiés par Django :
+# - 'python'   : envoi par Django (Range, If-Range, sendfile() via wsgi.file_wrapper)
+# - 'nginx'    : X-Accel-Redirect vers FILE_DELIVERY_ACCEL_PREFIX (location internal
+#                de nginx pointant sur MEDIA_ROOT)
+# - 'sendfile' : X-Sendfile (Apache mod_xsendfile, lighttpd)
+FILE_DELIVERY = os.environ.get('FILE_DELIVERY', 'python')
+FILE_DELIVERY_ACCEL_PREFIX = os.environ.get('FILE_DELIVERY_ACCEL_PREFIX', '/protected-media/')
+
+# Compteurs de vues et de téléchargements des ressources (resources.counters) :
+# 'memory' (tampon par processus), 'cache' (cache partagé, Redis) ou 'off' (UPDATE à
+# chaque visite). Le tampon est écrit par un thread toutes les
+# RESOURCE_COUNTER_FLUSH_INTERVAL secondes (c'est au plus ce qu'un processus tué
+# perd en mode 'memory'), et dès RESOURCE_COUNTER_FLUSH_SIZE visites
+RESOURCE_COUNTER_BUFFER = os.environ.get('RESOURCE_COUNTER_BUFFER', 'memory')
+RESOURCE_COUNTER_FLUSH_INTERVAL = 10
+RESOURCE_COUNTER_FLUSH_SIZE = 1000
+
+# Vignettes des documents et photos de profil (servicesbladi.renditions) : tailles
+# générées (côté le plus long, en pixels), threads de rendu par processus (0 : rendu
+# immédiat, sans pool), qualité JPEG et programme de rendu de la première page des PDF
+RENDITION_SIZES = {'small': 160, 'medium': 480}
+RENDITION_WORKERS = int(os.environ.get('RENDITION_WORKERS', 2))
+RENDITION_QUALITY = 80
+RENDITION_PDFTOPPM = os.environ.get('RENDITION_PDFTOPPM', 'pdftoppm')
+RENDITION_PDF_TIMEOUT = 30
+# Durée (secondes) pendant laquelle le cache retient qu'une vignette existe / a échoué
+RENDITION_CACHE_TIMEOUT = 24 * 3600
+RENDITION_FAILURE_TIMEOUT = 24 * 3600
+
+# Paramètres de cache
+# CACHES['default'] est un cache à deux niveaux (servicesbladi.cache.TieredCache) :
+# un LRU par processus devant l'alias 'shared'. CACHE_BACKEND choisit ce dernier :
+# - 'file'      : répertoire local partagé entre processus (défaut, développement)
+# - 'redis'     : Redis (CACHE_REDIS_URL, accepte unix:///chemin/redis.sock)
+# - 'memcached' : pymemcache (CACHE_MEMCACHED_LOCATION, accepte unix:/chemin/memcached.sock)
+# - 'dummy'     : ancien comportement, aucun cache
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'file')
+# Durée pendant laquelle un processus peut servir une valeur de son LRU ; borne le
+# délai avant qu'une invalidation faite par un autre processus soit visible
+CACHE_LOCAL_TIMEOUT = 5
+CACHE_LOCAL_MAX_ENTRIES = 1000
+
+if CACHE_BACKEND == 'redis':
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('CACHE_REDIS_URL', 'redis://127.0.0.1:6379/2'),
+    }
+elif CACHE_BACKEND == 'memcached':
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': os.environ.get('CACHE_MEMCACHED_LOCATION', '127.0.0.1:11211'),
+    }
+elif CACHE_BACKEND == 'dummy':
+    SHARED_CACHE = {
         'BACKEND': 'django.core.cache.backends.dummy.DummyCache',  # Ne pas mettre en cache
     }
+else:
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CACHE_FILE_LOCATION', os.path.join(BASE_DIR, 'cache', 'shared')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'servicesbladi.cache.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'LOCAL_TIMEOUT': 0 if CACHE_BACKEND == 'dummy' else CACHE_LOCAL_TIMEOUT,
+            'LOCAL_MAX_ENTRIES': CACHE_LOCAL_MAX_ENTRIES,
+        },
+    },
+    'shared': SHARED_CACHE,
+    # Cache des sessions partagé entre les processus de la machine ; en déploiement
+    # multi-serveurs, le remplacer par Redis ou Memcached
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('SESSION_CACHE_LOCATION', os.path.join(BASE_DIR, 'cache', 'sessions')),
+        'OPTIONS': {
+            'MAX_ENTRIES': 20000,
+        },
+    },
 }
@@ -0,0 +1,247 @@
+"""
+Content-addressed storage for uploaded documents and resource files.
+
+ContentAddressedStorage (STORAGES['blobs']) stores each distinct content
+once, under blobs/<aa>/<bb>/<sha256><ext>, whatever the name it is saved
+with. Saving content that is already stored writes nothing and returns the
+existing name, so a scan uploaded to ten requests gives ten Document rows
+and one file. The hash comes from the upload handlers (upload_handlers.py),
+so deduplication costs no extra read of the upload.
+
+Every stored file has a Blob row counting the model rows referencing it
+(BLOB_REFERENCES). The counts are kept by the post_init / post_save /
+post_delete receivers of these models, and `manage.py gc_blobs` deletes
+the blobs nobody references any more, with their thumbnails, once they are
+older than BLOB_GC_GRACE seconds (an upload may have stored a blob and not
+saved its row yet).
+"""
+import os
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, storages
+from django.db.models import Count, F
+from django.utils import timezone
+
+from .renditions import delete_renditions
+from .upload_handlers import file_metadata
+
+BLOB_PREFIX = 'blobs/'
+
+# Champs de fichier stockés dans le stockage par contenu : (modèle, champ)
+BLOB_REFERENCES = (
+    ('custom_requests.Document', 'file'),
+    ('resources.ResourceFile', 'file'),
+)
+
+
+def blob_storage():
+    """Storage of the FileFields listed in BLOB_REFERENCES (callable: not frozen in migrations)"""
+    return storages['blobs']
+
+
+def _blob_model():
+    return apps.get_model('custom_requests', 'Blob')
+
+
+def is_blob(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+def blob_name(sha256, original_name):
+    # L'extension est conservée pour que le serveur web devine le type des fichiers servis
+    extension = os.path.splitext(original_name or '')[1].lower()
+    if len(extension) > 10 or not extension[1:].isalnum():
+        extension = ''
+    return f'{BLOB_PREFIX}{sha256[:2]}/{sha256[2:4]}/{sha256}{extension}'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage naming files after their SHA-256, each content stored once"""
+
+    def _save(self, name, content):
+        metadata = file_metadata(content)
+        name = blob_name(metadata['sha256'], name)
+        Blob = _blob_model()
+
+        if self.exists(name):
+            # Déjà stocké : rien n'est écrit, le blob est seulement marqué comme récent
+            if Blob.objects.filter(name=name, ref_count__gte=0).update(updated_at=timezone.now()):
+                return name
+            _, created = Blob.objects.get_or_create(name=name, defaults={
+                'sha256': metadata['sha256'], 'size': metadata['size'],
+            })
+            if created:
+                return name
+            # Blob en cours de suppression par gc_blobs (ref_count = -1) : le contenu est
+            # stocké à nouveau, sous un autre nom si le fichier n'est pas encore effacé
+
+        # De même, deux envois identiques simultanés : FileSystemStorage choisit un
+        # autre nom pour le second et le contenu est simplement stocké deux fois
+        name = super()._save(name, content)
+        Blob.objects.update_or_create(name=name, defaults={
+            'sha256': metadata['sha256'], 'size': metadata['size'], 'ref_count': 0,
+        })
+        return name
+
+
+def _sha256_of(name):
+    return os.path.splitext(os.path.basename(name))[0][:64]
+
+
+def _field_name(instance, field_name='file'):
+    # Lu dans __dict__ : ne déclenche pas de requête pour un champ différé
+    value = instance.__dict__.get(field_name)
+    return getattr(value, 'name', value) or ''
+
+
+def add_reference(name):
+    if is_blob(name):
+        Blob = _blob_model()
+        updated = Blob.objects.filter(name=name).update(
+            ref_count=F('ref_count') + 1, updated_at=timezone.now()
+        )
+        if not updated:
+            Blob.objects.create(name=name, sha256=_sha256_of(name), ref_count=1)
+
+
+def release_reference(name):
+    if is_blob(name):
+        _blob_model().objects.filter(name=name, ref_count__gt=0).update(
+            ref_count=F('ref_count') - 1, updated_at=timezone.now()
+        )
+
+
+def remember_file(instance, field_name='file'):
+    """post_init: name of the stored file, to detect a replaced file on save"""
+    instance._stored_file_name = _field_name(instance, field_name)
+
+
+def file_saved(instance, created, field_name='file'):
+    """post_save: count the reference of a new row or of a replaced file"""
+    name = getattr(instance, field_name).name or ''
+    previous = '' if created else getattr(instance, '_stored_file_name', name)
+    if name != previous:
+        add_reference(name)
+        release_reference(previous)
+    instance._stored_file_name = name
+
+
+def file_deleted(instance, field_name='file'):
+    """post_delete: release the reference of a deleted row"""
+    release_reference(_field_name(instance, field_name) or getattr(instance, '_stored_file_name', ''))
+
+
+def reference_counts():
+    """{blob name: rows referencing it}, counted from the BLOB_REFERENCES tables"""
+    counts = {}
+    for label, field_name in BLOB_REFERENCES:
+        model = apps.get_model(label)
+        rows = (
+            model.objects.filter(**{f'{field_name}__startswith': BLOB_PREFIX})
+            .order_by().values_list(field_name).annotate(total=Count('pk'))
+        )
+        for name, total in rows:
+            counts[name] = counts.get(name, 0) + total
+    return counts
+
+
+def referenced(names):
+    """Subset of names still referenced by a row"""
+    names = list(names)
+    found = set()
+    for label, field_name in BLOB_REFERENCES:
+        model = apps.get_model(label)
+        found.update(model.objects.filter(**{f'{field_name}__in': names}).values_list(field_name, flat=True))
+    return found
+
+
+def reference_counts_for(name):
+    """Rows referencing one blob"""
+    total = 0
+    for label, field_name in BLOB_REFERENCES:
+        total += apps.get_model(label).objects.filter(**{field_name: name}).count()
+    return total
+
+
+def collect_garbage(dry_run=False, batch_size=500):
+    """
+    Delete the files and rows of the blobs without references older than
+    BLOB_GC_GRACE seconds. A blob still referenced despite a zero count
+    (counter drift) gets its count fixed instead. Returns (deleted, bytes freed).
+    """
+    Blob = _blob_model()
+    storage = blob_storage()
+    cutoff = timezone.now() - timedelta(seconds=getattr(settings, 'BLOB_GC_GRACE', 3600))
+    deleted = freed = 0
+    last_pk = 0
+
+    while True:
+        batch = list(
+            Blob.objects.filter(ref_count__lte=0, updated_at__lt=cutoff, pk__gt=last_pk)
+            .order_by('pk')[:batch_size]
+        )
+        if not batch:
+            return deleted, freed
+        last_pk = batch[-1].pk
+
+        still_used = referenced(blob.name for blob in batch)
+        for blob in batch:
+            if blob.name in still_used:
+                if not dry_run:
+                    Blob.objects.filter(pk=blob.pk).update(
+                        ref_count=reference_counts_for(blob.name)
+                    )
+                continue
+            if not dry_run:
+                # Le blob est d'abord réservé (ref_count = -1) : un envoi du même contenu
+                # ne le réutilise plus, et un blob réutilisé entre-temps n'est pas réservé
+                claimed = Blob.objects.filter(
+                    pk=blob.pk, ref_count__lte=0, updated_at__lt=cutoff
+                ).update(ref_count=-1)
+                if not claimed:
+                    continue
+                storage.delete(blob.name)
+                delete_renditions(blob.name)
+                Blob.objects.filter(pk=blob.pk).delete()
+            deleted += 1
+            freed += blob.size or 0
+
+
+def recount_references(dry_run=False):
+    """Reset every Blob.ref_count from the referencing tables. Returns the number of counts fixed."""
+    Blob = _blob_model()
+    counts = reference_counts()
+    fixed = 0
+    for pk, name, ref_count in Blob.objects.values_list('pk', 'name', 'ref_count').iterator():
+        actual = counts.pop(name, 0)
+        if actual != ref_count:
+            fixed += 1
+            if not dry_run:
+                Blob.objects.filter(pk=pk).update(ref_count=actual)
+    # Fichiers référencés sans ligne Blob
+    for name, actual in counts.items():
+        fixed += 1
+        if not dry_run:
+            Blob.objects.create(name=name, sha256=_sha256_of(name), ref_count=actual)
+    return fixed
+
+
+def orphan_files(grace=None):
+    """Blob files on disk without a Blob row, older than the grace period"""
+    Blob = _blob_model()
+    storage = blob_storage()
+    root = storage.path(BLOB_PREFIX.rstrip('/'))
+    if grace is None:
+        grace = getattr(settings, 'BLOB_GC_GRACE', 3600)
+    cutoff = timezone.now().timestamp() - grace
+    for directory, _, files in os.walk(root):
+        names = {
+            os.path.relpath(os.path.join(directory, file), storage.location).replace(os.sep, '/'): file
+            for file in files
+        }
+        known = set(Blob.objects.filter(name__in=list(names)).values_list('name', flat=True))
+        for name in names:
+            if name not in known and os.path.getmtime(storage.path(name)) < cutoff:
+                yield name
@@ -0,0 +1,218 @@
+"""
+Upload handlers computing the metadata of uploaded files while they stream in.
+
+FILE_UPLOAD_HANDLERS uses the hashing variants of Django's memory and
+temporary file handlers: every chunk the parser hands over also feeds a
+SHA-256, a byte counter and the first SNIFF_LENGTH bytes, from which the
+real MIME type is detected (the Content-Type sent by the browser is only
+derived from the file extension). The result is attached to the uploaded
+file as `upload_metadata`.
+
+Models storing files call apply_file_metadata() when saving a new file, so
+Document and ResourceFile get their mime_type, sha256 and sizes without the
+file being read again. Files that did not go through these handlers (the
+chunked upload API, scripts) are read once by file_metadata().
+"""
+import hashlib
+import mimetypes
+import os
+
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+SNIFF_LENGTH = 2048
+
+# (décalage, signature, type MIME) ; la première correspondance l'emporte
+MAGIC_NUMBERS = (
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (0, b'\xff\xd8\xff', 'image/jpeg'),
+    (0, b'GIF87a', 'image/gif'),
+    (0, b'GIF89a', 'image/gif'),
+    (0, b'II*\x00', 'image/tiff'),
+    (0, b'MM\x00*', 'image/tiff'),
+    (0, b'{\\rtf', 'application/rtf'),
+    (0, b'%!PS', 'application/postscript'),
+    (0, b'\x1f\x8b', 'application/gzip'),
+    (0, b'7z\xbc\xaf\x27\x1c', 'application/x-7z-compressed'),
+    (0, b'Rar!\x1a\x07', 'application/vnd.rar'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'ID3', 'audio/mpeg'),
+    (0, b'fLaC', 'audio/flac'),
+    (0, b'\x1aE\xdf\xa3', 'video/webm'),
+)
+
+# Marques du conteneur ISO (ftyp)
+FTYP_BRANDS = {
+    b'heic': 'image/heic', b'heix': 'image/heic', b'mif1': 'image/heif', b'msf1': 'image/heif',
+    b'avif': 'image/avif', b'qt  ': 'video/quicktime', b'M4A ': 'audio/mp4',
+}
+
+OLE_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+OLE_TYPES = {
+    '.doc': 'application/msword',
+    '.xls': 'application/vnd.ms-excel',
+    '.ppt': 'application/vnd.ms-powerpoint',
+    '.msg': 'application/vnd.ms-outlook',
+}
+OOXML_TYPES = {
+    'word/': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'xl/': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'ppt/': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+}
+
+
+def _extension(name):
+    return os.path.splitext(name or '')[1].lower()
+
+
+def _sniff_zip(head, name):
+    # Premier membre de l'archive (en-tête local) : ODF commence par « mimetype »
+    # stocké sans compression, OOXML par [Content_Types].xml ou un dossier word/, xl/...
+    name_length = int.from_bytes(head[26:28], 'little')
+    extra_length = int.from_bytes(head[28:30], 'little')
+    first_member = head[30:30 + name_length].decode('cp437', 'replace')
+    if first_member == 'mimetype':
+        start = 30 + name_length + extra_length
+        declared = head[start:start + 80].split(b'PK', 1)[0].decode('ascii', 'ignore').strip()
+        if declared.startswith('application/vnd.oasis.opendocument.'):
+            return declared
+    for prefix, mime_type in OOXML_TYPES.items():
+        if first_member.startswith(prefix) or prefix.encode() in head:
+            return mime_type
+    guessed = mimetypes.guess_type(name or '')[0]
+    if first_member == '[Content_Types].xml' and guessed and 'openxmlformats' in guessed:
+        return guessed
+    return 'application/zip'
+
+
+def _sniff_text(head, name):
+    if b'\x00' in head:
+        return None
+    try:
+        text = head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        # Caractère multi-octets coupé en fin d'échantillon
+        if e.start < len(head) - 3:
+            return None
+        text = head[:e.start].decode('utf-8')
+    start = text.lstrip('\ufeff \t\r\n').lower()
+    if start.startswith('<svg') or (start.startswith('<?xml') and '<svg' in start):
+        return 'image/svg+xml'
+    if start.startswith(('<!doctype html', '<html')):
+        return 'text/html'
+    if start.startswith('<?xml'):
+        return 'application/xml'
+    if _extension(name) == '.csv':
+        return 'text/csv'
+    return 'text/plain'
+
+
+def sniff_content_type(head, name=''):
+    """MIME type of a file from its first bytes (the name only breaks ties between container formats)"""
+    if not head:
+        return 'application/x-empty'
+    for offset, signature, mime_type in MAGIC_NUMBERS:
+        if head[offset:offset + len(signature)] == signature:
+            return mime_type
+    if head[:4] == b'RIFF' and head[8:12] in (b'WEBP', b'WAVE', b'AVI '):
+        return {b'WEBP': 'image/webp', b'WAVE': 'audio/wav', b'AVI ': 'video/x-msvideo'}[head[8:12]]
+    if head[4:8] == b'ftyp':
+        return FTYP_BRANDS.get(head[8:12], 'video/mp4')
+    if head[:2] == b'BM' and len(head) >= 26 and head[6:10] == b'\x00\x00\x00\x00':
+        return 'image/bmp'
+    if head[:4] == b'PK\x03\x04':
+        return _sniff_zip(head, name)
+    if head[:8] == OLE_SIGNATURE:
+        return OLE_TYPES.get(_extension(name), 'application/x-ole-storage')
+    if head[:2] == b'\xff\xfb' or head[:2] == b'\xff\xf3':
+        return 'audio/mpeg'
+    return _sniff_text(head, name) or 'application/octet-stream'
+
+
+class FileDigest:
+    """SHA-256, size and leading bytes of a file, fed chunk by chunk"""
+
+    def __init__(self):
+        self._sha256 = hashlib.sha256()
+        self.size = 0
+        self.head = b''
+
+    def update(self, data):
+        if len(self.head) < SNIFF_LENGTH:
+            self.head += data[:SNIFF_LENGTH - len(self.head)]
+        self._sha256.update(data)
+        self.size += len(data)
+
+    def metadata(self, name=''):
+        return {
+            'mime_type': sniff_content_type(self.head, name),
+            'sha256': self._sha256.hexdigest(),
+            'size': self.size,
+        }
+
+
+class HashingUploadMixin:
+    """Feed a FileDigest with the chunks this handler stores and annotate the resulting file"""
+
+    def new_file(self, *args, **kwargs):
+        # Avant super() : MemoryFileUploadHandler lève StopFutureHandlers
+        self.digest = FileDigest()
+        super().new_file(*args, **kwargs)
+
+    def file_complete(self, file_size):
+        uploaded = super().file_complete(file_size)
+        if uploaded is not None:
+            uploaded.upload_metadata = self.digest.metadata(uploaded.name)
+        return uploaded
+
+
+class HashingMemoryFileUploadHandler(HashingUploadMixin, MemoryFileUploadHandler):
+
+    def receive_data_chunk(self, raw_data, start):
+        # Inactif (requête trop grosse), le morceau passe au gestionnaire suivant
+        if self.activated:
+            self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+
+class HashingTemporaryFileUploadHandler(HashingUploadMixin, TemporaryFileUploadHandler):
+
+    def receive_data_chunk(self, raw_data, start):
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+
+def file_metadata(file):
+    """
+    {'mime_type', 'sha256', 'size'} of a file: computed by the upload
+    handlers for uploaded files, otherwise by reading it once.
+    """
+    metadata = getattr(file, 'upload_metadata', None)
+    if metadata is not None:
+        return metadata
+
+    digest = FileDigest()
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    metadata = digest.metadata(getattr(file, 'name', ''))
+    file.upload_metadata = metadata
+    return metadata
+
+
+def apply_file_metadata(instance, field_name='file'):
+    """
+    Fill mime_type, sha256, byte_size and file_size (KB) of a model instance
+    whose file field holds a new, not yet stored file.
+    """
+    field_file = getattr(instance, field_name)
+    if not field_file or field_file._committed:
+        return
+    metadata = file_metadata(field_file.file)
+    instance.mime_type = metadata['mime_type']
+    instance.sha256 = metadata['sha256']
+    instance.byte_size = metadata['size']
+    instance.file_size = metadata['size'] // 1024
@@ -0,0 +1,119 @@
+/**
+ * notifications-socket.js - Notifications en temps réel (ws/notifications/)
+ *
+ * Remplace le polling : le serveur envoie le nombre de non lues et les dernières
+ * notifications à la connexion, puis chaque nouvelle notification et chaque
+ * changement du compteur. Reconnexion automatique avec délai croissant.
+ *
+ * Balisage :
+ *   - data-notification-count : élément dont le texte est le nombre de non lues.
+ *     data-notification-format="{n} non lue(s)" pour un autre texte ;
+ *     data-notification-hide-empty pour le masquer (classe d-none) à zéro.
+ *   - data-notification-list : liste où les nouvelles notifications sont ajoutées
+ *     en tête ; data-notification-empty sur le message « aucune notification ».
+ *
+ * Événements sur document : notifications:count (detail.unreadCount) et
+ * notifications:new (detail.notification).
+ */
+
+(function() {
+    const MAX_DELAY = 30000;
+    const PING_INTERVAL = 25000;
+
+    let socket = null;
+    let delay = 1000;
+    let pingTimer = null;
+
+    function socketUrl() {
+        const scheme = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+        return scheme + window.location.host + '/ws/notifications/';
+    }
+
+    function updateCount(count) {
+        document.querySelectorAll('[data-notification-count]').forEach(element => {
+            const format = element.getAttribute('data-notification-format');
+            element.textContent = format ? format.replace('{n}', count) : count;
+            if (element.hasAttribute('data-notification-hide-empty')) {
+                // d-none (Bootstrap) l'emporte aussi sur d-flex
+                element.classList.toggle('d-none', count === 0);
+            }
+        });
+        document.dispatchEvent(new CustomEvent('notifications:count', {detail: {unreadCount: count}}));
+    }
+
+    function renderItem(notification) {
+        const item = document.createElement('div');
+        item.className = 'list-group-item' + (notification.is_read ? '' : ' unread');
+        item.dataset.notificationId = notification.id || '';
+
+        const header = document.createElement('div');
+        header.className = 'd-flex justify-content-between';
+        const title = document.createElement('h6');
+        title.className = 'mb-1';
+        title.textContent = notification.title;
+        const time = document.createElement('small');
+        time.className = 'text-muted';
+        time.textContent = new Date(notification.created_at).toLocaleString();
+        header.append(title, time);
+
+        const content = document.createElement('p');
+        content.className = 'mb-1';
+        content.textContent = notification.content;
+
+        item.append(header, content);
+        return item;
+    }
+
+    function prependItem(notification) {
+        document.querySelectorAll('[data-notification-list]').forEach(list => {
+            const empty = list.querySelector('[data-notification-empty]');
+            if (empty) {
+                empty.remove();
+            }
+            list.prepend(renderItem(notification));
+        });
+        document.dispatchEvent(new CustomEvent('notifications:new', {detail: {notification: notification}}));
+    }
+
+    function onMessage(event) {
+        let data;
+        try {
+            data = JSON.parse(event.data);
+        } catch (e) {
+            return;
+        }
+        if (data.type === 'notification.created') {
+            prependItem(data.notification);
+        }
+        if (typeof data.unread_count === 'number') {
+            updateCount(data.unread_count);
+        }
+    }
+
+    function connect() {
+        socket = new WebSocket(socketUrl());
+
+        socket.onopen = function() {
+            delay = 1000;
+            pingTimer = setInterval(() => {
+                if (socket.readyState === WebSocket.OPEN) {
+                    socket.send('{}');
+                }
+            }, PING_INTERVAL);
+        };
+        socket.onmessage = onMessage;
+        socket.onclose = function(event) {
+            clearInterval(pingTimer);
+            // 1000 : fermeture normale (page quittée)
+            if (event.code === 1000) {
+                return;
+            }
+            setTimeout(connect, delay);
+            delay = Math.min(delay * 2, MAX_DELAY);
+        };
+    }
+
+    if ('WebSocket' in window) {
+        document.addEventListener('DOMContentLoaded', connect);
+    }
+})();
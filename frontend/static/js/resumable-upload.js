@@ -0,0 +1,199 @@
+/**
+ * resumable-upload.js - Téléversement de fichiers par morceaux (API requests/api/uploads/)
+ *
+ * Un fichier est envoyé en morceaux (PUT, plusieurs en parallèle, avec nouvelles
+ * tentatives) puis finalisé, ce qui crée le Document côté serveur. L'identifiant de
+ * session est gardé dans localStorage : après une coupure, un nouvel envoi du même
+ * fichier ne renvoie que les morceaux manquants.
+ *
+ * Formulaires : data-resumable-upload="<url api/uploads/>" sur un <form> avec des
+ * champs <input type="file">.
+ *   - data-upload-mode="document" (défaut) : chaque fichier est finalisé avec les
+ *     champs du formulaire (name, type, demande_id...), puis la page est rechargée.
+ *   - data-upload-mode="attach" : les fichiers sont finalisés sans rattachement et
+ *     leurs identifiants envoyés avec le formulaire (champs document_ids).
+ */
+
+(function() {
+    const PARALLEL_CHUNKS = 3;
+    const MAX_ATTEMPTS = 5;
+
+    function csrfToken(form) {
+        const input = form && form.querySelector('input[name="csrfmiddlewaretoken"]');
+        if (input) {
+            return input.value;
+        }
+        const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+        return match ? decodeURIComponent(match[1]) : '';
+    }
+
+    function storageKey(file) {
+        return 'upload:' + file.name + ':' + file.size + ':' + file.lastModified;
+    }
+
+    function sleep(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    async function request(method, url, token, body, headers) {
+        const response = await fetch(url, {
+            method: method,
+            credentials: 'same-origin',
+            headers: Object.assign({'X-CSRFToken': token}, headers || {}),
+            body: body
+        });
+        let data = {};
+        try {
+            data = await response.json();
+        } catch (e) {
+            // Réponse non JSON (erreur du proxy...)
+        }
+        return {status: response.status, data: data};
+    }
+
+    // Session existante pour ce fichier (reprise) ou nouvelle session
+    async function openSession(baseUrl, file, token) {
+        const saved = localStorage.getItem(storageKey(file));
+        if (saved) {
+            const state = await request('GET', baseUrl + saved + '/', token);
+            if (state.status === 200 && !state.data.complete) {
+                return state.data;
+            }
+            localStorage.removeItem(storageKey(file));
+        }
+        const created = await request('POST', baseUrl, token, JSON.stringify({
+            filename: file.name,
+            size: file.size,
+            mime_type: file.type
+        }), {'Content-Type': 'application/json'});
+        if (created.status !== 201) {
+            throw new Error(created.data.message || 'Upload failed');
+        }
+        localStorage.setItem(storageKey(file), created.data.upload_id);
+        return created.data;
+    }
+
+    async function sendChunk(url, file, offset, chunkSize, token) {
+        const end = Math.min(offset + chunkSize, file.size);
+        for (let attempt = 1; ; attempt++) {
+            try {
+                const result = await request('PUT', url, token, file.slice(offset, end), {
+                    'Content-Type': 'application/octet-stream',
+                    'Content-Range': 'bytes ' + offset + '-' + (end - 1) + '/' + file.size
+                });
+                if (result.status === 200) {
+                    return end - offset;
+                }
+                if (result.status < 500 && result.status !== 400) {
+                    throw Object.assign(new Error(result.data.message || 'Upload failed'), {fatal: true});
+                }
+            } catch (e) {
+                if (e.fatal || attempt >= MAX_ATTEMPTS) {
+                    throw e;
+                }
+            }
+            // Nouvelle tentative après 1 s, 2 s, 4 s...
+            await sleep(1000 * Math.pow(2, attempt - 1));
+        }
+    }
+
+    async function upload(baseUrl, file, fields, options) {
+        options = options || {};
+        const token = options.csrfToken || csrfToken(options.form);
+        const session = await openSession(baseUrl, file, token);
+        const url = baseUrl + session.upload_id + '/';
+        const pending = session.missing_offsets.slice();
+        let sent = file.size - pending.length * session.chunk_size;
+
+        async function worker() {
+            while (pending.length) {
+                const offset = pending.shift();
+                sent += await sendChunk(url, file, offset, session.chunk_size, token);
+                if (options.onProgress) {
+                    options.onProgress(Math.min(1, Math.max(0, sent / file.size)));
+                }
+            }
+        }
+        await Promise.all(Array.from({length: PARALLEL_CHUNKS}, worker));
+
+        const completed = await request('POST', url + 'complete/', token,
+            JSON.stringify(fields || {}), {'Content-Type': 'application/json'});
+        if (completed.status !== 200 && completed.status !== 201) {
+            throw new Error(completed.data.message || 'Upload failed');
+        }
+        localStorage.removeItem(storageKey(file));
+        return completed.data.document;
+    }
+
+    function formFields(form) {
+        const fields = {};
+        new FormData(form).forEach((value, key) => {
+            if (!(value instanceof File) && key !== 'csrfmiddlewaretoken') {
+                fields[key] = value;
+            }
+        });
+        return fields;
+    }
+
+    function enhance(form) {
+        form.addEventListener('submit', async function(event) {
+            const inputs = Array.from(form.querySelectorAll('input[type="file"]'));
+            const files = inputs.flatMap(input => Array.from(input.files));
+            if (!files.length || !window.fetch) {
+                return;
+            }
+            event.preventDefault();
+
+            const baseUrl = form.dataset.resumableUpload;
+            const attach = form.dataset.uploadMode === 'attach';
+            const fields = attach ? {} : formFields(form);
+            const submit = form.querySelector('[type="submit"]');
+            const label = submit ? submit.innerHTML : '';
+            if (submit) {
+                submit.disabled = true;
+            }
+
+            try {
+                const documents = [];
+                for (let index = 0; index < files.length; index++) {
+                    documents.push(await upload(baseUrl, files[index], fields, {
+                        form: form,
+                        onProgress: function(ratio) {
+                            if (submit) {
+                                submit.textContent = (files.length > 1 ? (index + 1) + '/' + files.length + ' - ' : '')
+                                    + Math.round(ratio * 100) + ' %';
+                            }
+                        }
+                    }));
+                }
+
+                if (!attach) {
+                    window.location.reload();
+                    return;
+                }
+                // Le formulaire part sans les fichiers, avec les documents déjà créés
+                documents.forEach(doc => {
+                    const hidden = document.createElement('input');
+                    hidden.type = 'hidden';
+                    hidden.name = 'document_ids';
+                    hidden.value = doc.id;
+                    form.appendChild(hidden);
+                });
+                inputs.forEach(input => { input.disabled = true; });
+                HTMLFormElement.prototype.submit.call(form);
+            } catch (e) {
+                alert(e.message);
+                if (submit) {
+                    submit.disabled = false;
+                    submit.innerHTML = label;
+                }
+            }
+        });
+    }
+
+    window.ResumableUpload = {upload: upload};
+
+    document.addEventListener('DOMContentLoaded', function() {
+        document.querySelectorAll('form[data-resumable-upload]').forEach(enhance);
+    });
+})();